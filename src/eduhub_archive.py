@@ -0,0 +1,122 @@
+# ---Archival of Soft-deleted Users---
+# Users that have been inactive for longer than the retention window are moved
+# into `users_archive` in throttled batches, so the users collection, its
+# unique email index and every scan only carry users that can still sign in.
+# Partial indexes on {isActive: true} keep the hot indexes sized to active users.
+import time
+from datetime import datetime, timedelta, UTC
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, ReplaceOne
+from pymongo.errors import DuplicateKeyError
+
+from eduhub_versions import bump_collection_version
+
+USERS_ARCHIVE_COLLECTION = "users_archive"
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_PAUSE_SECONDS = 0.1
+
+
+def ensure_active_user_indexes(db, replace_full_email_index=False):
+    """
+    Creates the partial indexes that cover active users only, plus the index the
+    archival job uses to find expired inactive users. With replace_full_email_index=True
+    the Part 5.1 'email_1' index is dropped once its partial replacement exists.
+    """
+    db.users.create_index(
+        [("email", ASCENDING)], unique=True, name="email_1_active",
+        partialFilterExpression={"isActive": True},
+    )
+    # find_active_students() filters on role + isActive: True, so it can use this partial index
+    db.users.create_index(
+        [("role", ASCENDING)], name="role_1_active",
+        partialFilterExpression={"isActive": True},
+    )
+    db.users.create_index(
+        [("deactivatedAt", ASCENDING)], name="deactivatedAt_1_inactive",
+        partialFilterExpression={"isActive": False},
+    )
+    db[USERS_ARCHIVE_COLLECTION].create_index([("email", ASCENDING)])
+    if replace_full_email_index and "email_1" in db.users.index_information():
+        db.users.drop_index("email_1")
+    print("  [INDEX] Partial indexes on active users ensured.")
+
+
+def archive_inactive_users(db, retention_days=DEFAULT_RETENTION_DAYS, batch_size=DEFAULT_BATCH_SIZE,
+                           pause_seconds=DEFAULT_PAUSE_SECONDS, max_batches=None):
+    """
+    Moves users inactive for more than `retention_days` into the archive in
+    batches of `batch_size`, sleeping `pause_seconds` between batches.
+    Each batch is copied to the archive, the users' enrollments are flagged,
+    and only then are the users deleted, so an interrupted run can be re-run.
+    Users reactivated before the delete keep no archive copy or flag.
+    Returns the number of users archived.
+    """
+    cutoff = datetime.now(UTC) - timedelta(days=retention_days)
+    query = {"isActive": False, "deactivatedAt": {"$lt": cutoff}}
+    archived = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        users = list(db.users.find(query).sort("deactivatedAt", ASCENDING).limit(batch_size))
+        if not users:
+            break
+        user_ids = [user["_id"] for user in users]
+        archived_at = datetime.now(UTC)
+
+        # 1. Copy (idempotently) into the archive
+        db[USERS_ARCHIVE_COLLECTION].bulk_write(
+            [ReplaceOne({"_id": user["_id"]}, {**user, "archivedAt": archived_at}, upsert=True) for user in users],
+            ordered=False,
+        )
+        # 2. Flag the related enrollments so reports can tell archived students apart
+        db.enrollments.update_many({"studentId": {"$in": user_ids}}, {"$set": {"studentArchived": True}})
+        bump_collection_version(db, "enrollments")
+        # 3. Remove from the hot collection
+        deleted = db.users.delete_many({"_id": {"$in": user_ids}, "isActive": False}).deleted_count
+        bump_collection_version(db, "users")
+        if deleted < len(user_ids):
+            # Users reactivated since the find survived the delete: undo their copy and flag
+            survivors = [user["_id"] for user in db.users.find({"_id": {"$in": user_ids}}, {"_id": 1})]
+            if survivors:
+                db[USERS_ARCHIVE_COLLECTION].delete_many({"_id": {"$in": survivors}})
+                db.enrollments.update_many({"studentId": {"$in": survivors}}, {"$unset": {"studentArchived": ""}})
+                bump_collection_version(db, "enrollments")
+
+        archived += deleted
+        batches += 1
+        print(f"  [ARCHIVE] Archived batch of {deleted} user(s) ({archived} total).")
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+    print(f"  [ARCHIVE] Archived {archived} user(s) inactive since before {cutoff:%Y-%m-%d}.")
+    return archived
+
+
+def restore_user(db, user_id):
+    """
+    Moves an archived user back into users as active and clears the enrollment flags.
+    If an active user has taken the email since, nothing is restored and the archive
+    copy stays in place; returns 0 in that case.
+    """
+    user_id = ObjectId(user_id)
+    user = db[USERS_ARCHIVE_COLLECTION].find_one({"_id": user_id})
+    if not user:
+        print(f"  [RESTORE] User {user_id} not found in the archive.")
+        return 0
+    user.pop("archivedAt", None)
+    user.pop("deactivatedAt", None)
+    user["isActive"] = True
+    try:
+        db.users.replace_one({"_id": user_id}, user, upsert=True)
+    except DuplicateKeyError:
+        print(f"  [RESTORE] User {user_id} not restored: an active user already has the email "
+              f"'{user.get('email')}'. The archived copy was kept.")
+        return 0
+    db.enrollments.update_many({"studentId": user_id}, {"$unset": {"studentArchived": ""}})
+    bump_collection_version(db, "users")
+    bump_collection_version(db, "enrollments")
+    db[USERS_ARCHIVE_COLLECTION].delete_one({"_id": user_id})
+    print(f"  [RESTORE] User {user_id} restored and reactivated.")
+    return 1
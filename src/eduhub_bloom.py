@@ -0,0 +1,125 @@
+# ---Bloom Filter Pre-check for Unique Keys---
+# Bulk loads learn about duplicate emails only when the server raises E11000,
+# one failed write per duplicate. UniqueKeyFilter keeps a Bloom filter of the
+# keys already in a collection (about 1.2 bytes per key at a 1% false-positive
+# rate), seeded by streaming the unique index. A miss means the key is certainly
+# new; a hit is confirmed exactly with one $in query per batch, so a false
+# positive never turns away a valid document.
+import hashlib
+import math
+
+from pymongo import ASCENDING
+
+DEFAULT_ERROR_RATE = 0.01
+DEFAULT_CAPACITY = 10000
+DEFAULT_BATCH_SIZE = 5000
+
+
+def _hash_pair(value):
+    """Returns two independent 64-bit hashes of a value's string form."""
+    digest = hashlib.blake2b(str(value).encode(), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter sized for `capacity` keys at `error_rate` false positives."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1.")
+        capacity = max(int(capacity), 1)
+        self.bit_count = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+        self.bits = bytearray((self.bit_count + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # Double hashing: k positions from two hashes (Kirsch-Mitzenmacher)
+        first, second = _hash_pair(value)
+        return ((first + i * second) % self.bit_count for i in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def size_bytes(self):
+        return len(self.bits)
+
+
+class UniqueKeyFilter:
+    """
+    Bloom filter over one unique field of a collection, with exact confirmation on hits.
+    Call seed() before use, then partition() each batch before sending it and add()
+    the keys that were actually written.
+    """
+
+    def __init__(self, collection, field, capacity=None, error_rate=DEFAULT_ERROR_RATE):
+        self.collection = collection
+        self.field = field
+        if capacity is None:
+            # Leave room for the load itself; an overfull filter only costs extra confirmations
+            capacity = max(2 * collection.estimated_document_count(), DEFAULT_CAPACITY)
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.confirmations = 0
+        self.false_positives = 0
+
+    def _index_hint(self):
+        """Name of a full (non-partial) index on the field, so seeding is a covered index scan."""
+        for name, info in self.collection.index_information().items():
+            if list(info["key"]) == [(self.field, ASCENDING)] and "partialFilterExpression" not in info:
+                return name
+        return None
+
+    def seed(self, batch_size=DEFAULT_BATCH_SIZE):
+        """Streams every existing key into the filter and returns self."""
+        cursor = self.collection.find({}, {self.field: 1, "_id": 0}, batch_size=batch_size)
+        hint = self._index_hint()
+        if hint is not None:
+            cursor = cursor.hint(hint)
+        for doc in cursor:
+            if self.field in doc:
+                self.bloom.add(doc[self.field])
+        print(f"  [BLOOM] Seeded {len(self.bloom)} '{self.field}' key(s) into {self.bloom.size_bytes} bytes.")
+        return self
+
+    def add(self, value):
+        self.bloom.add(value)
+
+    def partition(self, documents):
+        """
+        Splits `documents` into (fresh, duplicates) lists of positions. Duplicates are
+        keys already in the collection or repeated earlier in the same batch; Bloom hits
+        are confirmed against the collection in a single query.
+        """
+        hits = {}
+        for position, document in enumerate(documents):
+            value = document.get(self.field)
+            if value is not None and value in self.bloom:
+                hits.setdefault(value, []).append(position)
+
+        existing = set()
+        if hits:
+            self.confirmations += len(hits)
+            cursor = self.collection.find({self.field: {"$in": list(hits)}}, {self.field: 1, "_id": 0})
+            existing = {doc[self.field] for doc in cursor}
+            self.false_positives += len(hits) - len(existing)
+
+        fresh, duplicates = [], []
+        seen = set()
+        for position, document in enumerate(documents):
+            value = document.get(self.field)
+            if value is not None and (value in existing or value in seen):
+                duplicates.append(position)
+            else:
+                fresh.append(position)
+                if value is not None:
+                    seen.add(value)
+        return fresh, duplicates
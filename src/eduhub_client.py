@@ -0,0 +1,21 @@
+# ---Client Factory---
+# get_client() turns a connection string into a client: "memory://<name>" gives
+# the in-process MemoryClient shared under that name (so every part sees the
+# same data), anything else a pymongo MongoClient. eduhub_memory is only imported
+# for memory:// URIs, so connecting to a real server never loads the backend.
+from pymongo import MongoClient
+
+MEMORY_URI_PREFIX = "memory://"
+
+_SHARED_CLIENTS = {}
+
+
+def get_client(uri, **options):
+    """Returns the shared MemoryClient for a memory:// URI, or a new MongoClient for any other URI."""
+    if uri.startswith(MEMORY_URI_PREFIX):
+        from eduhub_memory import MemoryClient
+        name = uri[len(MEMORY_URI_PREFIX):] or "default"
+        if name not in _SHARED_CLIENTS:
+            _SHARED_CLIENTS[name] = MemoryClient()
+        return _SHARED_CLIENTS[name]
+    return MongoClient(uri, **options)
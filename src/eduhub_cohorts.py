@@ -0,0 +1,185 @@
+# ---Cohort and Retention Analytics---
+# Students are grouped into cohorts by the month they joined (users.dateJoined)
+# and followed through their enrollments. The needed columns are pulled once
+# through the columnar reader, then retention grids, progress drop-off curves
+# and time-to-completion are computed with vectorized pandas/NumPy operations.
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from eduhub_reports import aggregate_to_dataframe
+from eduhub_versions import collection_versions
+
+PROGRESS_STEPS = list(range(0, 101, 10))
+
+# Flat columns pulled for every enrollment, joined with the student's join date
+cohort_schema = {
+    "studentId": str,
+    "dateJoined": datetime,
+    "enrollmentDate": datetime,
+    "progress": float,
+    "status": str,
+    "completionDate": datetime,
+}
+
+
+def cohort_pipeline(user_key="userId", start=None, end=None):
+    """Builds the pipeline that flattens enrollments + student join dates into cohort columns."""
+    pipeline = []
+    if start is not None or end is not None:
+        joined = {}
+        if start is not None:
+            joined["$gte"] = start
+        if end is not None:
+            joined["$lt"] = end
+        student_filter = [{"$match": {"dateJoined": joined}}]
+    else:
+        student_filter = []
+    pipeline += [
+        {"$lookup": {
+            "from": "users",
+            "localField": "studentId",
+            "foreignField": user_key,
+            "pipeline": student_filter + [{"$project": {"_id": 0, "dateJoined": 1}}],
+            "as": "student",
+        }},
+        {"$unwind": "$student"},
+        {"$project": {
+            "_id": 0,
+            "studentId": {"$toString": "$studentId"},
+            "dateJoined": "$student.dateJoined",
+            "enrollmentDate": 1,
+            "progress": 1,
+            "status": 1,
+            "completionDate": 1,
+        }},
+    ]
+    return pipeline
+
+
+def cohort_sizes_pipeline(start=None, end=None):
+    """Builds the pipeline counting students per join-month cohort on the server."""
+    match = {"role": "student"}
+    if start is not None or end is not None:
+        match["dateJoined"] = {}
+        if start is not None:
+            match["dateJoined"]["$gte"] = start
+        if end is not None:
+            match["dateJoined"]["$lt"] = end
+    return [
+        {"$match": match},
+        {"$group": {"_id": {"$dateToString": {"format": "%Y-%m", "date": "$dateJoined"}}, "cohortSize": {"$sum": 1}}},
+        {"$project": {"_id": 0, "cohort": "$_id", "cohortSize": 1}},
+    ]
+
+
+def _month_index(dates):
+    """Returns year * 12 + month - 1 for a datetime Series (NaN where missing)."""
+    return dates.dt.year * 12 + dates.dt.month - 1
+
+
+def load_cohort_frame(db, user_key="userId", start=None, end=None):
+    """Pulls the cohort columns once and adds the cohort label and month offset columns."""
+    frame = aggregate_to_dataframe(db.enrollments, cohort_pipeline(user_key, start, end), cohort_schema, allowDiskUse=True)
+    frame["cohort"] = frame["dateJoined"].dt.strftime("%Y-%m")
+    frame["monthOffset"] = _month_index(frame["enrollmentDate"]) - _month_index(frame["dateJoined"])
+    return frame
+
+
+def load_cohort_sizes(db, start=None, end=None):
+    """Returns a Series of student counts indexed by cohort label."""
+    sizes = aggregate_to_dataframe(db.users, cohort_sizes_pipeline(start, end), {"cohort": str, "cohortSize": int})
+    return sizes.set_index("cohort")["cohortSize"]
+
+
+def retention_matrix(frame, cohort_sizes, months=12):
+    """
+    Returns a cohort x month-offset grid of the share of each cohort's students
+    who started an enrollment in that month after joining.
+    """
+    active = frame[(frame["monthOffset"] >= 0) & (frame["monthOffset"] < months)]
+    counts = active.groupby(["cohort", "monthOffset"])["studentId"].nunique().unstack(fill_value=0)
+    counts = counts.reindex(columns=range(months), fill_value=0)
+    sizes = cohort_sizes.reindex(counts.index)
+    # Fall back to the students seen in the frame when a cohort size is unknown
+    sizes = sizes.fillna(frame.groupby("cohort")["studentId"].nunique().reindex(counts.index))
+    return (counts.div(sizes, axis=0) * 100).round(2)
+
+
+def dropoff_curves(frame, steps=PROGRESS_STEPS):
+    """Returns a cohort x progress-threshold grid of the share of enrollments reaching each threshold."""
+    thresholds = np.asarray(steps, dtype="float64")
+    progress = frame["progress"].fillna(0).to_numpy()
+    # One broadcast comparison instead of a pass per threshold
+    reached = pd.DataFrame(progress[:, None] >= thresholds[None, :], columns=steps, index=frame.index)
+    reached["cohort"] = frame["cohort"]
+    return (reached.groupby("cohort").mean() * 100).round(2)
+
+
+def time_to_completion(frame):
+    """Returns per-cohort count, mean, median and p90 days from enrollment to completion."""
+    completed = frame[(frame["status"] == "completed") & frame["completionDate"].notna()]
+    days = (completed["completionDate"] - completed["enrollmentDate"]).dt.total_seconds() / 86400
+    grouped = days.groupby(completed["cohort"])
+    return pd.DataFrame({
+        "completed": grouped.size(),
+        "meanDays": grouped.mean().round(2),
+        "medianDays": grouped.median().round(2),
+        "p90Days": grouped.quantile(0.9).round(2),
+    })
+
+
+class CohortEngine:
+    """
+    Loads the cohort columns once and caches each cohort's retention row,
+    drop-off curve and completion stats. The cache is keyed by the
+    users/enrollments version tokens, so any write to either reloads it.
+    """
+
+    def __init__(self, db, user_key="userId", months=12):
+        self.db = db
+        self.user_key = user_key
+        self.months = months
+        self._versions = None
+        self._frame = None
+        self._sizes = None
+        self._cohort_cache = {}
+
+    def _refresh(self):
+        """Reloads the columns and drops cached cohorts if the source collections changed."""
+        versions = collection_versions(self.db, ["users", "enrollments"])
+        if versions != self._versions:
+            self._frame = load_cohort_frame(self.db, self.user_key)
+            self._sizes = load_cohort_sizes(self.db)
+            self._cohort_cache = {}
+            self._versions = versions
+
+    def _fill(self, labels):
+        """Computes every uncached cohort in one vectorized pass and caches each cohort's slice."""
+        missing = [label for label in labels if label not in self._cohort_cache]
+        if not missing:
+            return
+        rows = self._frame[self._frame["cohort"].isin(missing)]
+        retention = retention_matrix(rows, self._sizes, self.months)
+        dropoff = dropoff_curves(rows)
+        completion = time_to_completion(rows)
+        for label in missing:
+            self._cohort_cache[label] = {
+                "retention": retention.reindex([label], fill_value=0),
+                "dropoff": dropoff.reindex([label], fill_value=0),
+                "completion": completion.reindex([label]),
+            }
+
+    def cohort(self, label):
+        """Returns {"retention", "dropoff", "completion"} for one cohort ("YYYY-MM")."""
+        self._refresh()
+        self._fill([label])
+        return self._cohort_cache[label]
+
+    def retention_grid(self, labels=None):
+        """Returns the retention grid for the given cohorts (all cohorts by default)."""
+        self._refresh()
+        labels = labels or sorted(self._frame["cohort"].dropna().unique())
+        self._fill(labels)
+        return pd.concat([self._cohort_cache[label]["retention"] for label in labels])
@@ -0,0 +1,111 @@
+# ---Duplicate Email Cleanup: Streaming and Bounded-memory---
+# Walks users in email order (backed by an {email, _id} index) and handles one
+# run of same-email documents at a time, so memory is bounded by the largest
+# duplicate run instead of the whole collection. Deletes are sent in batched
+# bulk_write chunks, and dry_run=True only reports what would be removed.
+# The {email, _id} index is only needed for the walk: a run that had to create
+# it drops it again, so it doesn't stay behind as write overhead on users.
+from pymongo import ASCENDING, DeleteMany
+
+from eduhub_versions import bump_collection_version
+
+DEDUP_INDEX = [("email", ASCENDING), ("_id", ASCENDING)]
+DEFAULT_BATCH_SIZE = 1000
+REPORT_EXAMPLES = 20
+
+
+def _joined_key(doc):
+    """Sort key for dateJoined that puts documents without a join date last."""
+    joined = doc.get("dateJoined")
+    return (joined is None, joined)
+
+
+# Survivor policies: each picks the document to keep from one duplicate run (sorted by _id)
+SURVIVOR_POLICIES = {
+    # Lowest _id, i.e. the first document inserted
+    "first": lambda run: run[0],
+    # Highest _id, i.e. the most recently inserted document
+    "last": lambda run: run[-1],
+    # Earliest dateJoined
+    "oldest": lambda run: min(run, key=_joined_key),
+    # An active account if there is one, otherwise the first document
+    "active": lambda run: next((doc for doc in run if doc.get("isActive")), run[0]),
+}
+
+
+def _pick_survivor(run, keep):
+    """Returns the document to keep from a duplicate run using a policy name or callable."""
+    if callable(keep):
+        return keep(run)
+    if keep not in SURVIVOR_POLICIES:
+        raise ValueError(f"Unknown survivor policy '{keep}'. Must be one of {list(SURVIVOR_POLICIES)} or a callable.")
+    return SURVIVOR_POLICIES[keep](run)
+
+
+def iter_duplicate_runs(collection, field="email", projection=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Yields (value, [documents]) for every value of `field` that appears more than once."""
+    fields = {field: 1, "isActive": 1, "dateJoined": 1}
+    fields.update(projection or {})
+    cursor = (
+        collection.find({field: {"$exists": True}}, fields)
+        .sort([(field, ASCENDING), ("_id", ASCENDING)])
+        .batch_size(batch_size)
+        .allow_disk_use(True)
+    )
+    current_value = object()
+    run = []
+    for doc in cursor:
+        value = doc.get(field)
+        if value != current_value:
+            if len(run) > 1:
+                yield current_value, run
+            current_value, run = value, []
+        run.append(doc)
+    if len(run) > 1:
+        yield current_value, run
+
+
+def dedup_users_by_email(db, keep="first", batch_size=DEFAULT_BATCH_SIZE, dry_run=False, ensure_index=True):
+    """
+    Removes users that share an email with another user, keeping one survivor
+    per email chosen by `keep` ("first", "last", "oldest", "active" or a callable).
+    With ensure_index=True a missing {email, _id} index is created for the walk and
+    dropped once it finishes. Returns a report
+    {"duplicateEmails", "documentsDeleted", "dryRun", "examples"}.
+    """
+    temporary_index = None
+    if ensure_index and not any(list(info["key"]) == DEDUP_INDEX for info in db.users.index_information().values()):
+        temporary_index = db.users.create_index(DEDUP_INDEX)
+    try:
+        return _dedup_users_by_email(db, keep, batch_size, dry_run)
+    finally:
+        if temporary_index is not None:
+            db.users.drop_index(temporary_index)
+
+
+def _dedup_users_by_email(db, keep, batch_size, dry_run):
+    report = {"duplicateEmails": 0, "documentsDeleted": 0, "dryRun": dry_run, "examples": []}
+    pending = []
+
+    def flush():
+        if pending and not dry_run:
+            db.users.bulk_write([DeleteMany({"_id": {"$in": list(pending)}})], ordered=False)
+        pending.clear()
+
+    for email, run in iter_duplicate_runs(db.users, "email", batch_size=batch_size):
+        survivor = _pick_survivor(run, keep)
+        losers = [doc["_id"] for doc in run if doc["_id"] != survivor["_id"]]
+        report["duplicateEmails"] += 1
+        report["documentsDeleted"] += len(losers)
+        if len(report["examples"]) < REPORT_EXAMPLES:
+            report["examples"].append({"email": email, "keep": survivor["_id"], "delete": losers})
+        pending.extend(losers)
+        if len(pending) >= batch_size:
+            flush()
+    flush()
+    if report["documentsDeleted"] and not dry_run:
+        bump_collection_version(db, "users")
+
+    action = "Would delete" if dry_run else "Deleted"
+    print(f"  [DEDUP] {action} {report['documentsDeleted']} duplicate(s) across {report['duplicateEmails']} email(s).")
+    return report
@@ -0,0 +1,107 @@
+# ---Enrollment Side Effects: Write-behind Batching---
+# Besides its own upsert, an enrollment bumps the daily/monthly enrollment
+# rollups and adds the student to the course and instructor unique-learner
+# sketches, which done inline costs several extra round trips per enrollment.
+# EnrollmentEffectsQueue collects those side effects instead, so the enrollment
+# itself is a single write, and flushes them in a few bulk writes; enrollments
+# on the same day share one rollup increment.
+import threading
+import time
+
+from pymongo.errors import PyMongoError
+
+from eduhub_rollups import bucket_start, record_activity
+from eduhub_sketches import record_enrollment_sketches
+
+DEFAULT_MAX_PENDING = 500
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+class EnrollmentEffectsQueue:
+    """
+    Write-behind queue for the rollup and sketch updates of enroll_student_in_course().
+    Call flush() whenever the caller needs activity_trend() or the sketches to be current.
+    """
+
+    def __init__(self, db, max_pending=DEFAULT_MAX_PENDING, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.db = db
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self._days = {}
+        self._enrollments = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._stop = threading.Event()
+        self._timer = None
+        if flush_interval:
+            self._timer = threading.Thread(target=self._flush_periodically, name="enrollment-effects-flush", daemon=True)
+            self._timer.start()
+
+    def enqueue(self, course_id, student_id, enrolled_at):
+        """Queues the side effects of one new enrollment."""
+        day = bucket_start(enrolled_at, "day")
+        with self._lock:
+            self._days[day] = self._days.get(day, 0) + 1
+            self._enrollments.append((course_id, student_id))
+            full = len(self._enrollments) >= self.max_pending
+        if full:
+            self.flush()
+
+    def pending_count(self):
+        """Returns the number of enrollments (or rollup days left by a failed flush) waiting to be written."""
+        with self._lock:
+            return len(self._enrollments) or len(self._days)
+
+    def flush(self):
+        """Writes every pending sketch register and rollup increment; returns the number of enrollments flushed."""
+        with self._flush_lock:
+            with self._lock:
+                days, self._days = self._days, {}
+                enrollments, self._enrollments = self._enrollments, []
+                self._last_flush = time.monotonic()
+            if not enrollments and not days:
+                return 0
+            try:
+                # $max registers are idempotent, so a failed batch can simply be re-sent
+                record_enrollment_sketches(self.db, enrollments)
+            except PyMongoError:
+                self._requeue(days, enrollments)
+                raise
+            for position, (day, count) in enumerate(days.items()):
+                try:
+                    record_activity(self.db, "enrollments", day, count=count)
+                except PyMongoError:
+                    # Only the increments not yet applied go back, so no day is counted twice
+                    self._requeue(dict(list(days.items())[position:]), [])
+                    raise
+            print(f"  [CREATE] Flushed side effects of {len(enrollments)} enrollment(s).")
+            return len(enrollments)
+
+    def _requeue(self, days, enrollments):
+        with self._lock:
+            for day, count in days.items():
+                self._days[day] = self._days.get(day, 0) + count
+            self._enrollments[:0] = enrollments
+
+    def _flush_periodically(self):
+        """Background loop that flushes once the oldest pending enrollment is flush_interval old."""
+        while not self._stop.wait(self.flush_interval / 4):
+            if self.pending_count() and time.monotonic() - self._last_flush >= self.flush_interval:
+                try:
+                    self.flush()
+                except PyMongoError as e:
+                    print(f"  [CREATE] Background enrollment flush failed, will retry: {type(e).__name__}: {e}")
+
+    def close(self):
+        """Stops the background flusher and writes anything still pending."""
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.join()
+        return self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
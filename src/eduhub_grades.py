@@ -0,0 +1,415 @@
+# ---Grade Writes: Write-behind Batching---
+# Bulk grading sends one update per student. GradeQueue collects those updates,
+# keeps only the latest score per (enrollment, assignment), and flushes them as
+# a single unordered bulk_write once enough are pending or enough time passed.
+# The background flusher retries transient errors (a lost connection, a primary
+# stepping down) a few times; any other error, or too many retries, stops it and
+# is raised to the caller by the next enqueue().
+import threading
+import time
+
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import AutoReconnect, NotPrimaryError, OperationFailure, PyMongoError
+
+from eduhub_sketches import record_submission_grade, record_submission_grades
+from eduhub_versions import bump_collection_version
+
+DEFAULT_MAX_PENDING = 500
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_RETRIES = 5
+# NotPrimaryError is an AutoReconnect; both mean the same batch can simply be sent again
+TRANSIENT_ERRORS = (AutoReconnect, NotPrimaryError)
+
+
+class GradeQueue:
+    """
+    Write-behind queue for update_assignment_grade()-style writes, in any grade storage mode.
+    Call flush() whenever the caller needs to read its own writes. `error` holds the
+    exception that stopped the background flusher; the next successful flush() clears
+    it and restarts the flusher.
+    """
+
+    def __init__(self, db, max_pending=DEFAULT_MAX_PENDING, flush_interval=DEFAULT_FLUSH_INTERVAL, mode="embedded",
+                 max_retries=DEFAULT_MAX_RETRIES):
+        self.db = db
+        self.mode = mode
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.error = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._stop = threading.Event()
+        self._timer = None
+        if flush_interval:
+            self._start_flusher()
+
+    def _start_flusher(self):
+        self._timer = threading.Thread(target=self._flush_periodically, name="grade-queue-flush", daemon=True)
+        self._timer.start()
+
+    def enqueue(self, enrollment_id, assignment_name, new_score):
+        """
+        Queues a grade update; a later update to the same grade replaces this one.
+        Raises the error that stopped the background flusher until a flush() succeeds.
+        """
+        if self.error is not None:
+            raise self.error
+        with self._lock:
+            self._pending[(ObjectId(enrollment_id), assignment_name)] = new_score
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self.flush()
+
+    def pending_count(self):
+        """Returns the number of coalesced updates waiting to be written."""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Writes every pending update in one unordered bulk_write and returns the modified count."""
+        # Serialize flushes so an older batch can't land after a newer one
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._last_flush = time.monotonic()
+            if not pending:
+                return 0
+            owners = {}
+            if self.mode == "collection":
+                # One lookup for the whole batch, so new grade documents carry their courseId/studentId
+                owners = enrollment_owners(self.db, {enrollment_id for enrollment_id, _ in pending})
+                # Grades are upserted in this mode, so updates for missing enrollments would create orphans
+                missing = [key for key in pending if key[0] not in owners]
+                for key in missing:
+                    del pending[key]
+                if missing:
+                    print(f"  [UPDATE] Skipped {len(missing)} grade update(s) for enrollments that don't exist.")
+                if not pending:
+                    return 0
+            # The scores being replaced, read once per batch so the grade sketches can move them
+            current = current_grades(self.db, self.mode, pending, owners)
+            requests = [
+                grade_write(self.mode, enrollment_id, assignment_name, score, *owners.get(enrollment_id, (None, None)))[1]
+                for (enrollment_id, assignment_name), score in pending.items()
+            ]
+            target = GRADES_COLLECTION if self.mode == "collection" else "enrollments"
+            try:
+                result = self.db[target].bulk_write(requests, ordered=False)
+            except PyMongoError:
+                # Put the batch back unless a newer score for the same grade arrived meanwhile
+                with self._lock:
+                    for key, score in pending.items():
+                        self._pending.setdefault(key, score)
+                raise
+            if self.error is not None:
+                # The write went through again, so the background flusher can take over once more
+                self.error = None
+                if self._timer is not None and not self._stop.is_set():
+                    self._start_flusher()
+            written = result.modified_count + result.upserted_count
+            if written:
+                bump_collection_version(self.db, target)
+                sketch_grades = []
+                for (enrollment_id, assignment_name), score in pending.items():
+                    previous, course_id, student_id = current.get((enrollment_id, assignment_name), (score, None, None))
+                    if previous != score:
+                        sketch_grades.append((assignment_name, student_id, score, course_id, previous))
+                record_submission_grades(self.db, sketch_grades)
+            print(f"  [UPDATE] Flushed {len(requests)} grade update(s), {written} written.")
+            return written
+
+    def _flush_periodically(self):
+        """
+        Background loop that flushes once the oldest pending update is flush_interval old.
+        Transient errors are retried up to max_retries times in a row; any other error
+        stops the loop, leaving the updates queued and the error in `error`.
+        """
+        failures = 0
+        while not self._stop.wait(self.flush_interval / 4):
+            if self.pending_count() and time.monotonic() - self._last_flush >= self.flush_interval:
+                try:
+                    self.flush()
+                    failures = 0
+                except PyMongoError as e:
+                    failures += 1
+                    if isinstance(e, TRANSIENT_ERRORS) and failures <= self.max_retries:
+                        print(f"  [UPDATE] Background grade flush failed, retry {failures} of {self.max_retries}: "
+                              f"{type(e).__name__}: {e}")
+                        continue
+                    print(f"  [UPDATE] Background grade flush stopped, {self.pending_count()} update(s) still queued: "
+                          f"{type(e).__name__}: {e}")
+                    self.error = e
+                    return
+
+    def close(self):
+        """Stops the background flusher and writes anything still pending."""
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.join()
+        return self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# ---Grade Storage Modes---
+# "embedded":   the original enrollments.grades array, updated positionally.
+# "collection": one document per grade in an indexed `grades` collection.
+# "keyed":      enrollments.gradesByAssignment, a subdocument keyed by assignment,
+#               so a write is a direct $set on one path instead of an array scan.
+GRADE_MODES = ["embedded", "collection", "keyed"]
+GRADES_COLLECTION = "grades"
+KEYED_GRADES_FIELD = "gradesByAssignment"
+
+
+def grade_key(assignment_name):
+    """Turns an assignment name into a safe subdocument key ('.' and a leading '$' are not allowed)."""
+    key = assignment_name.replace(".", "\uff0e")
+    if key.startswith("$"):
+        key = "\uff04" + key[1:]
+    return key
+
+
+def _check_mode(mode):
+    """Raises ValueError for an unknown grade storage mode."""
+    if mode not in GRADE_MODES:
+        raise ValueError(f"Unsupported grade storage mode '{mode}'. Must be one of {GRADE_MODES}.")
+
+
+def ensure_grade_indexes(db, mode="collection"):
+    """Creates the indexes the collection or keyed storage mode relies on."""
+    _check_mode(mode)
+    if mode == "collection":
+        db[GRADES_COLLECTION].create_index([("enrollmentId", 1), ("assignmentName", 1)], unique=True)
+        db[GRADES_COLLECTION].create_index([("courseId", 1), ("assignmentName", 1)])
+        print(f"  [INDEX] Grade indexes ensured on '{GRADES_COLLECTION}'.")
+    elif mode == "keyed":
+        # grades_for_assignment() filters on courseId plus one gradesByAssignment key
+        try:
+            db.enrollments.create_index([("courseId", 1), (f"{KEYED_GRADES_FIELD}.$**", 1)])
+            print(f"  [INDEX] Compound wildcard index ensured on 'enrollments.courseId' and '{KEYED_GRADES_FIELD}'.")
+        except OperationFailure:
+            # Compound wildcard indexes need MongoDB 7.0; a courseId index still narrows the scan to one course
+            db.enrollments.create_index([("courseId", 1)])
+            print("  [INDEX] Index ensured on 'enrollments.courseId' (no compound wildcard index support).")
+
+
+def enrollment_owners(db, enrollment_ids):
+    """Returns {enrollment _id: (courseId, studentId)} for the given enrollments."""
+    return {
+        doc["_id"]: (doc.get("courseId"), doc.get("studentId"))
+        for doc in db.enrollments.find({"_id": {"$in": [ObjectId(i) for i in enrollment_ids]}}, {"courseId": 1, "studentId": 1})
+    }
+
+
+def current_grades(db, mode, keys, owners=None):
+    """
+    Returns {(enrollment _id, assignment name): (score, courseId, studentId)} for the grades a
+    write to `keys` would touch, with a None score for grades that don't exist yet. Keys whose
+    write would match nothing (no enrollment, or no embedded grade of that name) are left out.
+    """
+    _check_mode(mode)
+    enrollment_ids = list({ObjectId(enrollment_id) for enrollment_id, _ in keys})
+    current = {}
+    if mode == "collection":
+        owners = owners if owners is not None else enrollment_owners(db, enrollment_ids)
+        scores = {
+            (doc["enrollmentId"], doc["assignmentName"]): doc.get("score")
+            for doc in db[GRADES_COLLECTION].find(
+                {"enrollmentId": {"$in": enrollment_ids}}, {"enrollmentId": 1, "assignmentName": 1, "score": 1})
+        }
+        for enrollment_id, assignment_name in keys:
+            enrollment_id = ObjectId(enrollment_id)
+            if enrollment_id in owners:
+                current[(enrollment_id, assignment_name)] = (scores.get((enrollment_id, assignment_name)), *owners[enrollment_id])
+        return current
+    field = "grades" if mode == "embedded" else KEYED_GRADES_FIELD
+    enrollments = {
+        doc["_id"]: doc
+        for doc in db.enrollments.find({"_id": {"$in": enrollment_ids}}, {field: 1, "courseId": 1, "studentId": 1})
+    }
+    for enrollment_id, assignment_name in keys:
+        doc = enrollments.get(ObjectId(enrollment_id))
+        if doc is None:
+            continue
+        if mode == "embedded":
+            grades = [grade for grade in doc.get("grades", []) if grade.get("assignmentName") == assignment_name]
+            if not grades:
+                continue
+            score = grades[0].get("score")
+        else:
+            score = doc.get(KEYED_GRADES_FIELD, {}).get(grade_key(assignment_name), {}).get("score")
+        current[(ObjectId(enrollment_id), assignment_name)] = (score, doc.get("courseId"), doc.get("studentId"))
+    return current
+
+
+def iter_grades(db, mode="embedded", batch_size=1000):
+    """Yields (courseId, studentId, assignment name, score) for every grade stored in the given mode."""
+    _check_mode(mode)
+    if mode == "collection":
+        for grade in db[GRADES_COLLECTION].find({}, {"courseId": 1, "studentId": 1, "assignmentName": 1, "score": 1},
+                                                batch_size=batch_size):
+            yield grade.get("courseId"), grade.get("studentId"), grade["assignmentName"], grade.get("score")
+        return
+    field = "grades" if mode == "embedded" else KEYED_GRADES_FIELD
+    cursor = db.enrollments.find({field: {"$exists": True}}, {field: 1, "courseId": 1, "studentId": 1}, batch_size=batch_size)
+    for enrollment in cursor:
+        grades = enrollment[field] if mode == "embedded" else enrollment[field].values()
+        for grade in grades:
+            yield enrollment.get("courseId"), enrollment.get("studentId"), grade.get("assignmentName"), grade.get("score")
+
+
+def _grade_update(mode, enrollment_id, assignment_name, score, course_id=None, student_id=None):
+    """Returns (collection name, filter, update, upsert) for storing one grade in the given mode."""
+    _check_mode(mode)
+    enrollment_id = ObjectId(enrollment_id)
+    if mode == "embedded":
+        return ("enrollments", {"_id": enrollment_id, "grades.assignmentName": assignment_name},
+                {"$set": {"grades.$.score": score}}, False)
+    if mode == "keyed":
+        return ("enrollments", {"_id": enrollment_id},
+                {"$set": {f"{KEYED_GRADES_FIELD}.{grade_key(assignment_name)}": {"assignmentName": assignment_name, "score": score}}},
+                False)
+    on_insert = {}
+    if course_id is not None:
+        on_insert["courseId"] = course_id
+    if student_id is not None:
+        on_insert["studentId"] = student_id
+    update = {"$set": {"score": score}}
+    if on_insert:
+        update["$setOnInsert"] = on_insert
+    return GRADES_COLLECTION, {"enrollmentId": enrollment_id, "assignmentName": assignment_name}, update, True
+
+
+def grade_write(mode, enrollment_id, assignment_name, score, course_id=None, student_id=None):
+    """Returns the (collection name, UpdateOne) pair that stores one grade in the given mode."""
+    collection_name, query, update, upsert = _grade_update(mode, enrollment_id, assignment_name, score, course_id, student_id)
+    return collection_name, UpdateOne(query, update, upsert=upsert)
+
+
+def _stored_grade(mode, document, assignment_name):
+    """Reads (score, courseId, studentId) out of a document returned for a grade; score is None for a new grade."""
+    if mode == "embedded":
+        score = document["grades"][0].get("score") if document.get("grades") else None
+    elif mode == "keyed":
+        score = document.get(KEYED_GRADES_FIELD, {}).get(grade_key(assignment_name), {}).get("score")
+    else:
+        score = document.get("score")
+    return score, document.get("courseId"), document.get("studentId")
+
+
+def set_grade(db, enrollment_id, assignment_name, score, mode="embedded", course_id=None, student_id=None):
+    """
+    Stores one grade in the given mode and returns the number of documents written.
+    The write returns the previous score in the same round trip, so the grade sketches
+    (eduhub_sketches) move the grade to its new bin instead of counting it twice.
+    In "collection" mode the owner is looked up when not given, and a grade for an
+    enrollment that doesn't exist is not written.
+    """
+    if mode == "collection" and course_id is None:
+        owner = enrollment_owners(db, [enrollment_id]).get(ObjectId(enrollment_id))
+        if owner is None:
+            return 0
+        course_id, student_id = owner
+    collection_name, query, update, upsert = _grade_update(mode, enrollment_id, assignment_name, score, course_id, student_id)
+    projection = {"courseId": 1, "studentId": 1}
+    projection[{"embedded": "grades.$", "keyed": f"{KEYED_GRADES_FIELD}.{grade_key(assignment_name)}"}.get(mode, "score")] = 1
+    before = db[collection_name].find_one_and_update(query, update, projection=projection, upsert=upsert)
+    if before is None and not upsert:
+        return 0
+    previous, stored_course, stored_student = _stored_grade(mode, before or {}, assignment_name)
+    if before is not None and previous == score:
+        return 0
+    bump_collection_version(db, collection_name)
+    record_submission_grade(db, assignment_name, stored_student or student_id, score, stored_course or course_id, previous)
+    return 1
+
+
+def get_grade(db, enrollment_id, assignment_name, mode="embedded"):
+    """Returns the score of one assignment for one enrollment, or None."""
+    _check_mode(mode)
+    enrollment_id = ObjectId(enrollment_id)
+    if mode == "collection":
+        doc = db[GRADES_COLLECTION].find_one({"enrollmentId": enrollment_id, "assignmentName": assignment_name})
+        return doc["score"] if doc else None
+    if mode == "keyed":
+        path = f"{KEYED_GRADES_FIELD}.{grade_key(assignment_name)}"
+        doc = db.enrollments.find_one({"_id": enrollment_id}, {path: 1})
+        grade = (doc or {}).get(KEYED_GRADES_FIELD, {}).get(grade_key(assignment_name))
+        return grade["score"] if grade else None
+    doc = db.enrollments.find_one(
+        {"_id": enrollment_id, "grades.assignmentName": assignment_name}, {"grades.$": 1}
+    )
+    return doc["grades"][0]["score"] if doc else None
+
+
+def grades_for_assignment(db, course_id, assignment_name, mode="embedded"):
+    """Returns [{"enrollmentId", "score"}] for one assignment across a course's enrollments."""
+    _check_mode(mode)
+    course_id = ObjectId(course_id)
+    if mode == "collection":
+        return list(db[GRADES_COLLECTION].find(
+            {"courseId": course_id, "assignmentName": assignment_name},
+            {"_id": 0, "enrollmentId": 1, "score": 1},
+        ))
+    if mode == "keyed":
+        path = f"{KEYED_GRADES_FIELD}.{grade_key(assignment_name)}"
+        return [
+            {"enrollmentId": doc["_id"], "score": doc[KEYED_GRADES_FIELD][grade_key(assignment_name)]["score"]}
+            for doc in db.enrollments.find({"courseId": course_id, path: {"$exists": True}}, {path: 1})
+        ]
+    return [
+        {"enrollmentId": doc["_id"], "score": doc["grades"][0]["score"]}
+        for doc in db.enrollments.find(
+            {"courseId": course_id, "grades.assignmentName": assignment_name}, {"grades.$": 1}
+        )
+    ]
+
+
+def migrate_grades(db, to_mode, batch_size=500, remove_embedded=False):
+    """
+    Copies every embedded enrollments.grades entry into the target storage mode
+    in batched unordered bulk writes. Re-running is safe (writes are upserts or
+    idempotent $sets). With remove_embedded=True the old arrays are unset afterwards.
+    """
+    _check_mode(to_mode)
+    if to_mode == "embedded":
+        raise ValueError("Grades are already embedded; migrate to 'collection' or 'keyed'.")
+    ensure_grade_indexes(db, to_mode)
+
+    migrated = 0
+    batch = []
+    cursor = db.enrollments.find(
+        {"grades.0": {"$exists": True}}, {"studentId": 1, "courseId": 1, "grades": 1}, batch_size=batch_size
+    )
+    for enrollment in cursor:
+        for grade in enrollment["grades"]:
+            _, request = grade_write(
+                to_mode, enrollment["_id"], grade["assignmentName"], grade.get("score"),
+                enrollment.get("courseId"), enrollment.get("studentId"),
+            )
+            batch.append(request)
+        if len(batch) >= batch_size:
+            target = GRADES_COLLECTION if to_mode == "collection" else "enrollments"
+            db[target].bulk_write(batch, ordered=False)
+            migrated += len(batch)
+            batch = []
+    if batch:
+        target = GRADES_COLLECTION if to_mode == "collection" else "enrollments"
+        db[target].bulk_write(batch, ordered=False)
+        migrated += len(batch)
+
+    if remove_embedded:
+        db.enrollments.update_many({"grades": {"$exists": True}}, {"$unset": {"grades": ""}})
+    bump_collection_version(db, "enrollments")
+    if to_mode == "collection":
+        bump_collection_version(db, GRADES_COLLECTION)
+    print(f"  [MIGRATE] Migrated {migrated} grade(s) to '{to_mode}' storage.")
+    return migrated
@@ -0,0 +1,77 @@
+# ---Import-time Benchmark---
+# Times `import <module>` in a fresh interpreter, so nothing is already cached in
+# sys.modules, and reports which heavy dependencies the import dragged in. Running
+# this file exits non-zero when a module goes over its budget or eagerly imports
+# pandas/NumPy/pyarrow, which makes startup regressions visible in CI.
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["eduhub_queries", "eduhub_schema", "eduhub_bloom", "eduhub_migrations", "eduhub_profiles", "eduhub_client", "eduhub_memory", "eduhub_sharding", "eduhub_loadtest", "eduhub_versions", "eduhub_effects"]
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow"]
+DEFAULT_REPEAT = 5
+DEFAULT_BUDGET_SECONDS = 0.5
+
+_PROBE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(elapsed)
+print(",".join(name for name in {heavy!r} if name in sys.modules))
+"""
+
+
+def measure_import_time(module, repeat=DEFAULT_REPEAT, path=None):
+    """
+    Imports `module` in `repeat` fresh interpreters and returns
+    {"module", "medianSeconds", "minSeconds", "heavyModules"}.
+    `path` is the directory the module lives in (this file's directory by default).
+    """
+    path = path or os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [path, os.environ.get("PYTHONPATH")]))}
+    timings = []
+    heavy = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, env=env, check=True,
+        )
+        elapsed, loaded = completed.stdout.splitlines()[-2:]
+        timings.append(float(elapsed))
+        heavy = [name for name in loaded.split(",") if name]
+    return {
+        "module": module,
+        "medianSeconds": statistics.median(timings),
+        "minSeconds": min(timings),
+        "heavyModules": heavy,
+    }
+
+
+def check_import_budget(modules=None, budget_seconds=DEFAULT_BUDGET_SECONDS, repeat=DEFAULT_REPEAT):
+    """
+    Measures each module and returns (results, regressions), where a regression is a
+    module whose median import time exceeds `budget_seconds` or that imports a heavy module.
+    """
+    results = [measure_import_time(module, repeat) for module in modules or DEFAULT_MODULES]
+    regressions = [
+        result for result in results
+        if result["medianSeconds"] > budget_seconds or result["heavyModules"]
+    ]
+    return results, regressions
+
+
+def print_import_report(results, regressions):
+    """Prints one line per module, flagging regressions."""
+    flagged = {result["module"] for result in regressions}
+    for result in results:
+        heavy = f", imports {', '.join(result['heavyModules'])}" if result["heavyModules"] else ""
+        status = "REGRESSION" if result["module"] in flagged else "ok"
+        print(f"  [IMPORT] {result['module']}: {result['medianSeconds'] * 1000:.1f} ms median{heavy} ({status})")
+
+
+if __name__ == "__main__":
+    results, regressions = check_import_budget(sys.argv[1:] or None)
+    print_import_report(results, regressions)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,119 @@
+# ---Index Experiments Without Touching Live Indexes---
+# Compares a query's latency and plan with and without an index, without
+# dropping anything:
+#   "hint"   - forces a collection scan with hint({"$natural": 1}) vs. hint(index)
+#   "hidden" - hides the index from the planner (collMod), which keeps it
+#              maintained and keeps unique constraints enforced, then unhides it
+#   "shadow" - copies a $sample of the collection into a scratch collection and
+#              experiments there, leaving the live collection completely alone
+import statistics
+import time
+
+EXPERIMENT_MODES = ["hint", "hidden", "shadow"]
+DEFAULT_REPEAT = 5
+DEFAULT_SAMPLE_SIZE = 10000
+
+
+def _leaf_stage(plan):
+    """Returns the innermost stage name of a winning plan (e.g. COLLSCAN or IXSCAN)."""
+    plan = plan.get("queryPlan", plan)
+    while "inputStage" in plan:
+        plan = plan["inputStage"]
+    if "inputStages" in plan:
+        return "+".join(_leaf_stage(stage) for stage in plan["inputStages"])
+    return plan.get("stage")
+
+
+def _measure(collection, query, hint, repeat):
+    """
+    Runs a query `repeat` times and returns its median latency and execution stats.
+    hint=None leaves the plan choice to the query planner.
+    """
+    def cursor():
+        found = collection.find(query)
+        return found.hint(hint) if hint is not None else found
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(cursor())
+        timings.append(time.perf_counter() - started)
+    explain = cursor().explain()
+    stats = explain.get("executionStats", {})
+    return {
+        "medianSeconds": statistics.median(timings),
+        "stage": _leaf_stage(explain["queryPlanner"]["winningPlan"]),
+        "docsExamined": stats.get("totalDocsExamined"),
+        "keysExamined": stats.get("totalKeysExamined"),
+        "nReturned": stats.get("nReturned"),
+    }
+
+
+def _index_name(collection, keys):
+    """Returns the name of the index on `keys`, or None if the collection has none."""
+    for name, info in collection.index_information().items():
+        if list(info["key"]) == list(keys):
+            return name
+    return None
+
+
+def compare_index_plans(db, collection_name, query, index_keys, mode="hint", repeat=DEFAULT_REPEAT,
+                        sample_size=DEFAULT_SAMPLE_SIZE):
+    """
+    Measures `query` on a collection scan and on the index over `index_keys`
+    ([(field, direction), ...]) using the given experiment mode.
+    Returns {"mode", "collection", "unindexed", "indexed", "improvement"}.
+    """
+    if mode not in EXPERIMENT_MODES:
+        raise ValueError(f"Unsupported experiment mode '{mode}'. Must be one of {EXPERIMENT_MODES}.")
+    collection = db[collection_name]
+
+    if mode == "shadow":
+        shadow_name = f"{collection_name}_index_shadow"
+        db.drop_collection(shadow_name)
+        collection.aggregate([{"$sample": {"size": sample_size}}, {"$out": shadow_name}])
+        shadow = db[shadow_name]
+        try:
+            shadow.create_index(index_keys)
+            unindexed = _measure(shadow, query, {"$natural": 1}, repeat)
+            indexed = _measure(shadow, query, index_keys, repeat)
+        finally:
+            db.drop_collection(shadow_name)
+    else:
+        index_name = _index_name(collection, index_keys)
+        if index_name is None:
+            raise ValueError(f"No index on {index_keys} in '{collection_name}'; create it before the experiment.")
+        if mode == "hint":
+            unindexed = _measure(collection, query, {"$natural": 1}, repeat)
+            indexed = _measure(collection, query, index_name, repeat)
+        else:
+            db.command("collMod", collection_name, index={"name": index_name, "hidden": True})
+            try:
+                unindexed = _measure(collection, query, None, repeat)
+            finally:
+                db.command("collMod", collection_name, index={"name": index_name, "hidden": False})
+            indexed = _measure(collection, query, None, repeat)
+
+    try:
+        improvement = unindexed["medianSeconds"] / indexed["medianSeconds"]
+    except ZeroDivisionError:
+        improvement = None
+    return {
+        "mode": mode,
+        "collection": collection_name,
+        "unindexed": unindexed,
+        "indexed": indexed,
+        "improvement": improvement,
+    }
+
+
+def print_plan_comparison(result):
+    """Prints the before/after latency and plan of a compare_index_plans() result."""
+    for label, key in (("Unindexed", "unindexed"), ("Indexed", "indexed")):
+        run = result[key]
+        print(f"{label} query time: {run['medianSeconds']:.6f} seconds "
+              f"(stage: {run['stage']}, docs examined: {run['docsExamined']}, keys examined: {run['keysExamined']})")
+    if result["improvement"] is None:
+        print("Indexed query was too fast to measure improvement accurately.")
+    else:
+        print(f"Performance improvement: {result['improvement']:.2f}x faster ({result['mode']} mode)")
@@ -0,0 +1,165 @@
+# ---Paged Lesson Storage---
+# Lesson content lives in the `lessons` collection, one document per lesson,
+# indexed on (courseId, order). The course document only keeps a lightweight
+# outline ({lessonId, title, order}) so course reads stay small however long
+# the course grows, and lesson content is loaded page by page on demand.
+# The unique (courseId, order) index must exist before lessons are added
+# (ensure_lesson_indexes, called once at setup): add_lesson relies on it to
+# reject an order that is already taken.
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from eduhub_versions import bump_collection_version
+
+LESSONS_COLLECTION = "lessons"
+OUTLINE_FIELD = "lessonOutline"
+DEFAULT_PAGE_SIZE = 20
+MAX_ORDER_ATTEMPTS = 5
+
+
+def ensure_lesson_indexes(db):
+    """Creates the (courseId, order) index used for ordered pagination."""
+    db[LESSONS_COLLECTION].create_index([("courseId", ASCENDING), ("order", ASCENDING)], unique=True)
+    print(f"  [INDEX] Index ensured on '{LESSONS_COLLECTION}.courseId' and '{LESSONS_COLLECTION}.order'.")
+
+
+def _next_lesson_order(db, course_id):
+    """Atomically reserves the next lesson position in a course, or returns None if it doesn't exist."""
+    course = db.courses.find_one_and_update(
+        {"_id": course_id},
+        {"$inc": {"lessonCount": 1}},
+        projection={"lessonCount": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    return course["lessonCount"] if course else None
+
+
+def _catch_up_lesson_count(db, course_id):
+    """Raises the course's lessonCount to the highest order already stored for it."""
+    last = db[LESSONS_COLLECTION].find_one({"courseId": course_id}, {"order": 1}, sort=[("order", DESCENDING)])
+    if last:
+        db.courses.update_one({"_id": course_id}, {"$max": {"lessonCount": last["order"]}})
+
+
+def add_lesson(db, course_id, title, content):
+    """
+    Stores a lesson's content separately and appends it to the course outline.
+    An order already taken by a stored lesson (lessonCount behind the lesson store)
+    is rejected by the unique index; the count is caught up and a new order reserved.
+    If the outline update fails, the lesson is deleted again before the error is raised,
+    so the store never holds a lesson the outline doesn't list.
+    """
+    course_id = ObjectId(course_id)
+    lesson_id = ObjectId()
+    for attempt in range(1, MAX_ORDER_ATTEMPTS + 1):
+        order = _next_lesson_order(db, course_id)
+        if order is None:
+            print(f"  [CREATE] Failed to find course {course_id}.")
+            return None
+        try:
+            db[LESSONS_COLLECTION].insert_one(
+                {"_id": lesson_id, "courseId": course_id, "title": title, "content": content, "order": order}
+            )
+            break
+        except DuplicateKeyError:
+            if attempt == MAX_ORDER_ATTEMPTS:
+                raise
+            _catch_up_lesson_count(db, course_id)
+    try:
+        db.courses.update_one(
+            {"_id": course_id},
+            {"$push": {OUTLINE_FIELD: {"lessonId": lesson_id, "title": title, "order": order}}},
+        )
+    except PyMongoError:
+        db[LESSONS_COLLECTION].delete_one({"_id": lesson_id})
+        raise
+    bump_collection_version(db, "courses")
+    print(f"  [CREATE] Lesson '{title}' stored as #{order} of course {course_id}.")
+    return lesson_id
+
+
+def remove_lesson(db, course_id, lesson_title):
+    """Deletes a lesson by title and removes it from the course outline."""
+    course_id = ObjectId(course_id)
+    lesson = db[LESSONS_COLLECTION].find_one_and_delete(
+        {"courseId": course_id, "title": lesson_title}, projection={"_id": 1}
+    )
+    if not lesson:
+        print(f"  [DELETE] Lesson '{lesson_title}' not found in course {course_id}.")
+        return 0
+    db.courses.update_one({"_id": course_id}, {"$pull": {OUTLINE_FIELD: {"lessonId": lesson["_id"]}}})
+    bump_collection_version(db, "courses")
+    print(f"  [DELETE] Lesson '{lesson_title}' removed from course {course_id}.")
+    return 1
+
+
+def get_lesson_outline(db, course_id):
+    """Returns the course's lesson outline (no content) in lesson order."""
+    course = db.courses.find_one({"_id": ObjectId(course_id)}, {OUTLINE_FIELD: 1})
+    return sorted((course or {}).get(OUTLINE_FIELD, []), key=lambda lesson: lesson["order"])
+
+
+def get_lesson_page(db, course_id, after_order=0, limit=DEFAULT_PAGE_SIZE, include_content=True):
+    """
+    Returns up to `limit` lessons after position `after_order`, in order.
+    Uses range pagination on the (courseId, order) index, so every page costs
+    the same no matter how deep into the course it is.
+    """
+    projection = None if include_content else {"content": 0}
+    return list(
+        db[LESSONS_COLLECTION]
+        .find({"courseId": ObjectId(course_id), "order": {"$gt": after_order}}, projection)
+        .sort("order", ASCENDING)
+        .limit(limit)
+    )
+
+
+def get_lesson(db, lesson_id):
+    """Loads one lesson, content included."""
+    return db[LESSONS_COLLECTION].find_one({"_id": ObjectId(lesson_id)})
+
+
+def migrate_embedded_lessons(db, batch_size=100):
+    """
+    Moves every course's embedded `lessons` array into the lesson store,
+    replacing it with an outline. Courses are migrated one at a time, and the
+    embedded array is only removed once its lessons have been written.
+    """
+    ensure_lesson_indexes(db)
+    migrated_courses = 0
+    migrated_lessons = 0
+    cursor = db.courses.find({"lessons.0": {"$exists": True}}, {"lessons": 1, "lessonCount": 1}, batch_size=batch_size)
+    for course in cursor:
+        start = course.get("lessonCount", 0)
+        outline = []
+        writes = []
+        for position, lesson in enumerate(course["lessons"], start=start + 1):
+            lesson_id = lesson.get("lessonId") or ObjectId()
+            writes.append(UpdateOne(
+                {"_id": lesson_id},
+                {"$set": {
+                    "courseId": course["_id"],
+                    "title": lesson.get("title"),
+                    "content": lesson.get("content"),
+                    "order": position,
+                }},
+                upsert=True,
+            ))
+            outline.append({"lessonId": lesson_id, "title": lesson.get("title"), "order": position})
+        db[LESSONS_COLLECTION].bulk_write(writes, ordered=False)
+        db.courses.update_one(
+            {"_id": course["_id"]},
+            {
+                "$push": {OUTLINE_FIELD: {"$each": outline}},
+                "$set": {"lessonCount": start + len(outline)},
+                "$unset": {"lessons": ""},
+            },
+        )
+        migrated_courses += 1
+        migrated_lessons += len(outline)
+    if migrated_courses:
+        bump_collection_version(db, "courses")
+        bump_collection_version(db, LESSONS_COLLECTION)
+    print(f"  [MIGRATE] Moved {migrated_lessons} lesson(s) from {migrated_courses} course(s) into '{LESSONS_COLLECTION}'.")
+    return migrated_lessons
@@ -0,0 +1,344 @@
+# ---Mixed-workload Load Test for the Part 3 CRUD Functions---
+# Drives the Part 3 functions from many threads at once with a weighted mix of
+# operations (by default 70% reads, 20% grade/profile updates, 10% enrollments).
+# With a target rate the load is open-loop: operation i is due at start + i/rate,
+# and its response time is measured from when it was due, so a stalled server
+# shows up as queueing instead of silently lowering the offered load.
+# A monitor thread samples serverStatus once per interval, so throughput and
+# latency can be read next to the server's lock queues and opcounters over time.
+import contextlib
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+import eduhub_queries as part3
+from eduhub_sketches import record_submission_grades
+
+DEFAULT_MIX = {
+    "find_students_in_course": 35,
+    "retrieve_course_with_instructor": 35,
+    "update_assignment_grade": 10,
+    "update_user_profile": 10,
+    "enroll_student_in_course": 10,
+}
+DEFAULT_THREADS = 8
+DEFAULT_DURATION_SECONDS = 10.0
+DEFAULT_SAMPLE_INTERVAL = 1.0
+DEFAULT_FIXTURE_SIZE = 1000
+PERCENTILES = (50, 95, 99)
+
+
+# Each operation calls one Part 3 function with ids drawn from the fixtures
+def _find_students(db, fixtures, rng):
+    return part3.find_students_in_course(db, rng.choice(fixtures["courses"]))
+
+
+def _retrieve_course(db, fixtures, rng):
+    return part3.retrieve_course_with_instructor(db, rng.choice(fixtures["courses"]))
+
+
+def _update_grade(db, fixtures, rng):
+    enrollment_id, assignment_name = rng.choice(fixtures["grades"])
+    return part3.update_assignment_grade(db, enrollment_id, assignment_name, rng.randint(50, 100))
+
+
+def _update_profile(db, fixtures, rng):
+    return part3.update_user_profile(db, rng.choice(fixtures["students"]), {"lastActive": rng.random()})
+
+
+def _enroll(db, fixtures, rng):
+    # Mostly new pairs; a repeat exercises the already-enrolled path
+    return part3.enroll_student_in_course(db, rng.choice(fixtures["students"]), rng.choice(fixtures["courses"]))
+
+
+OPERATIONS = {
+    "find_students_in_course": _find_students,
+    "retrieve_course_with_instructor": _retrieve_course,
+    "update_assignment_grade": _update_grade,
+    "update_user_profile": _update_profile,
+    "enroll_student_in_course": _enroll,
+}
+
+
+def load_fixtures(db, limit=DEFAULT_FIXTURE_SIZE):
+    """
+    Collects the ids the operations draw from: {"courses", "students", "grades"}, where
+    grades are (enrollment id, assignment name) pairs. Raises ValueError if there are
+    no courses or students to work with (run Part 3 or seed_load_data() first).
+    """
+    fixtures = {
+        "courses": [doc["_id"] for doc in db.courses.find({}, {"_id": 1}).limit(limit)],
+        "students": [doc["_id"] for doc in db.users.find({"role": "student"}, {"_id": 1}).limit(limit)],
+        "grades": [
+            (doc["_id"], grade["assignmentName"])
+            for doc in db.enrollments.find({"grades.assignmentName": {"$exists": True}}, {"grades.assignmentName": 1}).limit(limit)
+            for grade in doc["grades"]
+        ],
+    }
+    if not fixtures["courses"] or not fixtures["students"]:
+        raise ValueError("The load test needs courses and students; run Part 3 or seed_load_data() first.")
+    return fixtures
+
+
+def seed_load_data(db, students=1000, courses=100, enrollments_per_student=3, seed=None):
+    """Inserts synthetic instructors, students, courses and graded enrollments shaped like the Part 3 data."""
+    rng = random.Random(seed)
+    instructors = db.users.insert_many([
+        {"username": f"load_instructor_{i}", "email": f"load_instructor_{i}@edu.com", "role": "instructor",
+         "isActive": True, "profile": {}}
+        for i in range(max(1, courses // 10))
+    ]).inserted_ids
+    student_ids = db.users.insert_many([
+        {"username": f"load_student_{i}", "email": f"load_student_{i}@student.com", "role": "student",
+         "isActive": True, "profile": {}}
+        for i in range(students)
+    ]).inserted_ids
+    course_ids = db.courses.insert_many([
+        {"title": f"Load Test Course {i}", "instructorId": rng.choice(instructors), "category": "Programming",
+         "isPublished": True, "lessons": [], "tags": []}
+        for i in range(courses)
+    ]).inserted_ids
+    enrollments = [
+        {"studentId": student_id, "courseId": course_id,
+         "grades": [{"assignmentName": "Quiz 1", "score": rng.randint(50, 100)}]}
+        for student_id in student_ids
+        for course_id in rng.sample(course_ids, min(enrollments_per_student, len(course_ids)))
+    ]
+    db.enrollments.insert_many(enrollments)
+    # The update_assignment_grade operation regrades these, so the grade sketches have to count them first
+    record_submission_grades(db, [
+        (grade["assignmentName"], enrollment["studentId"], grade["score"], enrollment["courseId"], None)
+        for enrollment in enrollments for grade in enrollment["grades"]
+    ])
+    print(f"  [LOAD] Seeded {students} students, {courses} courses and "
+          f"{students * min(enrollments_per_student, courses)} enrollments.")
+
+
+def _percentiles(latencies):
+    """Nearest-rank percentiles (in seconds) of a list of latencies, plus the maximum."""
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+    result = {f"p{p}": ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))] for p in PERCENTILES}
+    result["max"] = ordered[-1]
+    return result
+
+
+def _server_sample(db):
+    """The lock, queue and opcounter parts of serverStatus (None if the command isn't allowed)."""
+    try:
+        status = db.command("serverStatus")
+    except Exception:
+        return None
+    global_lock = status.get("globalLock", {})
+    return {
+        "opcounters": dict(status.get("opcounters", {})),
+        "currentQueue": dict(global_lock.get("currentQueue", {})),
+        "activeClients": dict(global_lock.get("activeClients", {})),
+        "connections": status.get("connections", {}).get("current"),
+        # Storage-engine read/write tickets in use, where the server reports them
+        "tickets": {
+            kind: tickets.get("out")
+            for kind, tickets in status.get("wiredTiger", {}).get("concurrentTransactions", {}).items()
+        },
+    }
+
+
+class LoadTest:
+    """
+    One load test run against `db`. `mix` maps OPERATIONS names to relative weights;
+    `rate` is the target operations per second across all threads (None runs closed-loop,
+    every thread as fast as it can). No operation is scheduled after `duration` seconds
+    or past `max_operations`; operations still queued then run to completion, so an
+    overloaded run takes longer than `duration` and its response times show the backlog.
+    """
+
+    def __init__(self, db, mix=None, threads=DEFAULT_THREADS, rate=None, duration=DEFAULT_DURATION_SECONDS,
+                 max_operations=None, sample_interval=DEFAULT_SAMPLE_INTERVAL, fixtures=None, seed=None):
+        mix = mix or DEFAULT_MIX
+        unknown = set(mix) - set(OPERATIONS)
+        if unknown:
+            raise ValueError(f"Unknown operation(s) {sorted(unknown)}. Must be among {list(OPERATIONS)}.")
+        if threads < 1:
+            raise ValueError("threads must be at least 1.")
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be positive (or None for closed-loop).")
+        self.db = db
+        self.names = [name for name, weight in mix.items() if weight > 0]
+        self.weights = [mix[name] for name in self.names]
+        self.threads = threads
+        self.rate = rate
+        self.duration = duration
+        self.max_operations = max_operations
+        self.sample_interval = sample_interval
+        self.fixtures = fixtures
+        self.seed = seed
+        self._ticket = 0
+        self._ticket_lock = threading.Lock()
+        self._stop = threading.Event()
+        # (completed at, operation, service seconds, response seconds, error type or None)
+        self._records = []
+
+    def _next_due(self, started):
+        """Claims the next operation slot; returns when it is due, or None once the run is over."""
+        with self._ticket_lock:
+            ticket = self._ticket
+            self._ticket += 1
+        if self.max_operations is not None and ticket >= self.max_operations:
+            return None
+        due = started + ticket / self.rate if self.rate else time.perf_counter()
+        if due - started >= self.duration:
+            return None
+        return due
+
+    def _worker(self, index, started):
+        rng = random.Random(None if self.seed is None else self.seed + index)
+        records = []
+        while not self._stop.is_set():
+            due = self._next_due(started)
+            if due is None:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            name = rng.choices(self.names, self.weights)[0]
+            began = time.perf_counter()
+            error = None
+            try:
+                OPERATIONS[name](self.db, self.fixtures, rng)
+            except Exception as exc:
+                error = type(exc).__name__
+            finished = time.perf_counter()
+            records.append((finished - started, name, finished - began, finished - min(due, began), error))
+        with self._ticket_lock:
+            self._records.extend(records)
+
+    def _monitor(self, started, timeline):
+        previous = _server_sample(self.db)
+        while not self._stop.wait(self.sample_interval):
+            sample = _server_sample(self.db)
+            if sample is not None:
+                sample["elapsed"] = time.perf_counter() - started
+                if previous is not None:
+                    sample["opcountersPerSecond"] = {
+                        kind: (count - previous["opcounters"].get(kind, 0)) / self.sample_interval
+                        for kind, count in sample["opcounters"].items()
+                    }
+                timeline.append(sample)
+            previous = sample
+
+    def run(self, quiet=True):
+        """
+        Runs the load and returns the report (see summarize). `quiet` silences the
+        per-call prints of the Part 3 functions while the load runs.
+        """
+        if self.fixtures is None:
+            self.fixtures = load_fixtures(self.db)
+        if "update_assignment_grade" in self.names and not self.fixtures["grades"]:
+            raise ValueError("update_assignment_grade needs graded enrollments; run seed_load_data() first.")
+
+        timeline = []
+        started = time.perf_counter()
+        workers = [threading.Thread(target=self._worker, args=(index, started), daemon=True)
+                   for index in range(self.threads)]
+        monitor = threading.Thread(target=self._monitor, args=(started, timeline), daemon=True)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull if quiet else sys.stdout):
+            monitor.start()
+            for worker in workers:
+                worker.start()
+            try:
+                for worker in workers:
+                    worker.join()
+            finally:
+                self._stop.set()
+                monitor.join()
+        return self.summarize(time.perf_counter() - started, timeline)
+
+    def summarize(self, elapsed, timeline):
+        """
+        Builds {"elapsed", "threads", "targetRate", "operations", "throughput", "errors",
+        "latency", "perOperation", "timeline"}. Latencies are in seconds: "service" is the
+        call itself, "response" also counts the time an operation waited past its due time.
+        Each timeline entry is a serverStatus sample plus the client throughput and p95 of that interval.
+        """
+        records = sorted(self._records)
+        per_operation = {}
+        for name in self.names:
+            mine = [record for record in records if record[1] == name]
+            per_operation[name] = {
+                "operations": len(mine),
+                "errors": sum(1 for record in mine if record[4]),
+                "service": _percentiles([record[2] for record in mine]),
+                "response": _percentiles([record[3] for record in mine]),
+            }
+
+        lower = 0.0
+        for sample in timeline:
+            window = [record for record in records if lower <= record[0] < sample["elapsed"]]
+            sample["throughput"] = len(window) / max(sample["elapsed"] - lower, 1e-9)
+            sample["p95"] = _percentiles([record[3] for record in window]).get("p95")
+            lower = sample["elapsed"]
+
+        return {
+            "elapsed": elapsed,
+            "threads": self.threads,
+            "targetRate": self.rate,
+            "operations": len(records),
+            "throughput": len(records) / elapsed if elapsed else 0.0,
+            "errors": dict(Counter(record[4] for record in records if record[4])),
+            "latency": {
+                "service": _percentiles([record[2] for record in records]),
+                "response": _percentiles([record[3] for record in records]),
+            },
+            "perOperation": per_operation,
+            "timeline": timeline,
+        }
+
+
+def run_load_test(db, **options):
+    """Runs a LoadTest with the given options and returns its report."""
+    return LoadTest(db, **options).run()
+
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.1f} ms"
+
+
+def print_load_report(report):
+    """Prints the totals, one line per operation and one line per monitor sample."""
+    target = f"target {report['targetRate']:g} ops/s" if report["targetRate"] else "closed-loop"
+    errors = ", ".join(f"{name} x{count}" for name, count in report["errors"].items()) or "none"
+    response = report["latency"]["response"]
+    print(f"  [LOAD] {report['operations']} ops in {report['elapsed']:.1f} s on {report['threads']} thread(s) "
+          f"({target}): {report['throughput']:.1f} ops/s, errors: {errors}")
+    print(f"  [LOAD] response p50 {_ms(response.get('p50'))}, p95 {_ms(response.get('p95'))}, "
+          f"p99 {_ms(response.get('p99'))}, max {_ms(response.get('max'))}")
+    for name, stats in report["perOperation"].items():
+        service = stats["service"]
+        print(f"   - {name}: {stats['operations']} ops, {stats['errors']} error(s), service p50 {_ms(service.get('p50'))}, "
+              f"p95 {_ms(service.get('p95'))}, p99 {_ms(service.get('p99'))}")
+    for sample in report["timeline"]:
+        queue, active = sample["currentQueue"], sample["activeClients"]
+        opcounters = sample.get("opcountersPerSecond", {})
+        print(f"  [LOAD] t={sample['elapsed']:5.1f}s {sample['throughput']:7.1f} ops/s, p95 {_ms(sample['p95'])}, "
+              f"queued {queue.get('total', 0)} (r {queue.get('readers', 0)}/w {queue.get('writers', 0)}), "
+              f"active {active.get('total', 0)}, server query/update/insert/command "
+              f"{opcounters.get('query', 0):.0f}/{opcounters.get('update', 0):.0f}/{opcounters.get('insert', 0):.0f}/"
+              f"{opcounters.get('command', 0):.0f} per s")
+
+
+if __name__ == "__main__":
+    # python eduhub_loadtest.py [uri] [rate]: load-tests the Part 3 database (seeding it if it's empty)
+    from eduhub_client import get_client
+
+    uri = sys.argv[1] if len(sys.argv) > 1 else part3.MONGO_CONNECTION_STRING
+    target_rate = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    database = get_client(uri)[part3.LMS_DATABASE_NAME]
+    try:
+        load_fixtures(database)
+    except ValueError:
+        seed_load_data(database)
+    print_load_report(run_load_test(database, rate=target_rate))
@@ -0,0 +1,2174 @@
+# ---In-Memory Backend---
+# An in-process stand-in for MongoDB that implements the find/update/aggregate
+# subset the eduhub modules use, so the Part 3 functions, validation, result
+# conversion and caching can be tested and benchmarked without a mongod.
+# Documents live in a dict keyed by _id. Secondary indexes are either hashed
+# (equality lookups) or sorted (equality, ranges and index-ordered sorts), and
+# unique indexes raise the same DuplicateKeyError/BulkWriteError as the server.
+# Aggregation covers the stages in _STAGES ($lookup by localField/foreignField, by
+# let/pipeline or both; $merge; $out) and the expressions in _EXPRESSIONS (including
+# $dateTrunc in UTC and $arrayToObject), and find() projections support "array.$".
+# Anything else ($facet, $bucket, $graphLookup, $unionWith, $setWindowFields, ...)
+# raises OperationFailure naming the stage or expression.
+# eduhub_client.get_client("memory://<name>") returns a shared MemoryClient.
+import bisect
+import itertools
+import math
+import operator
+import random
+import re
+import threading
+import time
+from collections.abc import Mapping
+from datetime import datetime, timedelta, UTC
+
+import bson
+from bson.codec_options import CodecOptions
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure, WriteError
+from pymongo.operations import DeleteMany, DeleteOne, IndexModel, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+DUPLICATE_KEY_CODE = 11000
+DOCUMENT_VALIDATION_CODE = 121
+
+_MISSING = object()
+# Sorts after every BSON value key, for exclusive upper bounds in sorted indexes
+_MAX_KEY = (99,)
+
+
+# ---Values: copies, comparison keys and field paths---
+
+def _copy(value, tzinfo=None):
+    """
+    Deep-copies a value the way a BSON round trip would: datetimes become naive UTC
+    with millisecond precision (or aware in `tzinfo`), tuples become lists.
+    """
+    if isinstance(value, Mapping):
+        return {key: _copy(item, tzinfo) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_copy(item, tzinfo) for item in value]
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(UTC).replace(tzinfo=None)
+        value = value.replace(microsecond=value.microsecond // 1000 * 1000)
+        return value.replace(tzinfo=tzinfo) if tzinfo else value
+    return value
+
+
+def _key(value):
+    """Orderable, hashable key for a BSON value, following the server's cross-type sort order."""
+    if value is None or value is _MISSING:
+        return (1,)
+    if isinstance(value, bool):
+        return (8, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    if isinstance(value, Mapping):
+        return (4, tuple((field, _key(item)) for field, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return (5, tuple(_key(item) for item in value))
+    if isinstance(value, bytes):
+        return (6, value)
+    if isinstance(value, ObjectId):
+        # ObjectIds order by their 12 bytes; comparing the bytes avoids ObjectId's Python-level __lt__
+        return (7, value.binary)
+    if isinstance(value, datetime):
+        return (9, value if value.tzinfo else value.replace(tzinfo=UTC))
+    if isinstance(value, re.Pattern):
+        return (11, value.pattern)
+    return (12, repr(value))
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _path_values(value, parts):
+    """Yields the values at a dotted path, descending into arrays the way queries do."""
+    if not parts:
+        yield value
+        return
+    head = parts[0]
+    if isinstance(value, list):
+        if head.isdigit() and int(head) < len(value):
+            yield from _path_values(value[int(head)], parts[1:])
+        for item in value:
+            if isinstance(item, Mapping):
+                yield from _path_values(item, parts)
+    elif isinstance(value, Mapping) and head in value:
+        yield from _path_values(value[head], parts[1:])
+
+
+def _candidates(values):
+    """Values a query condition is tested against: each value, plus the elements of arrays."""
+    for value in values:
+        if isinstance(value, list):
+            yield from value
+        yield value
+
+
+def _get_value(document, parts):
+    """Reads a dotted path without array traversal (numeric parts index arrays); _MISSING if absent."""
+    value = document
+    for part in parts:
+        if isinstance(value, Mapping) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+    return value
+
+
+def _set_value(document, parts, value):
+    """Sets a dotted path, creating intermediate documents."""
+    target = document
+    for part in parts[:-1]:
+        if isinstance(target, list) and part.isdigit():
+            index = int(part)
+            target.extend([None] * (index + 1 - len(target)))
+            if target[index] is None:
+                target[index] = {}
+            target = target[index]
+        elif isinstance(target, Mapping):
+            if not isinstance(target.get(part), (Mapping, list)):
+                target[part] = {}
+            target = target[part]
+        else:
+            raise WriteError(f"Cannot create field '{part}' in element {target!r}", 28)
+    last = parts[-1]
+    if isinstance(target, list) and last.isdigit():
+        index = int(last)
+        target.extend([None] * (index + 1 - len(target)))
+        target[index] = value
+    elif isinstance(target, Mapping):
+        target[last] = value
+    else:
+        raise WriteError(f"Cannot create field '{last}' in element {target!r}", 28)
+
+
+def _unset_value(document, parts):
+    """Removes a dotted path; array elements are set to null, as on the server."""
+    parent = _get_value(document, parts[:-1]) if len(parts) > 1 else document
+    last = parts[-1]
+    if isinstance(parent, Mapping):
+        parent.pop(last, None)
+    elif isinstance(parent, list) and last.isdigit() and int(last) < len(parent):
+        parent[int(last)] = None
+
+
+# ---Query filters---
+
+def _regex(pattern, options=""):
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    flags = 0
+    for option, flag in (("i", re.IGNORECASE), ("m", re.MULTILINE), ("s", re.DOTALL), ("x", re.VERBOSE)):
+        if option in options:
+            flags |= flag
+    return re.compile(pattern, flags)
+
+
+_TYPE_CHECKS = {
+    "double": lambda value: isinstance(value, float),
+    "string": lambda value: isinstance(value, str),
+    "object": lambda value: isinstance(value, Mapping),
+    "array": lambda value: isinstance(value, list),
+    "binData": lambda value: isinstance(value, bytes),
+    "objectId": lambda value: isinstance(value, ObjectId),
+    "bool": lambda value: isinstance(value, bool),
+    "date": lambda value: isinstance(value, datetime),
+    "null": lambda value: value is None,
+    "regex": lambda value: isinstance(value, re.Pattern),
+    "int": lambda value: _is_number(value) and isinstance(value, int),
+    "long": lambda value: _is_number(value) and isinstance(value, int),
+    "number": _is_number,
+}
+
+_COMPARISONS = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+
+
+def _compile_operator(name, argument, options):
+    """Compiles one query operator into a test over the values found at a field path."""
+    if name == "$eq":
+        if isinstance(argument, re.Pattern):
+            return _compile_operator("$regex", argument, options)
+        expected = _key(argument)
+        if argument is None:
+            return lambda values: not values or any(value is None for value in _candidates(values))
+        return lambda values: any(_key(value) == expected for value in _candidates(values))
+    if name == "$ne":
+        equal = _compile_operator("$eq", argument, options)
+        return lambda values: not equal(values)
+    if name in _COMPARISONS:
+        compare, bound = _COMPARISONS[name], _key(argument)
+        return lambda values: any(
+            key[0] == bound[0] and compare(key, bound) for key in map(_key, _candidates(values))
+        )
+    if name in ("$in", "$nin"):
+        patterns = [item for item in argument if isinstance(item, re.Pattern)]
+        keys = {_key(item) for item in argument if not isinstance(item, re.Pattern)}
+        matches_missing = (1,) in keys
+
+        def contained(values):
+            if matches_missing and not values:
+                return True
+            return any(
+                _key(value) in keys or (isinstance(value, str) and any(p.search(value) for p in patterns))
+                for value in _candidates(values)
+            )
+        return contained if name == "$in" else (lambda values: not contained(values))
+    if name == "$all":
+        keys = [_key(item) for item in argument]
+        return lambda values: bool(keys) and set(keys) <= set(map(_key, _candidates(values)))
+    if name == "$exists":
+        return lambda values: bool(values) == bool(argument)
+    if name == "$regex":
+        pattern = _regex(argument, options)
+        return lambda values: any(isinstance(value, str) and pattern.search(value) for value in _candidates(values))
+    if name == "$size":
+        return lambda values: any(isinstance(value, list) and len(value) == argument for value in values)
+    if name == "$type":
+        aliases = argument if isinstance(argument, list) else [argument]
+        if any(alias not in _TYPE_CHECKS for alias in aliases):
+            raise OperationFailure(f"Unknown type name alias: {aliases}", 2)
+        checks = [_TYPE_CHECKS[alias] for alias in aliases]
+        return lambda values: any(check(value) for value in _candidates(values) for check in checks)
+    if name == "$elemMatch":
+        if all(field.startswith("$") for field in argument):
+            condition = _compile_condition(argument)
+            element_matches = lambda element: condition([element])
+        else:
+            predicate = compile_filter(argument)
+            element_matches = lambda element: isinstance(element, Mapping) and predicate(element)
+        return lambda values: any(
+            isinstance(value, list) and any(element_matches(element) for element in value) for value in values
+        )
+    if name == "$not":
+        condition = _compile_condition(argument)
+        return lambda values: not condition(values)
+    raise OperationFailure(f"unknown operator: {name}", 2)
+
+
+def _compile_condition(condition):
+    """Compiles the condition on one field (a value, a regex or an operator document)."""
+    if isinstance(condition, Mapping) and condition and all(name.startswith("$") for name in condition):
+        options = condition.get("$options", "")
+        tests = [
+            _compile_operator(name, argument, options)
+            for name, argument in condition.items() if name != "$options"
+        ]
+        return lambda values: all(test(values) for test in tests)
+    return _compile_operator("$eq", condition, "")
+
+
+def compile_filter(query):
+    """Compiles a query filter into a predicate over documents."""
+    tests = []
+    for field, condition in (query or {}).items():
+        if field in ("$and", "$or", "$nor"):
+            predicates = [compile_filter(clause) for clause in condition]
+            combine = {"$and": all, "$or": any, "$nor": lambda results: not any(results)}[field]
+            tests.append(lambda document, p=predicates, c=combine: c(predicate(document) for predicate in p))
+        elif field == "$expr":
+            tests.append(lambda document, e=condition: _truthy(_evaluate(e, document)))
+        elif field.startswith("$"):
+            raise OperationFailure(f"unknown top level operator: {field}", 2)
+        else:
+            parts, test = field.split("."), _compile_condition(condition)
+            tests.append(lambda document, p=parts, t=test: t(list(_path_values(document, p))))
+    if len(tests) == 1:
+        return tests[0]
+    return lambda document: all(test(document) for test in tests)
+
+
+def _index_bounds(condition):
+    """
+    Turns a field condition into index bounds: ("eq", [keys]) for equality and $in,
+    ("range", lower, upper) for comparisons, or None if no index can narrow it.
+    """
+    def usable(value):
+        return not isinstance(value, (list, re.Pattern))
+
+    if not (isinstance(condition, Mapping) and condition and all(name.startswith("$") for name in condition)):
+        return ("eq", [_key(condition)]) if usable(condition) else None
+    if "$eq" in condition and usable(condition["$eq"]):
+        return ("eq", [_key(condition["$eq"])])
+    if "$in" in condition and all(usable(item) for item in condition["$in"]):
+        return ("eq", sorted({_key(item) for item in condition["$in"]}))
+    limits = {name: _key(condition[name]) for name in _COMPARISONS if name in condition}
+    ranks = {key[0] for key in limits.values()}
+    if len(ranks) != 1:
+        return None
+    # Comparisons only match values of the same type, so the bounds never leave its key range
+    rank, = ranks
+    lower, upper = ((rank,),), ((rank + 1,),)
+    if "$gte" in limits:
+        lower = (limits["$gte"],)
+    if "$gt" in limits:
+        lower = (limits["$gt"], _MAX_KEY)
+    if "$lte" in limits:
+        upper = (limits["$lte"], _MAX_KEY)
+    if "$lt" in limits:
+        upper = (limits["$lt"],)
+    return ("range", lower, upper)
+
+
+# ---Aggregation expressions---
+
+def _truthy(value):
+    return not (value is None or value is _MISSING or value is False or (_is_number(value) and value == 0))
+
+
+def _field_value(document, parts):
+    """Evaluates a "$field.path" expression; arrays along the path map over their elements."""
+    value = document
+    for part in parts:
+        if isinstance(value, list):
+            value = [item[part] for item in value if isinstance(item, Mapping) and part in item]
+        elif isinstance(value, Mapping) and part in value:
+            value = value[part]
+        else:
+            return _MISSING
+    return value
+
+
+def _evaluate(expression, document, variables=None):
+    """Evaluates an aggregation expression against a document; absent fields evaluate to _MISSING."""
+    if isinstance(expression, str) and expression.startswith("$"):
+        if expression.startswith("$$"):
+            name, _, path = expression[2:].partition(".")
+            if name in ("ROOT", "CURRENT"):
+                root = document
+            elif name == "REMOVE":
+                return _MISSING
+            elif variables and name in variables:
+                root = variables[name]
+            else:
+                raise OperationFailure(f"Use of undefined variable: {name}", 17276)
+            return _field_value(root, path.split(".")) if path else root
+        return _field_value(document, expression[1:].split("."))
+    if isinstance(expression, Mapping):
+        if len(expression) == 1:
+            (name, argument), = expression.items()
+            if name.startswith("$"):
+                if name not in _EXPRESSIONS:
+                    raise OperationFailure(f"Unrecognized expression '{name}'", 168)
+                return _EXPRESSIONS[name](argument, document, variables)
+        evaluated = {field: _evaluate(item, document, variables) for field, item in expression.items()}
+        return {field: value for field, value in evaluated.items() if value is not _MISSING}
+    if isinstance(expression, list):
+        return [_null(_evaluate(item, document, variables)) for item in expression]
+    return expression
+
+
+def _null(value):
+    return None if value is _MISSING else value
+
+
+def _arguments(argument, document, variables):
+    """Evaluates an operator's argument list (a single argument may be given bare)."""
+    items = argument if isinstance(argument, list) else [argument]
+    return [_null(_evaluate(item, document, variables)) for item in items]
+
+
+def _numeric(function):
+    """Wraps an arithmetic operator: null/missing in gives null out."""
+    def evaluate(argument, document, variables):
+        values = _arguments(argument, document, variables)
+        if any(value is None for value in values):
+            return None
+        return function(*values)
+    return evaluate
+
+
+def _concat(argument, document, variables):
+    values = _arguments(argument, document, variables)
+    if any(value is None for value in values):
+        return None
+    if not all(isinstance(value, str) for value in values):
+        raise OperationFailure("$concat only supports strings", 16702)
+    return "".join(values)
+
+
+def _size(argument, document, variables):
+    value, = _arguments(argument, document, variables)
+    if not isinstance(value, list):
+        raise OperationFailure("The argument to $size must be an array", 17124)
+    return len(value)
+
+
+def _round(value, places=0):
+    rounded = round(value, places)
+    return int(rounded) if isinstance(value, int) and places >= 0 else rounded
+
+
+def _divide(dividend, divisor):
+    if divisor == 0:
+        raise OperationFailure("can't $divide by zero", 2)
+    return dividend / divisor
+
+
+def _add(*values):
+    dates = [value for value in values if isinstance(value, datetime)]
+    total = sum(value for value in values if not isinstance(value, datetime))
+    return dates[0] + timedelta(milliseconds=total) if dates else total
+
+
+def _subtract(minuend, subtrahend):
+    if isinstance(minuend, datetime) and isinstance(subtrahend, datetime):
+        return int(round((minuend - subtrahend).total_seconds() * 1000))
+    if isinstance(minuend, datetime):
+        return minuend - timedelta(milliseconds=subtrahend)
+    return minuend - subtrahend
+
+
+def _cond(argument, document, variables):
+    if isinstance(argument, Mapping):
+        condition, then, otherwise = argument["if"], argument["then"], argument["else"]
+    else:
+        condition, then, otherwise = argument
+    chosen = then if _truthy(_evaluate(condition, document, variables)) else otherwise
+    return _null(_evaluate(chosen, document, variables))
+
+
+def _compare(function):
+    def evaluate(argument, document, variables):
+        first, second = _arguments(argument, document, variables)
+        return function(_key(first), _key(second))
+    return evaluate
+
+
+def _if_null(argument, document, variables):
+    for item in argument[:-1]:
+        value = _null(_evaluate(item, document, variables))
+        if value is not None:
+            return value
+    return _null(_evaluate(argument[-1], document, variables))
+
+
+def _to_string(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime):
+        value = _copy(value)
+        return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+    return str(value)
+
+
+def _date_to_string(argument, document, variables):
+    date = _null(_evaluate(argument["date"], document, variables))
+    if date is None:
+        return _null(_evaluate(argument.get("onNull"), document, variables))
+    if not isinstance(date, datetime):
+        raise OperationFailure("can't convert from BSON type to Date", 16006)
+    date = _copy(date)
+    format = argument.get("format", "%Y-%m-%dT%H:%M:%S.%LZ")
+    return date.strftime(format.replace("%L", f"{date.microsecond // 1000:03d}"))
+
+
+# $dateTrunc bins count from this reference date, like the server's
+_DATE_TRUNC_REFERENCE = datetime(2000, 1, 1)
+_MONTH_UNITS = {"year": 12, "quarter": 3, "month": 1}
+_FIXED_UNITS = {
+    "week": timedelta(weeks=1),
+    "day": timedelta(days=1),
+    "hour": timedelta(hours=1),
+    "minute": timedelta(minutes=1),
+    "second": timedelta(seconds=1),
+    "millisecond": timedelta(milliseconds=1),
+}
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+def _date_trunc(argument, document, variables):
+    date = _null(_evaluate(argument["date"], document, variables))
+    unit = _null(_evaluate(argument["unit"], document, variables))
+    bin_size = _null(_evaluate(argument.get("binSize", 1), document, variables))
+    timezone = _null(_evaluate(argument.get("timezone"), document, variables))
+    if date is None or unit is None or bin_size is None:
+        return None
+    if not isinstance(date, datetime):
+        raise OperationFailure("$dateTrunc requires 'date' to be a date", 5439012)
+    if timezone not in (None, "UTC", "GMT", "Z", "+00:00"):
+        raise OperationFailure(f"$dateTrunc timezone '{timezone}' is not supported by the in-memory backend", 2)
+    date = _copy(date)
+    if unit in _MONTH_UNITS:
+        months = (date.year - _DATE_TRUNC_REFERENCE.year) * 12 + date.month - 1
+        months -= months % (_MONTH_UNITS[unit] * bin_size)
+        return datetime(_DATE_TRUNC_REFERENCE.year + months // 12, months % 12 + 1, 1)
+    if unit not in _FIXED_UNITS:
+        raise OperationFailure(f"$dateTrunc parameter 'unit' value cannot be recognized as a time unit: {unit}", 5439014)
+    reference = _DATE_TRUNC_REFERENCE
+    if unit == "week":
+        start_of_week = str(argument.get("startOfWeek", "sunday")).lower()
+        weekdays = [day for day, name in enumerate(_WEEKDAYS) if start_of_week in (name, name[:3])]
+        if not weekdays:
+            raise OperationFailure(f"$dateTrunc parameter 'startOfWeek' value cannot be recognized as a day of a week: {start_of_week}", 5439016)
+        reference += timedelta(days=(weekdays[0] - reference.weekday()) % 7)
+    step = _FIXED_UNITS[unit] * bin_size
+    return reference + (date - reference) // step * step
+
+
+def _array_to_object(array):
+    if not isinstance(array, list):
+        raise OperationFailure("$arrayToObject requires an array input", 40386)
+    result = {}
+    for pair in array:
+        if isinstance(pair, Mapping) and set(pair) == {"k", "v"}:
+            key, value = pair["k"], pair["v"]
+        elif isinstance(pair, list) and len(pair) == 2:
+            key, value = pair
+        else:
+            raise OperationFailure("$arrayToObject requires an array of [k, v] pairs or {k, v} documents", 40398)
+        if not isinstance(key, str):
+            raise OperationFailure("$arrayToObject requires the key to be a string", 40394)
+        result[key] = value
+    return result
+
+
+def _object_to_array(value):
+    if not isinstance(value, Mapping):
+        raise OperationFailure("$objectToArray requires a document input", 40390)
+    return [{"k": key, "v": item} for key, item in value.items()]
+
+
+def _array_reduce(function):
+    """$sum/$avg/$min/$max used as expressions: over an array argument, or over several arguments."""
+    def evaluate(argument, document, variables):
+        values = _arguments(argument, document, variables)
+        if len(values) == 1 and isinstance(values[0], list):
+            values = values[0]
+        return function([value for value in values if value is not None])
+    return evaluate
+
+
+def _average(values):
+    numbers = [value for value in values if _is_number(value)]
+    return sum(numbers) / len(numbers) if numbers else None
+
+
+_EXPRESSIONS = {
+    "$literal": lambda argument, document, variables: argument,
+    "$concat": _concat,
+    "$size": _size,
+    "$round": _numeric(_round),
+    "$floor": _numeric(math.floor),
+    "$ceil": _numeric(math.ceil),
+    "$abs": _numeric(abs),
+    "$divide": _numeric(_divide),
+    "$multiply": _numeric(lambda *values: math.prod(values)),
+    "$add": _numeric(_add),
+    "$subtract": _numeric(_subtract),
+    "$cond": _cond,
+    "$ifNull": _if_null,
+    "$eq": _compare(operator.eq),
+    "$ne": _compare(operator.ne),
+    "$gt": _compare(operator.gt),
+    "$gte": _compare(operator.ge),
+    "$lt": _compare(operator.lt),
+    "$lte": _compare(operator.le),
+    "$cmp": _compare(lambda first, second: (first > second) - (first < second)),
+    "$and": lambda argument, document, variables: all(
+        _truthy(_evaluate(item, document, variables)) for item in argument),
+    "$or": lambda argument, document, variables: any(
+        _truthy(_evaluate(item, document, variables)) for item in argument),
+    "$not": lambda argument, document, variables: not _truthy(_arguments(argument, document, variables)[0]),
+    "$in": lambda argument, document, variables: (lambda value, array: _key(value) in set(map(_key, array)))(
+        *_arguments(argument, document, variables)),
+    "$arrayElemAt": _numeric(lambda array, index: array[index] if -len(array) <= index < len(array) else _MISSING),
+    "$toString": _numeric(_to_string),
+    "$toLower": _numeric(lambda value: _to_string(value).lower()),
+    "$toUpper": _numeric(lambda value: _to_string(value).upper()),
+    "$toInt": _numeric(int),
+    "$toDouble": _numeric(float),
+    "$dateToString": _date_to_string,
+    "$dateTrunc": _date_trunc,
+    "$arrayToObject": _numeric(_array_to_object),
+    "$objectToArray": _numeric(_object_to_array),
+    "$sum": _array_reduce(lambda values: sum(value for value in values if _is_number(value))),
+    "$avg": _array_reduce(_average),
+    "$min": _array_reduce(lambda values: min(values, key=_key, default=None)),
+    "$max": _array_reduce(lambda values: max(values, key=_key, default=None)),
+}
+
+
+# ---Updates---
+
+def _push(document, parts, argument):
+    array = _get_value(document, parts)
+    if array is _MISSING:
+        array = []
+        _set_value(document, parts, array)
+    elif not isinstance(array, list):
+        raise WriteError(f"The field '{parts[-1]}' must be an array but is of type {type(array).__name__}", 2)
+    if isinstance(argument, Mapping) and "$each" in argument:
+        items = _copy(argument["$each"])
+        position = argument.get("$position", len(array))
+        array[position:position] = items
+        if "$slice" in argument:
+            limit = argument["$slice"]
+            array[:] = array[:limit] if limit >= 0 else array[limit:]
+    else:
+        array.append(_copy(argument))
+
+
+def _add_to_set(document, parts, argument):
+    array = _get_value(document, parts)
+    if array is _MISSING:
+        array = []
+        _set_value(document, parts, array)
+    elif not isinstance(array, list):
+        raise WriteError(f"Cannot apply $addToSet to non-array field '{parts[-1]}'", 2)
+    items = argument["$each"] if isinstance(argument, Mapping) and "$each" in argument else [argument]
+    present = {_key(item) for item in array}
+    for item in items:
+        if _key(item) not in present:
+            array.append(_copy(item))
+            present.add(_key(item))
+
+
+def _pull(document, parts, argument):
+    array = _get_value(document, parts)
+    if array is _MISSING:
+        return
+    if not isinstance(array, list):
+        raise WriteError("Cannot apply $pull to a non-array value", 2)
+    if isinstance(argument, Mapping) and argument and all(name.startswith("$") for name in argument):
+        condition = _compile_condition(argument)
+        matches = lambda element: condition([element])
+    elif isinstance(argument, Mapping):
+        predicate = compile_filter(argument)
+        matches = lambda element: isinstance(element, Mapping) and predicate(element)
+    else:
+        expected = _key(argument)
+        matches = lambda element: _key(element) == expected
+    array[:] = [element for element in array if not matches(element)]
+
+
+def _increment(document, parts, amount):
+    current = _get_value(document, parts)
+    if current is _MISSING:
+        _set_value(document, parts, amount)
+    elif not _is_number(current):
+        raise WriteError(f"Cannot apply $inc to a value of non-numeric type. Field '{parts[-1]}'", 14)
+    else:
+        _set_value(document, parts, current + amount)
+
+
+def _extreme(compare):
+    def apply(document, parts, value):
+        current = _get_value(document, parts)
+        if current is _MISSING or compare(_key(value), _key(current)):
+            _set_value(document, parts, _copy(value))
+    return apply
+
+
+def _rename(document, parts, new_name):
+    value = _get_value(document, parts)
+    if value is not _MISSING:
+        _unset_value(document, parts)
+        _set_value(document, new_name.split("."), value)
+
+
+_UPDATE_OPERATORS = {
+    "$set": lambda document, parts, value: _set_value(document, parts, _copy(value)),
+    "$setOnInsert": lambda document, parts, value: _set_value(document, parts, _copy(value)),
+    "$unset": lambda document, parts, value: _unset_value(document, parts),
+    "$inc": _increment,
+    "$max": _extreme(operator.gt),
+    "$min": _extreme(operator.lt),
+    "$push": _push,
+    "$addToSet": _add_to_set,
+    "$pull": _pull,
+    "$rename": _rename,
+    "$currentDate": lambda document, parts, value: _set_value(document, parts, _copy(datetime.now(UTC))),
+}
+
+
+def _positional_index(document, query, array_parts):
+    """Index of the first array element matched by the query, for the positional "$" operator."""
+    array = _get_value(document, array_parts)
+    prefix = ".".join(array_parts)
+    clauses = [query, *query.get("$and", [])]
+    if isinstance(array, list):
+        for clause in clauses:
+            for field, condition in clause.items():
+                if field == prefix:
+                    test = _compile_condition(condition)
+                    matches = lambda element: test([element])
+                elif field.startswith(prefix + "."):
+                    predicate = compile_filter({field[len(prefix) + 1:]: condition})
+                    matches = lambda element: isinstance(element, Mapping) and predicate(element)
+                else:
+                    continue
+                for position, element in enumerate(array):
+                    if matches(element):
+                        return position
+    raise WriteError("The positional operator did not find the match needed from the query.", 2)
+
+
+def _resolve_positional(document, path, query):
+    parts = path.split(".")
+    if "$[]" in parts or any(part.startswith("$[") for part in parts):
+        raise OperationFailure("Array filters and the all-positional operator are not supported in memory", 2)
+    if "$" in parts:
+        position = parts.index("$")
+        parts[position] = str(_positional_index(document, query, parts[:position]))
+    return parts
+
+
+def _is_operator_update(update):
+    return any(name.startswith("$") for name in update)
+
+
+def _apply_update(document, update, query, inserting=False):
+    """Applies an update (operators or a replacement) to a copy of `document` and returns the copy."""
+    if not _is_operator_update(update):
+        replacement = _copy(update)
+        if "_id" in document:
+            if "_id" in replacement and _key(replacement["_id"]) != _key(document["_id"]):
+                raise WriteError("The _id field cannot be changed", 66)
+            replacement = {"_id": document["_id"], **replacement}
+        return replacement
+    updated = _copy(document)
+    for name, fields in update.items():
+        if name not in _UPDATE_OPERATORS:
+            raise WriteError(f"Unknown modifier: {name}", 9)
+        if name == "$setOnInsert" and not inserting:
+            continue
+        for path, value in fields.items():
+            _UPDATE_OPERATORS[name](updated, _resolve_positional(updated, path, query), value)
+    if "_id" in document and _key(updated.get("_id")) != _key(document["_id"]):
+        raise WriteError("Performing an update on the path '_id' would modify the immutable field '_id'", 66)
+    return updated
+
+
+def _upsert_seed(query):
+    """The document an upsert starts from: the query's equality conditions."""
+    seed = {}
+    clauses = [query, *query.get("$and", [])]
+    for clause in clauses:
+        for field, condition in clause.items():
+            if field.startswith("$"):
+                continue
+            if isinstance(condition, Mapping) and condition and all(name.startswith("$") for name in condition):
+                if "$eq" not in condition:
+                    continue
+                condition = condition["$eq"]
+            _set_value(seed, field.split("."), _copy(condition))
+    return seed
+
+
+# ---Projections and sorting---
+
+def _pick(value, parts):
+    """The part of `value` an inclusion projection keeps for a dotted path."""
+    if not parts:
+        return _copy(value)
+    if isinstance(value, list):
+        return [picked for picked in (_pick(item, parts) for item in value if isinstance(item, Mapping))
+                if picked is not _MISSING]
+    if isinstance(value, Mapping) and parts[0] in value:
+        picked = _pick(value[parts[0]], parts[1:])
+        return _MISSING if picked is _MISSING else {parts[0]: picked}
+    return _MISSING
+
+
+def _merge(target, source):
+    for field, value in source.items():
+        if isinstance(value, dict) and isinstance(target.get(field), dict):
+            _merge(target[field], value)
+        else:
+            target[field] = value
+
+
+def _is_flag(value):
+    return isinstance(value, bool) or (_is_number(value) and value in (0, 1))
+
+
+def _positional_element(document, field, query):
+    """The projection of "array.$": the first array element the query matched, as a one-item array."""
+    array_parts = field[:-2].split(".")
+    try:
+        position = _positional_index(document, query or {}, array_parts)
+    except WriteError:
+        raise OperationFailure("positional operator '.$' couldn't find a matching element in the array", 51246)
+    projected = {}
+    _set_value(projected, array_parts, [_copy(_get_value(document, array_parts)[position])])
+    return projected
+
+
+def _project(document, projection, variables=None, query=None):
+    """Applies a find() projection (with the query, for "array.$") or a $project stage."""
+    if not projection:
+        return _copy(document)
+    fields = {field: value for field, value in projection.items() if field != "_id"}
+    id_spec = projection.get("_id", True)
+    exclusion = all(_is_flag(value) and not value for value in fields.values()) and (
+        bool(fields) or (_is_flag(id_spec) and not id_spec))
+    if exclusion:
+        projected = _copy(document)
+        for field in fields:
+            _unset_value(projected, field.split("."))
+        if not id_spec:
+            projected.pop("_id", None)
+        return projected
+
+    projected = {}
+    if not _is_flag(id_spec):
+        value = _evaluate(id_spec, document, variables)
+        if value is not _MISSING:
+            projected["_id"] = value
+    elif id_spec and "_id" in document:
+        projected["_id"] = _copy(document["_id"])
+    for field, spec in fields.items():
+        parts = field.split(".")
+        if _is_flag(spec) and field.endswith(".$"):
+            _merge(projected, _positional_element(document, field, query))
+        elif _is_flag(spec):
+            if not spec:
+                raise OperationFailure(f"Cannot do exclusion on field {field} in inclusion projection", 31254)
+            picked = _pick(document, parts)
+            if picked is not _MISSING:
+                _merge(projected, picked)
+        else:
+            value = _evaluate(spec, document, variables)
+            if value is not _MISSING:
+                _set_value(projected, parts, value)
+    return projected
+
+
+def _sort_spec(key_or_list, direction=None):
+    """Normalizes pymongo's sort arguments into [(field, direction), ...]."""
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, Mapping):
+        return list(key_or_list.items())
+    return [(item, 1) if isinstance(item, str) else tuple(item) for item in key_or_list]
+
+
+def _sort_documents(documents, spec):
+    """Sorts in place by a [(field, direction)] spec; arrays sort by their min (asc) or max (desc) element."""
+    for field, direction in reversed(spec):
+        parts = field.split(".")
+        pick = min if direction > 0 else max
+
+        def sort_key(document, parts=parts, pick=pick):
+            keys = [_key(value) for value in _candidates(_path_values(document, parts))
+                    if not isinstance(value, list)]
+            return pick(keys) if keys else (1,)
+        documents.sort(key=sort_key, reverse=direction < 0)
+    return documents
+
+
+# ---Indexes---
+
+def _normalize_keys(keys, direction=None):
+    if isinstance(keys, str):
+        return [(keys, direction or 1)]
+    if isinstance(keys, Mapping):
+        return list(keys.items())
+    return [(key, 1) if isinstance(key, str) else tuple(key) for key in keys]
+
+
+def _index_name(keys):
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+class _Index:
+    """Key extraction, partial filters and unique checks shared by the hashed and sorted indexes."""
+
+    kind = None
+
+    def __init__(self, name, keys, unique=False, partial_filter=None, sparse=False, hidden=False):
+        self.name = name
+        self.keys = keys
+        self.fields = [field.split(".") for field, _ in keys]
+        self.unique = unique
+        self.partial_filter = partial_filter
+        self._partial = compile_filter(partial_filter) if partial_filter else None
+        self.sparse = sparse
+        self.hidden = hidden
+        self.multikey = False
+
+    def entry_keys(self, document):
+        """Index keys for a document: one per array element for multikey fields, none if excluded."""
+        if self._partial is not None and not self._partial(document):
+            return []
+        per_field = []
+        present = False
+        for parts in self.fields:
+            values = []
+            for value in _path_values(document, parts):
+                if isinstance(value, list):
+                    self.multikey = True
+                    values.extend(value or [None])
+                else:
+                    values.append(value)
+            present = present or bool(values)
+            per_field.append({_key(value) for value in values} or {(1,)})
+        if self.sparse and not present:
+            return []
+        return list(itertools.product(*per_field))
+
+    def conflict(self, entry_keys, id_key):
+        """Returns the first entry key already held by another document, or None."""
+        for entry_key in entry_keys:
+            if any(other != id_key for other in self.lookup(entry_key)):
+                return entry_key
+        return None
+
+    def usable(self):
+        """True if the planner may pick this index for an unhinted query."""
+        return not (self.hidden or self.partial_filter or self.sparse)
+
+    def info(self):
+        info = {"v": 2, "key": list(self.keys)}
+        if self.unique:
+            info["unique"] = True
+        if self.partial_filter:
+            info["partialFilterExpression"] = self.partial_filter
+        if self.sparse:
+            info["sparse"] = True
+        if self.hidden:
+            info["hidden"] = True
+        return info
+
+
+class _HashIndex(_Index):
+    """Equality-only index: a dict from key to the _ids holding it."""
+
+    kind = "hashed"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.entries = {}
+
+    def add(self, id_key, entry_keys):
+        for entry_key in entry_keys:
+            self.entries.setdefault(entry_key, {})[id_key] = None
+
+    def remove(self, id_key, entry_keys):
+        for entry_key in entry_keys:
+            ids = self.entries.get(entry_key)
+            if ids is not None:
+                ids.pop(id_key, None)
+                if not ids:
+                    del self.entries[entry_key]
+
+    def lookup(self, entry_key):
+        return list(self.entries.get(entry_key, ()))
+
+    def scan(self, bounds):
+        if bounds is None or bounds[0] != "eq" or len(self.keys) != 1:
+            return None, 0
+        ids = [id_key for key in bounds[1] for id_key in self.lookup((key,))]
+        return ids, len(ids)
+
+
+class _SortedIndex(_Index):
+    """Ordered index: a sorted list of (key, _id) entries, searched with bisect."""
+
+    kind = "sorted"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.entries = []
+
+    def add(self, id_key, entry_keys):
+        for entry_key in entry_keys:
+            bisect.insort(self.entries, (entry_key, id_key))
+
+    def remove(self, id_key, entry_keys):
+        for entry_key in entry_keys:
+            position = bisect.bisect_left(self.entries, (entry_key, id_key))
+            if position < len(self.entries) and self.entries[position] == (entry_key, id_key):
+                del self.entries[position]
+
+    def lookup(self, entry_key):
+        position = bisect.bisect_left(self.entries, (entry_key,))
+        ids = []
+        while position < len(self.entries) and self.entries[position][0] == entry_key:
+            ids.append(self.entries[position][1])
+            position += 1
+        return ids
+
+    def _range(self, lower, upper):
+        start = bisect.bisect_left(self.entries, (lower,))
+        stop = bisect.bisect_left(self.entries, (upper,))
+        return self.entries[start:stop]
+
+    def scan(self, bounds):
+        """Returns (_id keys in index order, keys examined) for bounds on the first field (None: all)."""
+        if bounds is None:
+            entries = self.entries
+        elif bounds[0] == "eq":
+            entries = [entry for key in bounds[1] for entry in self._range((key,), (key, _MAX_KEY))]
+        else:
+            entries = self._range(bounds[1], bounds[2])
+        return list(dict.fromkeys(id_key for _, id_key in entries)), len(entries)
+
+
+# ---Collections---
+
+class _CollectionData:
+    """The documents, indexes and validator behind every handle on one collection."""
+
+    def __init__(self, name, options=None):
+        self.name = name
+        self.options = dict(options or {})
+        self.documents = {}
+        self.indexes = {"_id_": _SortedIndex("_id_", [("_id", 1)], unique=True)}
+        self.validate = None
+        self.set_validator(self.options.get("validator"), self.options.get("validationLevel", "strict"),
+                           self.options.get("validationAction", "error"))
+
+    def set_validator(self, validator, level="strict", action="error"):
+        """Installs a $jsonSchema (compiled with eduhub_schema) or query-expression validator."""
+        self.options.update(validationLevel=level, validationAction=action)
+        if validator:
+            self.options["validator"] = validator
+        else:
+            self.options.pop("validator", None)
+        if not validator or level == "off":
+            self.validate = None
+        elif set(validator) == {"$jsonSchema"}:
+            from eduhub_schema import compile_validator
+            try:
+                self.validate = compile_validator(validator, f"validate_{self.name}")
+            except ValueError as e:
+                raise OperationFailure(f"Validator not supported by the in-memory backend: {e}", 2)
+        else:
+            predicate = compile_filter(validator)
+            self.validate = lambda document: {} if predicate(document) else {"": "Document does not match the validator"}
+
+    def check(self, document, bypass):
+        if self.validate is None or bypass or self.options.get("validationAction") == "warn":
+            return
+        errors = self.validate(document)
+        if errors:
+            raise WriteError("Document failed validation", DOCUMENT_VALIDATION_CODE, {
+                "code": DOCUMENT_VALIDATION_CODE,
+                "errmsg": "Document failed validation",
+                "errInfo": {"failingDocumentId": document.get("_id"), "details": errors},
+            })
+
+    def _duplicate(self, index, document, namespace):
+        key_value = {field: _null(_get_value(document, field.split("."))) for field, _ in index.keys}
+        shown = ", ".join(f"{field}: {value!r}" for field, value in key_value.items())
+        message = f"E11000 duplicate key error collection: {namespace} index: {index.name} dup key: {{ {shown} }}"
+        return DuplicateKeyError(message, DUPLICATE_KEY_CODE, {
+            "index": 0,
+            "code": DUPLICATE_KEY_CODE,
+            "errmsg": message,
+            "keyPattern": dict(index.keys),
+            "keyValue": key_value,
+        })
+
+    def write(self, document, namespace, previous=None):
+        """Stores a new or updated document, keeping every index (and unique constraint) in step."""
+        id_key = _key(document["_id"])
+        entries = {name: index.entry_keys(document) for name, index in self.indexes.items()}
+        for name, index in self.indexes.items():
+            if index.unique and index.conflict(entries[name], id_key) is not None:
+                raise self._duplicate(index, document, namespace)
+        if previous is not None:
+            for index in self.indexes.values():
+                index.remove(id_key, index.entry_keys(previous))
+        for name, index in self.indexes.items():
+            index.add(id_key, entries[name])
+        self.documents[id_key] = document
+
+    def delete(self, id_key):
+        document = self.documents.pop(id_key)
+        for index in self.indexes.values():
+            index.remove(id_key, index.entry_keys(document))
+        return document
+
+    def plan(self, query, hint=None, sort=None):
+        """
+        Chooses how to read documents for a query. Returns (index, _id keys or None for a
+        collection scan, keys examined, whether the _id keys are already in `sort` order).
+        """
+        query = query or {}
+        if hint is not None:
+            if hint in ({"$natural": 1}, {"$natural": -1}, [("$natural", 1)], [("$natural", -1)]):
+                return None, None, 0, False
+            candidates = [self.index_for_hint(hint)]
+        else:
+            candidates = [index for index in self.indexes.values() if index.usable()]
+
+        best = None
+        for field, condition in query.items():
+            if field.startswith("$"):
+                continue
+            bounds = _index_bounds(condition)
+            if bounds is None:
+                continue
+            for index in candidates:
+                if index.keys[0][0] != field:
+                    continue
+                # A multikey document can satisfy each end of a range with a different element
+                if bounds[0] == "range" and (index.kind != "sorted" or index.multikey):
+                    continue
+                if index.kind == "hashed" and len(index.keys) != 1:
+                    continue
+                score = (3 if index.unique and len(index.keys) == 1 else 2) if bounds[0] == "eq" else 1
+                if best is None or score > best[0]:
+                    best = (score, index, bounds)
+
+        ordered_by = self._sort_index(sort, candidates)
+        if best is None:
+            if ordered_by is not None:
+                ids, examined = ordered_by.scan(None)
+                return ordered_by, ids, examined, True
+            if hint is not None and candidates[0].kind == "sorted":
+                ids, examined = candidates[0].scan(None)
+                return candidates[0], ids, examined, False
+            return None, None, 0, False
+        _, index, bounds = best
+        ids, examined = index.scan(bounds)
+        return index, ids, examined, index is ordered_by
+
+    def _sort_index(self, sort, candidates):
+        """A sorted, non-multikey index whose key order matches the sort (all forwards or all backwards)."""
+        if not sort or len({direction for _, direction in sort}) != 1 or sort[0][1] != 1:
+            return None
+        fields = [field for field, _ in sort]
+        for index in candidates:
+            if index.kind == "sorted" and not index.multikey and [f for f, _ in index.keys[:len(fields)]] == fields:
+                return index
+        return None
+
+    def index_for_hint(self, hint):
+        if isinstance(hint, str):
+            if hint in self.indexes:
+                return self.indexes[hint]
+        else:
+            keys = _normalize_keys(hint)
+            for index in self.indexes.values():
+                if index.keys == keys:
+                    return index
+        raise OperationFailure("error processing query: planner returned error :: caused by :: "
+                               "hint provided does not correspond to an existing index", 2)
+
+
+class _ResultCursor:
+    """An exhausted-on-read cursor over already computed results (aggregate/list_indexes)."""
+
+    def __init__(self, documents):
+        self._documents = iter(documents)
+        self.alive = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._documents)
+        except StopIteration:
+            self.alive = False
+            raise
+
+    def next(self):
+        return self.__next__()
+
+    def to_list(self, length=None):
+        return list(itertools.islice(self, length))
+
+    def close(self):
+        self.alive = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MemoryCursor:
+    """find() cursor: options are recorded until the first iteration runs the query."""
+
+    def __init__(self, collection, query=None, projection=None, skip=0, limit=0, sort=None, hint=None,
+                 batch_size=0, max_time_ms=None, **options):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._skip = skip
+        self._limit = limit
+        self._sort = _sort_spec(sort) if sort else None
+        self._hint = hint
+        self._results = None
+        self.alive = True
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _sort_spec(key_or_list, direction)
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def skip(self, skip):
+        self._skip = skip
+        return self
+
+    def hint(self, index):
+        self._hint = index
+        return self
+
+    def batch_size(self, batch_size):
+        return self
+
+    def max_time_ms(self, max_time_ms):
+        return self
+
+    def allow_disk_use(self, allow_disk_use):
+        return self
+
+    def comment(self, comment):
+        return self
+
+    def clone(self):
+        return MemoryCursor(self._collection, self._query, self._projection, self._skip, self._limit,
+                            self._sort, self._hint)
+
+    def _run(self):
+        with self._collection._lock:
+            documents, _ = self._collection._select(self._query, self._sort, self._skip, self._limit, self._hint)
+        return [self._collection._output(document, self._projection, self._query) for document in documents]
+
+    def explain(self):
+        """A queryPlanner/executionStats document shaped like the server's explain output."""
+        with self._collection._lock:
+            started = time.perf_counter()
+            documents, stats = self._collection._select(self._query, self._sort, self._skip, self._limit, self._hint)
+            elapsed = time.perf_counter() - started
+        if stats["index"] is None:
+            plan = {"stage": "COLLSCAN", "filter": self._query}
+        else:
+            plan = {"stage": "FETCH", "inputStage": {
+                "stage": "IXSCAN", "indexName": stats["index"].name, "keyPattern": dict(stats["index"].keys),
+                "isMultiKey": stats["index"].multikey,
+            }}
+        if self._sort and not stats["sortedByIndex"]:
+            plan = {"stage": "SORT", "sortPattern": dict(self._sort), "inputStage": plan}
+        return {
+            "queryPlanner": {"namespace": self._collection.full_name, "winningPlan": plan},
+            "executionStats": {
+                "nReturned": len(documents),
+                "executionTimeMillis": int(elapsed * 1000),
+                "totalKeysExamined": stats["keysExamined"],
+                "totalDocsExamined": stats["docsExamined"],
+            },
+        }
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._results is None:
+            self._results = iter(self._run())
+        try:
+            return next(self._results)
+        except StopIteration:
+            self.alive = False
+            raise
+
+    def next(self):
+        return self.__next__()
+
+    def to_list(self, length=None):
+        return list(itertools.islice(self, length))
+
+    def close(self):
+        self.alive = False
+        self._results = iter(())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _request_parts(request):
+    """Reads a pymongo bulk request's filter, document and upsert flag."""
+    return getattr(request, "_filter", None), getattr(request, "_doc", None), getattr(request, "_upsert", False)
+
+
+class MemoryCollection:
+    """A collection handle with the pymongo Collection methods the eduhub modules call."""
+
+    def __init__(self, database, name, codec_options=None):
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+        self.codec_options = codec_options or database.codec_options
+        self._lock = database.client._lock
+
+    def __repr__(self):
+        return f"MemoryCollection({self.full_name!r})"
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.database[f"{self.name}.{name}"]
+
+    def with_options(self, codec_options=None, **options):
+        return MemoryCollection(self.database, self.name, codec_options or self.codec_options)
+
+    @property
+    def _data(self):
+        return self.database._collection_data(self.name, create=True)
+
+    def _count(self, counter, amount=1):
+        self.database.client._opcounters[counter] += amount
+
+    def _output(self, document, projection=None, query=None):
+        if projection is not None:
+            if not isinstance(projection, Mapping):
+                projection = {field: 1 for field in projection}
+            document = _project(document, projection, query=query)
+        document = _copy(document, UTC if self.codec_options.tz_aware else None)
+        document_class = self.codec_options.document_class
+        if document_class is dict:
+            return document
+        if issubclass(document_class, RawBSONDocument):
+            return document_class(bson.encode(document))
+        return document_class(document)
+
+    def _select(self, query, sort=None, skip=0, limit=0, hint=None):
+        """Runs a query against the stored documents (no copies) and returns (documents, plan stats)."""
+        data = self.database._collection_data(self.name)
+        stats = {"index": None, "keysExamined": 0, "docsExamined": 0, "sortedByIndex": False}
+        if data is None:
+            return [], stats
+        predicate = compile_filter(query)
+        index, ids, examined, sorted_by_index = data.plan(query, hint, sort)
+        stats.update(index=index, keysExamined=examined, sortedByIndex=sorted_by_index)
+        source = data.documents.values() if ids is None else (data.documents[id_key] for id_key in ids)
+        wanted = skip + limit if limit and (not sort or sorted_by_index) else None
+
+        matched = []
+        for document in source:
+            stats["docsExamined"] += 1
+            if predicate(document):
+                matched.append(document)
+                if wanted is not None and len(matched) >= wanted:
+                    break
+        if sort and not sorted_by_index:
+            _sort_documents(matched, sort)
+        matched = matched[skip:]
+        return (matched[:limit] if limit else matched), stats
+
+    # Reads
+
+    def find(self, filter=None, projection=None, *args, **kwargs):
+        self._count("query")
+        return MemoryCursor(self, filter, projection, *args, **kwargs)
+
+    def find_one(self, filter=None, projection=None, *args, **kwargs):
+        if filter is not None and not isinstance(filter, Mapping):
+            filter = {"_id": filter}
+        for document in self.find(filter, projection, *args, **kwargs).limit(1):
+            return document
+        return None
+
+    def count_documents(self, filter, skip=0, limit=0, **kwargs):
+        self._count("command")
+        with self._lock:
+            return len(self._select(filter, skip=skip, limit=limit, hint=kwargs.get("hint"))[0])
+
+    def estimated_document_count(self, **kwargs):
+        self._count("command")
+        data = self.database._collection_data(self.name)
+        return len(data.documents) if data else 0
+
+    def distinct(self, key, filter=None, **kwargs):
+        self._count("command")
+        with self._lock:
+            documents, _ = self._select(filter or {})
+            values = {}
+            for document in documents:
+                for value in _candidates(_path_values(document, key.split("."))):
+                    if not isinstance(value, list):
+                        values.setdefault(_key(value), value)
+            return [_copy(value) for value in values.values()]
+
+    def aggregate(self, pipeline, session=None, **kwargs):
+        self._count("command")
+        with self._lock:
+            documents = _run_pipeline(self, list(pipeline), kwargs.get("hint"))
+            return _ResultCursor([self._output(document) for document in documents])
+
+    # Writes
+
+    def _insert(self, document, bypass):
+        if not isinstance(document, Mapping):
+            raise TypeError("document must be an instance of dict, bson.son.SON, or another Mapping")
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        stored = _copy(document)
+        data = self._data
+        data.check(stored, bypass)
+        data.write(stored, self.full_name)
+        self._count("insert")
+        return document["_id"]
+
+    def _update(self, query, update, upsert=False, multi=False, bypass=False, sort=None):
+        """Applies an update to one or all matches. Returns (matched, modified, upserted _id or None)."""
+        if not update:
+            raise ValueError("update cannot be empty")
+        data = self._data
+        documents, _ = self._select(query, sort=sort, limit=0 if multi else 1)
+        modified = 0
+        for document in documents:
+            updated = _apply_update(document, update, query)
+            if _key(updated) == _key(document):
+                continue
+            data.check(updated, bypass)
+            data.write(updated, self.full_name, previous=document)
+            modified += 1
+        self._count("update")
+        if documents or not upsert:
+            return len(documents), modified, None
+        seed = _upsert_seed(query)
+        if not _is_operator_update(update):
+            seed = {"_id": seed["_id"]} if "_id" in seed else {}
+        document = _apply_update(seed, update, query, inserting=True)
+        if "_id" not in document:
+            document = {"_id": ObjectId(), **document}
+        self._insert(document, bypass)
+        return 0, 0, document["_id"]
+
+    def _delete(self, query, multi=False):
+        data = self.database._collection_data(self.name)
+        if data is None:
+            return 0
+        documents, _ = self._select(query, limit=0 if multi else 1)
+        for document in documents:
+            data.delete(_key(document["_id"]))
+        self._count("delete")
+        return len(documents)
+
+    def insert_one(self, document, bypass_document_validation=False, **kwargs):
+        with self._lock:
+            return InsertOneResult(self._insert(document, bypass_document_validation), True)
+
+    def insert_many(self, documents, ordered=True, bypass_document_validation=False, **kwargs):
+        documents = list(documents)
+        if not documents:
+            raise TypeError("documents must be a non-empty list")
+        self.bulk_write([InsertOne(document) for document in documents], ordered, bypass_document_validation)
+        return InsertManyResult([document["_id"] for document in documents], True)
+
+    def update_one(self, filter, update, upsert=False, bypass_document_validation=False, sort=None, **kwargs):
+        with self._lock:
+            matched, modified, upserted = self._update(filter, update, upsert, False, bypass_document_validation,
+                                                       _sort_spec(sort) if sort else None)
+        return UpdateResult(_update_raw(matched, modified, upserted), True)
+
+    def update_many(self, filter, update, upsert=False, bypass_document_validation=False, **kwargs):
+        with self._lock:
+            matched, modified, upserted = self._update(filter, update, upsert, True, bypass_document_validation)
+        return UpdateResult(_update_raw(matched, modified, upserted), True)
+
+    def replace_one(self, filter, replacement, upsert=False, bypass_document_validation=False, **kwargs):
+        if _is_operator_update(replacement):
+            raise ValueError("replacement can not include $ operators")
+        return self.update_one(filter, replacement, upsert, bypass_document_validation)
+
+    def delete_one(self, filter, **kwargs):
+        with self._lock:
+            return DeleteResult({"n": self._delete(filter), "ok": 1.0}, True)
+
+    def delete_many(self, filter, **kwargs):
+        with self._lock:
+            return DeleteResult({"n": self._delete(filter, multi=True), "ok": 1.0}, True)
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                            return_document=ReturnDocument.BEFORE, bypass_document_validation=False, **kwargs):
+        with self._lock:
+            sort = _sort_spec(sort) if sort else None
+            documents, _ = self._select(filter, sort=sort, limit=1)
+            before = documents[0] if documents else None
+            _, _, upserted = self._update(filter, update, upsert, False, bypass_document_validation, sort)
+            if return_document == ReturnDocument.BEFORE:
+                document = before
+            else:
+                document = self._data.documents.get(_key(upserted if before is None else before["_id"]))
+            return None if document is None else self._output(document, projection, filter)
+
+    def find_one_and_replace(self, filter, replacement, projection=None, sort=None, upsert=False,
+                             return_document=ReturnDocument.BEFORE, **kwargs):
+        if _is_operator_update(replacement):
+            raise ValueError("replacement can not include $ operators")
+        return self.find_one_and_update(filter, replacement, projection, sort, upsert, return_document, **kwargs)
+
+    def find_one_and_delete(self, filter, projection=None, sort=None, **kwargs):
+        with self._lock:
+            documents, _ = self._select(filter, sort=_sort_spec(sort) if sort else None, limit=1)
+            if not documents:
+                return None
+            self._data.delete(_key(documents[0]["_id"]))
+            self._count("delete")
+            return self._output(documents[0], projection, filter)
+
+    def bulk_write(self, requests, ordered=True, bypass_document_validation=False, **kwargs):
+        """Runs InsertOne/UpdateOne/UpdateMany/ReplaceOne/DeleteOne/DeleteMany requests like the server does."""
+        result = {"writeErrors": [], "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0,
+                  "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []}
+        with self._lock:
+            for position, request in enumerate(requests):
+                query, document, upsert = _request_parts(request)
+                try:
+                    if isinstance(request, InsertOne):
+                        self._insert(document, bypass_document_validation)
+                        result["nInserted"] += 1
+                    elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                        matched, modified, upserted = self._update(
+                            query, document, upsert, isinstance(request, UpdateMany), bypass_document_validation)
+                        result["nMatched"] += matched
+                        result["nModified"] += modified
+                        if upserted is not None:
+                            result["nUpserted"] += 1
+                            result["upserted"].append({"index": position, "_id": upserted})
+                    elif isinstance(request, (DeleteOne, DeleteMany)):
+                        result["nRemoved"] += self._delete(query, isinstance(request, DeleteMany))
+                    else:
+                        raise TypeError(f"{request!r} is not a valid request")
+                except WriteError as e:
+                    error = {"index": position, "code": e.code, "errmsg": str(e), "op": document or query}
+                    error.update({key: value for key, value in (e.details or {}).items()
+                                  if key in ("keyPattern", "keyValue", "errInfo")})
+                    result["writeErrors"].append(error)
+                    if ordered:
+                        break
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    # Indexes and collection management
+
+    def create_index(self, keys, **kwargs):
+        keys = _normalize_keys(keys)
+        name = kwargs.get("name") or _index_name(keys)
+        with self._lock:
+            data = self._data
+            existing = data.indexes.get(name)
+            if existing is not None:
+                if existing.keys != keys or existing.unique != bool(kwargs.get("unique")):
+                    raise OperationFailure(f"An existing index has the same name as the requested index: {name}", 86)
+                return name
+            if any(direction == "hashed" for _, direction in keys):
+                index_class = _HashIndex
+            elif any(direction not in (1, -1) for _, direction in keys):
+                raise OperationFailure(f"Index type not supported by the in-memory backend: {keys}", 67)
+            else:
+                index_class = _SortedIndex
+            index = index_class(name, keys, unique=bool(kwargs.get("unique")),
+                                partial_filter=kwargs.get("partialFilterExpression"),
+                                sparse=bool(kwargs.get("sparse")), hidden=bool(kwargs.get("hidden")))
+            for id_key, document in data.documents.items():
+                entry_keys = index.entry_keys(document)
+                if index.unique and index.conflict(entry_keys, id_key) is not None:
+                    raise data._duplicate(index, document, self.full_name)
+                index.add(id_key, entry_keys)
+            data.indexes[name] = index
+            return name
+
+    def create_indexes(self, indexes, **kwargs):
+        names = []
+        for model in indexes:
+            document = dict(model.document if isinstance(model, IndexModel) else model)
+            keys = list(document.pop("key").items())
+            names.append(self.create_index(keys, **document))
+        return names
+
+    def index_information(self):
+        data = self.database._collection_data(self.name)
+        return {name: index.info() for name, index in (data.indexes.items() if data else ())}
+
+    def list_indexes(self, **kwargs):
+        return _ResultCursor([
+            {"name": name, **info, "key": dict(info["key"])} for name, info in self.index_information().items()
+        ])
+
+    def drop_index(self, index_or_name, **kwargs):
+        name = index_or_name if isinstance(index_or_name, str) else _index_name(_normalize_keys(index_or_name))
+        with self._lock:
+            data = self.database._collection_data(self.name)
+            if name == "_id_":
+                raise OperationFailure("cannot drop _id index", 72)
+            if data is None or name not in data.indexes:
+                raise OperationFailure(f"index not found with name [{name}]", 27)
+            del data.indexes[name]
+
+    def drop_indexes(self, **kwargs):
+        with self._lock:
+            data = self.database._collection_data(self.name)
+            if data is not None:
+                data.indexes = {"_id_": data.indexes["_id_"]}
+
+    def drop(self, **kwargs):
+        self.database.drop_collection(self.name)
+
+
+def _update_raw(matched, modified, upserted):
+    raw = {"n": matched if upserted is None else 1, "nModified": modified, "ok": 1.0}
+    if upserted is not None:
+        raw["upserted"] = upserted
+    return raw
+
+
+# ---Aggregation pipeline---
+
+def _stage_match(collection, documents, spec):
+    predicate = compile_filter(spec)
+    return [document for document in documents if predicate(document)]
+
+
+def _stage_project(collection, documents, spec):
+    return [_project(document, spec) for document in documents]
+
+
+def _stage_add_fields(collection, documents, spec):
+    output = []
+    for document in documents:
+        updated = dict(document)
+        for field, expression in spec.items():
+            value = _evaluate(expression, document)
+            parts = field.split(".")
+            if len(parts) > 1:
+                updated[parts[0]] = _copy(updated.get(parts[0], {}))
+            if value is _MISSING:
+                _unset_value(updated, parts)
+            else:
+                _set_value(updated, parts, value)
+        output.append(updated)
+    return output
+
+
+def _stage_unset(collection, documents, spec):
+    return _stage_project(collection, documents, {field: 0 for field in ([spec] if isinstance(spec, str) else spec)})
+
+
+def _stage_unwind(collection, documents, spec):
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    parts = spec["path"].lstrip("$").split(".")
+    preserve = spec.get("preserveNullAndEmptyArrays", False)
+    index_field = spec.get("includeArrayIndex")
+    output = []
+    for document in documents:
+        value = _get_value(document, parts)
+        if isinstance(value, list) and value:
+            for position, item in enumerate(value):
+                unwound = _copy(document) if len(parts) > 1 else dict(document)
+                _set_value(unwound, parts, item)
+                if index_field:
+                    unwound[index_field] = position
+                output.append(unwound)
+        elif isinstance(value, list) or value is None or value is _MISSING:
+            if preserve:
+                kept = dict(document)
+                if isinstance(value, list):
+                    kept = _copy(document)
+                    _unset_value(kept, parts)
+                if index_field:
+                    kept[index_field] = None
+                output.append(kept)
+        else:
+            kept = dict(document)
+            if index_field:
+                kept[index_field] = None
+            output.append(kept)
+    return output
+
+
+def _bind_variables(value, variables):
+    """Replaces $$name references to `variables` with literals, so a sub-pipeline sees its let values."""
+    if isinstance(value, str) and value.startswith("$$"):
+        name, _, path = value[2:].partition(".")
+        if name not in variables:
+            return value
+        bound = _field_value(variables[name], path.split(".")) if path else variables[name]
+        return "$$REMOVE" if bound is _MISSING else {"$literal": bound}
+    if isinstance(value, Mapping):
+        if set(value) == {"$literal"}:
+            return value
+        return {key: _bind_variables(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_bind_variables(item, variables) for item in value]
+    return value
+
+
+def _stage_lookup(collection, documents, spec):
+    """
+    $lookup. With localField/foreignField the foreign collection is hashed once on
+    foreignField, then probed per document; a pipeline (with its let variables bound
+    per document) then runs over each document's matches, or over the whole foreign
+    collection when there is no localField.
+    """
+    pipeline = spec.get("pipeline")
+    if pipeline is None and "localField" not in spec:
+        raise OperationFailure("$lookup requires either 'pipeline' or both 'localField' and 'foreignField'", 40321)
+    if pipeline is not None:
+        _check_stages(pipeline)
+        if any(name in ("$out", "$merge") for stage in pipeline for name in stage):
+            raise OperationFailure("$out and $merge are not allowed within a $lookup pipeline", 51047)
+    foreign_collection = collection.database[spec["from"]]
+    by_key = {}
+    if "localField" in spec:
+        foreign = collection.database._collection_data(spec["from"])
+        foreign_parts = spec["foreignField"].split(".")
+        local_parts = spec["localField"].split(".")
+        for position, foreign_document in enumerate(foreign.documents.values() if foreign else ()):
+            values = list(_path_values(foreign_document, foreign_parts))
+            keys = {_key(value) for value in _candidates(values) if not isinstance(value, list)} or {(1,)}
+            for key in keys:
+                by_key.setdefault(key, []).append((position, foreign_document))
+
+    output = []
+    for document in documents:
+        if "localField" in spec:
+            values = list(_path_values(document, local_parts))
+            keys = {_key(value) for value in _candidates(values) if not isinstance(value, list)} or {(1,)}
+            matches = {}
+            for key in keys:
+                for position, foreign_document in by_key.get(key, ()):
+                    matches[position] = foreign_document
+            joined_documents = [_copy(matches[position]) for position in sorted(matches)]
+        if pipeline is not None:
+            variables = {name: _null(_evaluate(expression, document)) for name, expression in spec.get("let", {}).items()}
+            stages = _bind_variables(pipeline, variables) if variables else pipeline
+            if "localField" in spec:
+                joined_documents = _apply_stages(foreign_collection, joined_documents, stages)
+            else:
+                joined_documents = _run_pipeline(foreign_collection, stages)
+        joined = dict(document)
+        _set_value(joined, spec["as"].split("."), joined_documents)
+        output.append(joined)
+    return output
+
+
+def _accumulator(name, argument):
+    """Returns (new_state(), step(state, document) -> state, finish(state)) for a $group accumulator."""
+    value = lambda document: _evaluate(argument, document)
+    if name == "$sum":
+        def step(total, document):
+            amount = value(document)
+            return total + amount if _is_number(amount) else total
+        return int, step, lambda total: total
+    if name == "$count":
+        return int, lambda total, document: total + 1, lambda total: total
+    if name == "$avg":
+        def step(state, document):
+            amount = value(document)
+            return (state[0] + amount, state[1] + 1) if _is_number(amount) else state
+        return lambda: (0, 0), step, lambda state: state[0] / state[1] if state[1] else None
+    if name in ("$min", "$max"):
+        better = operator.lt if name == "$min" else operator.gt
+
+        def step(best, document):
+            candidate = _null(value(document))
+            if candidate is None:
+                return best
+            return candidate if best is None or better(_key(candidate), _key(best)) else best
+        return lambda: None, step, lambda best: best
+    if name == "$first":
+        return lambda: _MISSING, lambda first, document: _null(value(document)) if first is _MISSING else first, _null
+    if name == "$last":
+        return lambda: _MISSING, lambda last, document: _null(value(document)), _null
+    if name == "$push":
+        def step(items, document):
+            item = value(document)
+            if item is not _MISSING:
+                items.append(item)
+            return items
+        return list, step, lambda items: items
+    if name == "$addToSet":
+        def step(items, document):
+            item = value(document)
+            if item is not _MISSING:
+                items.setdefault(_key(item), item)
+            return items
+        return dict, step, lambda items: list(items.values())
+    raise OperationFailure(f"unknown group operator '{name}'", 15952)
+
+
+def _stage_group(collection, documents, spec):
+    accumulators = []
+    for field, accumulator in spec.items():
+        if field != "_id":
+            (name, argument), = accumulator.items()
+            accumulators.append((field, name, *_accumulator(name, argument)))
+    groups = {}
+    for document in documents:
+        group_id = _null(_evaluate(spec["_id"], document))
+        state = groups.get(_key(group_id))
+        if state is None:
+            state = groups[_key(group_id)] = [group_id] + [new_state() for _, _, new_state, _, _ in accumulators]
+        for position, (_, _, _, step, _) in enumerate(accumulators, start=1):
+            state[position] = step(state[position], document)
+    return [
+        {"_id": state[0], **{field: finish(state[position])
+                             for position, (field, _, _, _, finish) in enumerate(accumulators, start=1)}}
+        for state in groups.values()
+    ]
+
+
+def _stage_sort(collection, documents, spec):
+    return _sort_documents(list(documents), list(spec.items()))
+
+
+def _stage_count(collection, documents, spec):
+    return [{spec: len(documents)}] if documents else []
+
+
+def _stage_sample(collection, documents, spec):
+    size = min(spec["size"], len(documents))
+    return collection.database.client._random.sample(documents, size)
+
+
+def _stage_replace_root(collection, documents, spec):
+    new_root = spec["newRoot"] if "newRoot" in spec else spec
+    output = []
+    for document in documents:
+        root = _evaluate(new_root, document)
+        if not isinstance(root, Mapping):
+            raise OperationFailure("'newRoot' expression must evaluate to an object", 40228)
+        output.append(root)
+    return output
+
+
+def _stage_out(collection, documents, spec):
+    database, name = (collection.database, spec) if isinstance(spec, str) else (
+        collection.database.client[spec.get("db", collection.database.name)], spec["coll"])
+    target = database[name]
+    data = target._data
+    for id_key in list(data.documents):
+        data.delete(id_key)
+    for document in documents:
+        target._insert(dict(document), bypass=True)
+    return []
+
+
+_MERGE_PIPELINE_STAGES = {"$addFields", "$set", "$project", "$unset", "$replaceRoot", "$replaceWith"}
+
+
+def _merge_target(collection, into):
+    if isinstance(into, str):
+        return collection.database[into]
+    return collection.database.client[into.get("db", collection.database.name)][into["coll"]]
+
+
+def _stage_merge(collection, documents, spec):
+    """
+    $merge: matches each result to the target on the `on` fields (which need a unique
+    index, as on the server) and applies whenMatched / whenNotMatched to it.
+    """
+    if isinstance(spec, str):
+        spec = {"into": spec}
+    target = _merge_target(collection, spec["into"])
+    on = spec.get("on", "_id")
+    on = [on] if isinstance(on, str) else list(on)
+    when_matched = spec.get("whenMatched", "merge")
+    when_not_matched = spec.get("whenNotMatched", "insert")
+    if isinstance(when_matched, list):
+        _check_stages(when_matched)
+        unsupported = [name for stage in when_matched for name in stage if name not in _MERGE_PIPELINE_STAGES]
+        if unsupported:
+            raise OperationFailure(f"{unsupported[0]} is not allowed to be used within an update", 72)
+    elif when_matched not in ("replace", "merge", "keepExisting", "fail"):
+        raise OperationFailure(f"Enumeration value '{when_matched}' for field 'whenMatched' is not a valid value", 2)
+    if when_not_matched not in ("insert", "discard", "fail"):
+        raise OperationFailure(f"Enumeration value '{when_not_matched}' for field 'whenNotMatched' is not a valid value", 2)
+    if on != ["_id"]:
+        data = target.database._collection_data(target.name)
+        if not data or not any(index.unique and sorted(field for field, _ in index.keys) == sorted(on)
+                               for index in data.indexes.values()):
+            raise OperationFailure("Cannot find index to verify that join fields will be unique", 51183)
+
+    for document in documents:
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        query = {}
+        for field in on:
+            value = _get_value(document, field.split("."))
+            if value is _MISSING or value is None or isinstance(value, list):
+                raise OperationFailure(f"$merge write error: 'on' field '{field}' cannot be missing, null or an array", 51132)
+            query[field] = value
+        existing, _ = target._select(query, limit=1)
+        if not existing:
+            if when_not_matched == "insert":
+                target._insert(dict(document), bypass=False)
+            elif when_not_matched == "fail":
+                raise OperationFailure("$merge could not find a matching document in the target collection", 13113)
+            continue
+        current = existing[0]
+        if when_matched == "keepExisting":
+            continue
+        if when_matched == "fail":
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {target.full_name}", DUPLICATE_KEY_CODE)
+        if when_matched == "replace":
+            replacement = {field: value for field, value in document.items() if field != "_id"}
+        elif when_matched == "merge":
+            replacement = {"$set": {field: value for field, value in document.items() if field != "_id"}}
+        else:
+            variables = {"new": document}
+            variables.update({name: _null(_evaluate(expression, document)) for name, expression in spec.get("let", {}).items()})
+            replacement, = _apply_stages(target, [_copy(current)], _bind_variables(when_matched, variables))
+            replacement.pop("_id", None)
+        if replacement and replacement != {"$set": {}}:
+            target._update({"_id": current["_id"]}, replacement)
+    return []
+
+
+_STAGES = {
+    "$match": _stage_match,
+    "$project": _stage_project,
+    "$addFields": _stage_add_fields,
+    "$set": _stage_add_fields,
+    "$unset": _stage_unset,
+    "$unwind": _stage_unwind,
+    "$lookup": _stage_lookup,
+    "$group": _stage_group,
+    "$sort": _stage_sort,
+    "$limit": lambda collection, documents, spec: documents[:spec],
+    "$skip": lambda collection, documents, spec: documents[spec:],
+    "$count": _stage_count,
+    "$sample": _stage_sample,
+    "$replaceRoot": _stage_replace_root,
+    "$replaceWith": _stage_replace_root,
+    "$out": _stage_out,
+    "$merge": _stage_merge,
+}
+
+
+def _check_stages(pipeline):
+    for stage in pipeline:
+        name, = stage
+        if name not in _STAGES:
+            raise OperationFailure(f"Unrecognized pipeline stage name: '{name}'", 40324)
+
+
+def _apply_stages(collection, documents, stages):
+    for stage in stages:
+        (name, spec), = stage.items()
+        documents = _STAGES[name](collection, documents, spec)
+    return documents
+
+
+def _run_pipeline(collection, pipeline, hint=None):
+    """
+    Runs an aggregation pipeline. A leading $match (with an optional $sort and $limit)
+    is answered through the collection's indexes, like the server's query layer.
+    """
+    _check_stages(pipeline)
+    query, sort, limit, start = {}, None, 0, 0
+    if pipeline and "$match" in pipeline[0]:
+        query, start = pipeline[0]["$match"], 1
+        if start < len(pipeline) and "$sort" in pipeline[start]:
+            sort, start = list(pipeline[start]["$sort"].items()), start + 1
+            if start < len(pipeline) and "$limit" in pipeline[start]:
+                limit, start = pipeline[start]["$limit"], start + 1
+    selected, _ = collection._select(query, sort=sort, limit=limit, hint=hint)
+    documents = [_copy(document) for document in selected]
+    return _apply_stages(collection, documents, pipeline[start:])
+
+
+# ---Databases and clients---
+
+class MemoryDatabase:
+    """A database handle; collections are created on first write, like on the server."""
+
+    def __init__(self, client, name, codec_options=None):
+        self.client = client
+        self.name = name
+        self.codec_options = codec_options or CodecOptions()
+
+    def __repr__(self):
+        return f"MemoryDatabase({self.name!r})"
+
+    def __getitem__(self, name):
+        return MemoryCollection(self, name)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def _collections(self):
+        return self.client._storage.setdefault(self.name, {})
+
+    def _collection_data(self, name, create=False):
+        collections = self._collections()
+        if create and name not in collections:
+            collections[name] = _CollectionData(name)
+        return collections.get(name)
+
+    def get_collection(self, name, codec_options=None, **options):
+        return MemoryCollection(self, name, codec_options)
+
+    def with_options(self, codec_options=None, **options):
+        return MemoryDatabase(self.client, self.name, codec_options or self.codec_options)
+
+    def list_collection_names(self, filter=None, **kwargs):
+        return [info["name"] for info in self.list_collections(filter)]
+
+    def list_collections(self, filter=None, **kwargs):
+        predicate = compile_filter(filter or {})
+        infos = [
+            {"name": name, "type": "collection", "options": _copy(data.options), "info": {"readOnly": False}}
+            for name, data in self._collections().items()
+        ]
+        return _ResultCursor([info for info in infos if predicate(info)])
+
+    def create_collection(self, name, validator=None, timeseries=None, **options):
+        if timeseries is not None:
+            raise OperationFailure("Time-series collections are not supported by the in-memory backend", 2)
+        with self.client._lock:
+            if name in self._collections():
+                raise CollectionInvalid(f"collection {name} already exists")
+            if validator is not None:
+                options["validator"] = validator
+            self._collections()[name] = _CollectionData(name, options)
+        return self[name]
+
+    def drop_collection(self, name_or_collection, **kwargs):
+        name = getattr(name_or_collection, "name", name_or_collection)
+        with self.client._lock:
+            self._collections().pop(name, None)
+
+    def command(self, command, value=1, **kwargs):
+        """Answers ping/hello, collMod (validator and index hiding) and serverStatus."""
+        if isinstance(command, Mapping):
+            (command, value), *rest = command.items()
+            kwargs.update(rest)
+        self.client._opcounters["command"] += 1
+        if command in ("ping", "ismaster", "isMaster", "hello", "buildinfo", "buildInfo"):
+            return {"ok": 1.0, "ismaster": True, "isWritablePrimary": True, "version": "in-memory"}
+        if command == "collMod":
+            with self.client._lock:
+                data = self._collection_data(value)
+                if data is None:
+                    raise OperationFailure(f"ns does not exist: {self.name}.{value}", 26)
+                if "validator" in kwargs or "validationLevel" in kwargs or "validationAction" in kwargs:
+                    data.set_validator(kwargs.get("validator", data.options.get("validator")),
+                                       kwargs.get("validationLevel", data.options.get("validationLevel", "strict")),
+                                       kwargs.get("validationAction", data.options.get("validationAction", "error")))
+                if "index" in kwargs:
+                    spec = kwargs["index"]
+                    index = data.index_for_hint(spec.get("name") or spec["keyPattern"])
+                    if "hidden" in spec:
+                        index.hidden = bool(spec["hidden"])
+            return {"ok": 1.0}
+        if command == "serverStatus":
+            return self.client.server_status()
+        raise OperationFailure(f"no such command: '{command}'", 59)
+
+
+class _GlobalLock:
+    """The client's reentrant lock, counting the threads holding it and queued on it for serverStatus."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._counts = threading.Lock()
+        self._depth = threading.local()
+        self.active = 0
+        self.queued = 0
+
+    def __enter__(self):
+        depth = getattr(self._depth, "value", 0)
+        if depth or self._lock.acquire(blocking=False):
+            if depth:
+                self._lock.acquire()
+            self.active = 1
+        else:
+            with self._counts:
+                self.queued += 1
+            self._lock.acquire()
+            self.active = 1
+            with self._counts:
+                self.queued -= 1
+        self._depth.value = depth + 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth.value -= 1
+        if self._depth.value == 0:
+            self.active = 0
+        self._lock.release()
+
+
+class MemoryClient:
+    """In-process client: databases hold their collections in memory for the life of the client."""
+
+    def __init__(self, seed=None):
+        self._storage = {}
+        self._lock = _GlobalLock()
+        self._random = random.Random(seed)
+        self._opcounters = {"insert": 0, "query": 0, "update": 0, "delete": 0, "getmore": 0, "command": 0}
+        self._started = time.monotonic()
+
+    def __repr__(self):
+        return f"MemoryClient(databases={list(self._storage)})"
+
+    def __getitem__(self, name):
+        return MemoryDatabase(self, name)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_database(self, name=None, codec_options=None, **options):
+        return MemoryDatabase(self, name or "test", codec_options)
+
+    def list_database_names(self, **kwargs):
+        return [name for name, collections in self._storage.items() if collections]
+
+    def drop_database(self, name_or_database, **kwargs):
+        with self._lock:
+            self._storage.pop(getattr(name_or_database, "name", name_or_database), None)
+
+    def server_status(self):
+        """
+        A serverStatus-shaped document: operation counters, and the threads holding or queued on
+        the client lock that serializes every operation (readers and writers aren't told apart).
+        """
+        active, queued = self._lock.active, self._lock.queued
+        return {
+            "host": "memory",
+            "version": "in-memory",
+            "uptime": time.monotonic() - self._started,
+            "opcounters": dict(self._opcounters),
+            "connections": {"current": 1, "available": 0},
+            "globalLock": {
+                "currentQueue": {"total": queued, "readers": 0, "writers": 0},
+                "activeClients": {"total": active, "readers": 0, "writers": 0},
+            },
+            "ok": 1.0,
+        }
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
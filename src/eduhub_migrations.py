@@ -0,0 +1,263 @@
+# ---Resumable, Throttled Migrations---
+# Rewrites a collection in _id order, one batch at a time, with unordered
+# bulk_write. Progress is checkpointed in the `migrations` collection after
+# every batch, so an interrupted run resumes where it stopped, and the write
+# rate is held under a target ops/sec so a live primary keeps its latency.
+# Each migration names the documents still in the old shape (`pending`), so a
+# finished run is verified by counting what is left. A completed migration that
+# is run again starts a fresh pass, picking up old-shape documents written since.
+# A pass only scans forward from the checkpoint, so when it runs out of documents
+# while some are still pending (written behind it, or skipped by a guarded
+# replacement), the run restarts once from the beginning before reporting.
+import time
+from datetime import datetime, UTC
+
+from pymongo import ASCENDING, ReplaceOne, UpdateOne
+
+from eduhub_versions import bump_collection_version
+
+MIGRATIONS_COLLECTION = "migrations"
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_OPS_PER_SECOND = 1000
+
+# name -> {"collection", "pending", "transform", "validator", "description"}
+MIGRATIONS = {}
+
+
+def register_migration(name, collection, pending, transform, validator=None, validation_action="error",
+                       description=""):
+    """
+    Adds a migration. `pending` is a query matching documents still in the old shape;
+    `transform(doc)` returns an update document ({"$set": ...}), a full replacement
+    document, or None to leave the document alone. Transforms must be idempotent.
+    `validator`, if given, describes the new shape: it is installed with `validation_action`
+    when the migration finishes, and the old validator is bypassed while documents are
+    being rewritten.
+    """
+    MIGRATIONS[name] = {
+        "collection": collection,
+        "pending": pending,
+        "transform": transform,
+        "validator": validator,
+        "validation_action": validation_action,
+        "description": description,
+    }
+
+
+def _write_for(doc, change):
+    """
+    Turns a transform result into the bulk_write request for one document.
+    A replacement rewrites every field, so it only applies while the stored document
+    is still exactly the one read (an $expr on $$ROOT, so a field another client only
+    added also counts as a change): otherwise nothing is replaced and the document
+    stays pending for the restarted pass.
+    """
+    if any(key.startswith("$") for key in change):
+        return UpdateOne({"_id": doc["_id"]}, change)
+    change = {key: value for key, value in change.items() if key != "_id"}
+    return ReplaceOne({"_id": doc["_id"], "$expr": {"$eq": ["$$ROOT", {"$literal": doc}]}}, change)
+
+
+def _checkpoint(db, name):
+    return db[MIGRATIONS_COLLECTION].find_one({"_id": name})
+
+
+def run_migration(db, name, batch_size=DEFAULT_BATCH_SIZE, max_ops_per_second=DEFAULT_MAX_OPS_PER_SECOND,
+                  max_batches=None, reset=False):
+    """
+    Runs (or resumes) a registered migration and returns its verification report
+    (see verify_migration). max_ops_per_second=None disables throttling;
+    max_batches stops early, leaving the checkpoint for the next run.
+    countBefore is taken at the start of every run, resumed or not.
+    """
+    if name not in MIGRATIONS:
+        raise ValueError(f"Unknown migration '{name}'. Must be one of {list(MIGRATIONS)}.")
+    migration = MIGRATIONS[name]
+    collection = db[migration["collection"]]
+    checkpoints = db[MIGRATIONS_COLLECTION]
+
+    state = None if reset else _checkpoint(db, name)
+    if state is None or state.get("status") == "complete":
+        state = {
+            "_id": name,
+            "collection": migration["collection"],
+            "lastId": None,
+            "processed": 0,
+            "modified": 0,
+            "startedAt": datetime.now(UTC),
+        }
+    # Documents inserted or deleted between runs would otherwise show up as a count change
+    state["countBefore"] = collection.count_documents({})
+    state["status"] = "running"
+    checkpoints.replace_one({"_id": name}, state, upsert=True)
+
+    started = time.monotonic()
+    operations = 0
+    batches = 0
+    restarted = False
+    while max_batches is None or batches < max_batches:
+        query = dict(migration["pending"])
+        if state["lastId"] is not None:
+            query = {"$and": [query, {"_id": {"$gt": state["lastId"]}}]}
+        docs = list(collection.find(query).sort("_id", ASCENDING).limit(batch_size))
+        if not docs:
+            if restarted or state["lastId"] is None or collection.find_one(migration["pending"], {"_id": 1}) is None:
+                break
+            # Pending documents sit behind the checkpoint: scan once more from the start
+            print(f"  [MIGRATE] {name}: pending documents behind the checkpoint; restarting from the first _id.")
+            state["lastId"] = None
+            restarted = True
+            continue
+
+        requests = []
+        for doc in docs:
+            change = migration["transform"](doc)
+            if change:
+                requests.append(_write_for(doc, change))
+        if requests:
+            result = collection.bulk_write(
+                requests, ordered=False, bypass_document_validation=migration["validator"] is not None
+            )
+            state["modified"] += result.modified_count
+            bump_collection_version(db, migration["collection"])
+
+        # Checkpoint only after the batch is written; a crash in between re-runs the batch
+        state["lastId"] = docs[-1]["_id"]
+        state["processed"] += len(docs)
+        state["updatedAt"] = datetime.now(UTC)
+        checkpoints.update_one({"_id": name}, {"$set": {
+            "lastId": state["lastId"],
+            "processed": state["processed"],
+            "modified": state["modified"],
+            "updatedAt": state["updatedAt"],
+        }})
+        batches += 1
+        operations += len(requests)
+
+        # Throttle: sleep until the overall rate is back under the target
+        if max_ops_per_second:
+            ahead = operations / max_ops_per_second - (time.monotonic() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    report = verify_migration(db, name)
+    if report["remaining"] == 0:
+        if migration["validator"] is not None:
+            db.command("collMod", migration["collection"], validator=migration["validator"],
+                       validationAction=migration["validation_action"])
+        checkpoints.update_one({"_id": name}, {"$set": {"status": "complete", "completedAt": datetime.now(UTC)}})
+    print(f"  [MIGRATE] {name}: {state['processed']} scanned, {state['modified']} rewritten, "
+          f"{report['remaining']} still pending ({'verified' if report['verified'] else 'NOT verified'}).")
+    if report["countAfter"] != report["countBefore"]:
+        # Migrations only rewrite documents, so a count change means other writers were active
+        print(f"  [MIGRATE] {name}: document count changed during the run "
+              f"({report['countBefore']} -> {report['countAfter']}); concurrent inserts or deletes.")
+    return report
+
+
+def verify_migration(db, name):
+    """
+    Checks a migration: it is verified once nothing still matches `pending`.
+    countBefore (from the latest run's checkpoint) and countAfter are reported
+    alongside; they differ only when other clients inserted or deleted documents.
+    Returns {"name", "remaining", "countBefore", "countAfter", "verified"}.
+    """
+    migration = MIGRATIONS[name]
+    collection = db[migration["collection"]]
+    state = _checkpoint(db, name) or {}
+    remaining = collection.count_documents(migration["pending"])
+    count_after = collection.count_documents({})
+    count_before = state.get("countBefore")
+    return {
+        "name": name,
+        "remaining": remaining,
+        "countBefore": count_before,
+        "countAfter": count_after,
+        "verified": remaining == 0,
+    }
+
+
+def run_migrations(db, names, **options):
+    """
+    Runs migrations in order, stopping at the first one that doesn't verify.
+    The migrations not run are reported as {"name", "verified": False, "skipped": True}.
+    """
+    reports = []
+    for position, name in enumerate(names):
+        report = run_migration(db, name, **options)
+        reports.append(report)
+        if not report["verified"]:
+            skipped = list(names[position + 1:])
+            if skipped:
+                print(f"  [MIGRATE] Stopped at {name}; skipped {', '.join(skipped)}.")
+                reports.extend({"name": skipped_name, "verified": False, "skipped": True} for skipped_name in skipped)
+            break
+    return reports
+
+
+# Key normalization for eduhub_db: Part 2 writes course_id/instructor and an empty-string
+# course key on enrollments, while the Part 4 pipelines join on courseId/instructorId.
+
+def _rename(renames):
+    """Transform that $renames whichever of the old fields a document still has."""
+    def transform(doc):
+        present = {old: new for old, new in renames.items() if old in doc}
+        return {"$rename": present} if present else None
+    return transform
+
+
+def _enrollment_course_key(doc):
+    # An empty field name can't be addressed by update operators, so the document is replaced
+    if "" not in doc:
+        return None
+    replacement = {key: value for key, value in doc.items() if key != ""}
+    replacement.setdefault("courseId", doc[""])
+    return replacement
+
+
+register_migration(
+    "courses_course_id_to_courseId", "courses",
+    pending={"$or": [{"course_id": {"$exists": True}}, {"instructor": {"$exists": True}}]},
+    transform=_rename({"course_id": "courseId", "instructor": "instructorId"}),
+    validator={
+        "$jsonSchema": {
+            "bsonType": "object",
+            "required": ["courseId", "title", "instructorId"],
+            "properties": {
+                "courseId": {"bsonType": "string", "description": "Unique course ID"},
+                "title": {"bsonType": "string", "description": "Course title"},
+                "instructorId": {"bsonType": "string", "description": "userId of the instructor"},
+                "credits": {"bsonType": "int", "minimum": 1, "maximum": 10, "description": "Credit hours"},
+            },
+        }
+    },
+    # Part 2 re-runs still insert course_id/instructor courses (picked up by the next pass),
+    # so violations are only logged instead of failing those inserts
+    validation_action="warn",
+    description="courses: course_id -> courseId, instructor -> instructorId",
+)
+register_migration(
+    "enrollments_empty_key_to_courseId", "enrollments",
+    pending={"courseId": {"$exists": False}},
+    transform=_enrollment_course_key,
+    description="enrollments: '' -> courseId",
+)
+register_migration(
+    "lessons_course_id_to_courseId", "lessons",
+    pending={"course_id": {"$exists": True}},
+    transform=_rename({"course_id": "courseId"}),
+    description="lessons: course_id -> courseId",
+)
+register_migration(
+    "assignments_course_id_to_courseId", "assignments",
+    pending={"course_id": {"$exists": True}},
+    transform=_rename({"course_id": "courseId"}),
+    description="assignments: course_id -> courseId",
+)
+
+KEY_NORMALIZATION = [
+    "courses_course_id_to_courseId",
+    "enrollments_empty_key_to_courseId",
+    "lessons_course_id_to_courseId",
+    "assignments_course_id_to_courseId",
+]
@@ -0,0 +1,62 @@
+# ---Operation Profiles: Write Concern, Read Concern and Read Preference---
+# Each class of operation gets its own durability/consistency trade-off:
+#   durable     - enrollments and grades: majority-acknowledged and journaled
+#   fast        - profile tweaks, tags, publish flags: acknowledged by the primary only
+#   interactive - user-facing reads: primary, local read concern
+#   analytical  - Part 4 reports: secondaries preferred, so they stay off the primary
+import functools
+
+from pymongo import ReadPreference
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import SecondaryPreferred
+from pymongo.write_concern import WriteConcern
+
+PROFILES = {
+    "durable": {
+        "write_concern": WriteConcern(w="majority", j=True),
+        "read_concern": ReadConcern("majority"),
+        "read_preference": ReadPreference.PRIMARY,
+    },
+    "fast": {
+        "write_concern": WriteConcern(w=1, j=False),
+        "read_concern": ReadConcern("local"),
+        "read_preference": ReadPreference.PRIMARY,
+    },
+    "interactive": {
+        "read_concern": ReadConcern("local"),
+        "read_preference": ReadPreference.PRIMARY,
+    },
+    "analytical": {
+        "read_concern": ReadConcern("local"),
+        # Never read from a secondary lagging more than two minutes behind
+        "read_preference": SecondaryPreferred(max_staleness=120),
+    },
+}
+
+
+def register_profile(name, write_concern=None, read_concern=None, read_preference=None):
+    """Adds or replaces an operation profile; options left as None use the client defaults."""
+    options = {
+        "write_concern": write_concern,
+        "read_concern": read_concern,
+        "read_preference": read_preference,
+    }
+    PROFILES[name] = {key: value for key, value in options.items() if value is not None}
+
+
+def profiled_db(db, profile):
+    """Returns the same database handle configured with a profile's concerns and read preference."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown operation profile '{profile}'. Must be one of {list(PROFILES)}.")
+    return db.client.get_database(db.name, codec_options=db.codec_options, **PROFILES[profile])
+
+
+def uses_profile(profile):
+    """Decorator for functions taking `db` first: runs them against profiled_db(db, profile)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(db, *args, **kwargs):
+            return func(profiled_db(db, profile), *args, **kwargs)
+        wrapper.profile = profile
+        return wrapper
+    return decorator
@@ -1,14 +1,43 @@
+# EduHub MongoDB project, Parts 1-6.
+# Importing this module only defines each part's validators, queries, pipelines and functions;
+# nothing connects to MongoDB until a part is run. `python eduhub_queries.py` runs every part in
+# order, and `python eduhub_queries.py 4 5` runs only the parts given.
+
 # ---Part 1: Database Setup and Data Modeling
-#importing neccsary libraries
-from pymongo import MongoClient
+#importing neccsary libraries for every part (run_part4 imports the NumPy-backed report modules itself)
+import os
+import random
+import re # Used for email format validation
+import sys
 from datetime import datetime, timedelta, UTC
-import pandas as pd
 
-# Establish MongoDB connection
-client = MongoClient("mongodb://localhost:27017/")
-
-# Create or access the database
-db = client["eduhub_db"]
+from bson.objectid import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError
+
+from eduhub_archive import ensure_active_user_indexes
+from eduhub_bloom import UniqueKeyFilter
+from eduhub_client import get_client
+from eduhub_dedup import dedup_users_by_email
+from eduhub_effects import EnrollmentEffectsQueue
+from eduhub_grades import ensure_grade_indexes, set_grade
+from eduhub_index_bench import compare_index_plans, print_plan_comparison
+from eduhub_lessons import LESSONS_COLLECTION, add_lesson, ensure_lesson_indexes, remove_lesson
+from eduhub_migrations import KEY_NORMALIZATION, run_migrations
+from eduhub_profiles import profiled_db, uses_profile
+from eduhub_rollups import ROLLUP_COLLECTION, create_rollup_store, rebuild_rollups, record_activities, record_activity
+from eduhub_schema import (
+    benchmark_validator, check_document, compile_validator, load_validator_file, print_validator_benchmark,
+    suspect_rows,
+)
+from eduhub_sharding import analyze_shard_keys, print_shard_key_report, workload_from_reports
+from eduhub_sketches import GRADE_SKETCH_COLLECTION, record_enrollment_sketch, record_submission_grades
+from eduhub_versions import bump_collection_version
+
+# MongoDB connection and the database used by Parts 1, 2, 4 and 5
+# ("memory://" runs against the in-process backend in eduhub_memory instead of a mongod)
+MONGO_URI = "mongodb://localhost:27017/"
+EDUHUB_DATABASE_NAME = "eduhub_db"
 
 # Create collections with validation rules
 
@@ -60,619 +89,281 @@ instructors_validator = {
 }
 
 
-# Drop old collections if exist (to prevent errors during re-run)
+def run_part1(db):
+    """Part 1: recreates the students, courses and instructors collections with their validators."""
+    # Drop old collections if exist (to prevent errors during re-run)
 
-db.drop_collection("students")
-db.drop_collection("courses")
-db.drop_collection("instructors")
+    db.drop_collection("students")
+    db.drop_collection("courses")
+    db.drop_collection("instructors")
 
 
-# Create collections with validators
+    # Create collections with validators
 
-db.create_collection("students", validator=students_validator)
-db.create_collection("courses", validator=courses_validator)
-db.create_collection("instructors", validator=instructors_validator)
+    db.create_collection("students", validator=students_validator)
+    db.create_collection("courses", validator=courses_validator)
+    db.create_collection("instructors", validator=instructors_validator)
 
-print("successfully created Database 'eduhub_db' and collections with validation rules.")
+    print("successfully created Database 'eduhub_db' and collections with validation rules.")
 
 
 ##---Part 2: Data Population--
-# Import libraries
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
-from datetime import datetime, timedelta, UTC
-import random
-
-# Connection to MongoDB
-MONGO_URI = "mongodb://localhost:27017/"
-try:
-    client = MongoClient(MONGO_URI)
-    # The 'ping' command is to check the connection status
-    client.admin.command('ping')
-    print("Connection to MongoDB successful! You're ready to go.")
-except ConnectionFailure as e:
-    print(f"Connection failed: {e}")
-    print(f"Please ensure your MongoDB server is running and accessible at {MONGO_URI}")
-    exit()
-
-# Get the 'eduhub_db' database and collections from the previous part at the initial insertions
-db = client['eduhub_db']
-users_collection = db['users']
-courses_collection = db['courses']
-enrollments_collection = db['enrollments']
-lessons_collection = db['lessons']
-assignments_collection = db['assignments']
-submissions_collection = db['submissions']
-
-
-#Drop the 'users' collection before insertion to clear old data and prevent duplicate Key errors
-users_collection.drop()
-
-print("Database 'eduhub_db' and all collections are set up.")
-print("********************************************")
-
-
-# 2.1 Insert 20 users (15 students, 5 instructors) 
-print("Inserting 20 users in progress")
-
-# Sample data contianing names of instructors and studeents
-name_pairs = [
-    ("Tolu", "Akinola"), ("Chukwudi", "Dike"), ("Femi", "Ojo"), ("Chidi", "Okoye"), ("Emeka", "Nwachukwu"),
-    ("Ayomide", "Adewale"), ("Ijeoma", "Okafor"), ("Folake", "Ogunleye"), ("Chioma", "Nwankwo"), ("Zainab", "Umar"),
-    ("Halima", "Ibrahim"), ("Aisha", "Bello"), ("Musa", "Abdullahi"), ("Abubakar", "Suleiman"), ("Segun", "Adeyemi"),
-    ("Obinna", "Adebayo"), ("Tunde", "Yusuf"), ("Ifeyinwa", "Eke"), ("Sani", "Usman"), ("Bode", "Musa")
-]
-
-users_to_insert = []
-instructor_ids = []
-student_ids = []
-
-for i in range(20):
-    role = 'instructor' if i < 5 else 'student'
-    
-    # Get the name pair from the list using the loop index
-    first_name, last_name = name_pairs[i]
-    
-    user_doc = {
-        "userId": f"user_{i+1}",
-        "email": f"{first_name.lower()}{last_name.lower()}{i+1}@eduhub.com",
-        "firstName": first_name,
-        "lastName": last_name,
-        "role": role,
-        "dateJoined": datetime.now(UTC) - timedelta(days=random.randint(1, 365)),
-        "profile": {
-            "bio": f"A dedicated {role} on EduHub.",
-            "avatar": f"https://example.com/avatars/{i+1}.jpg",
-            "skills": ["Python", "MongoDB", "Data Analysis"] if role == 'instructor' else ["Learning"]
-        },
-        "isActive": True
-    }
-    users_to_insert.append(user_doc)
-    if role == 'instructor':
-        instructor_ids.append(user_doc['userId'])
-    else:
-        student_ids.append(user_doc['userId'])
-
-# Inserting sample data into users collection
-users_collection.insert_many(users_to_insert)
-print(f" Successfully Inserted {len(users_to_insert)} users.")
-
-
-#2.2 Insert 8 courses
-print("Inserting 8 courses in progress")
-courses_to_insert = []
-course_ids = []
-course_categories = ["Programming", "Design", "Business", "Marketing", "Art", "Science"]
-course_titles = [
-    "Introduction to Python", "Data Science with Pandas", "UI/UX Design Fundamentals",
-    "Digital Marketing Strategies", "Foundations of Art History", "Organic Chemistry",
-    "Web Development with MongoDB", "Project Management Basics"
-]
-
-for i in range(8):
-    course_id = f"course_{i+1}"
-    instructor_id = random.choice(instructor_ids)
-    course_doc = {
-        "course_id": course_id,
-        "title": course_titles[i],
-        "description": f"A comprehensive course on {course_titles[i]}.",
-        "instructor": instructor_id,  #picking a user as an instructor
-        "category": random.choice(course_categories),
-        "level": random.choice(['beginner', 'intermediate', 'advanced']),
-        "duration": random.randint(10, 60),
-        "price": random.randint(50, 200),
-        "tags": ["online", "2025"],
-        "createdAt": datetime.now(UTC),
-        "updatedAt": datetime.now(UTC),
-        "isPublished": True
-    }
-    courses_to_insert.append(course_doc)
-    course_ids.append(course_id)
-
-courses_collection.insert_many(courses_to_insert)
-print(f"{len(courses_to_insert)} courses inserted.")
-
-#2.3 Insert 15 enrollments 
-print("Inserting 15 enrollments in progrss")
-enrollments_to_insert = []
-for i in range(15):
-    enrollment_doc = {
-        "enrollmentId": f"enrollment_{i+1}",
-        "studentId": random.choice(student_ids),  # picking a student user
-        "": random.choice(course_ids),    # picking a course
-        "enrollmentDate": datetime.now(UTC) - timedelta(days=random.randint(1, 100)),
-        "progress": random.uniform(0, 100),
-        "status": random.choice(['in-progress', 'completed', 'dropped'])
-    }
-    enrollments_to_insert.append(enrollment_doc)
-
-enrollments_collection.insert_many(enrollments_to_insert)
-print(f"Inserted {len(enrollments_to_insert)} enrollments.")
-
-# 2.4 Insert 25 lessons
-print("Inserting 25 lessons in progress")
-lessons_to_insert = []
-for i in range(25):
-    lesson_doc = {
-        "lessonId": f"lesson_{i+1}",
-        "course_id": random.choice(course_ids),  #picking a course
-        "title": f"Lesson {i+1} Title",
-        "content": f"Content for lesson {i+1}.",
-        "videoUrl": "https://example.com/videos/lesson.mp4",
-        "durationMinutes": random.randint(5, 30),
-        "order": i + 1,
-        "createdAt": datetime.now(UTC)
-    }
-    lessons_to_insert.append(lesson_doc)
-
-lessons_collection.insert_many(lessons_to_insert)
-print(f"Inserted {len(lessons_to_insert)} lessons.")
-
-#2.5 Insert 10 assignments
-print("Inserting 10 assignments in progress")
-assignments_to_insert = []
-assignment_ids = []
-for i in range(10):
-    assignment_id = f"assignment_{i+1}"
-    assignment_doc = {
-        "assignmentId": assignment_id,
-        "course_id": random.choice(course_ids),  #picking a course
-        "title": f"Assignment {i+1} Title",
-        "description": f"Description for assignment {i+1}.",
-        "dueDate": datetime.now(UTC) + timedelta(days=random.randint(7, 30)),
-        "maxScore": 100,
-        "createdAt": datetime.now(UTC)
-    }
-    assignments_to_insert.append(assignment_doc)
-    assignment_ids.append(assignment_id)
-
-assignments_collection.insert_many(assignments_to_insert)
-print(f"Inserted {len(assignments_to_insert)} assignments.")
-
-# 2.6 Insert 12 assignment submissions
-print("Inserting 12 assignment submissions in progress")
-submissions_to_insert = []
-for i in range(12):
-    submission_doc = {
-        "submissionId": f"submission_{i+1}",
-        "assignmentId": random.choice(assignment_ids),  #picking an assignment
-        "studentId": random.choice(student_ids),        # picking a student user
-        "submittedAt": datetime.now(UTC) - timedelta(hours=random.randint(1, 24)),
-        "submissionUrl": "https://github.com/my-submission",
-        "grade": random.randint(50, 100),
-        "feedback": "Great work!"
-    }
-    submissions_to_insert.append(submission_doc)
-
-submissions_collection.insert_many(submissions_to_insert)
-print(f"Inserted {len(submissions_to_insert)} assignment submissions.")
-
-# Import libraries
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
-from datetime import datetime, timedelta, UTC
-import random
-
-# Connection to MongoDB
-MONGO_URI = "mongodb://localhost:27017/"
-try:
-    client = MongoClient(MONGO_URI)
-    # The 'ping' command is to check the connection status
-    client.admin.command('ping')
-    print("Connection to MongoDB successful! You're ready to go.")
-except ConnectionFailure as e:
-    print(f"Connection failed: {e}")
-    print(f"Please ensure your MongoDB server is running and accessible at {MONGO_URI}")
-    exit()
-
-# Get the 'eduhub_db' database and collections from the previous part at the initial insertions
-db = client['eduhub_db']
-users_collection = db['users']
-courses_collection = db['courses']
-enrollments_collection = db['enrollments']
-lessons_collection = db['lessons']
-assignments_collection = db['assignments']
-submissions_collection = db['submissions']
-
-print("Database 'eduhub_db' and all collections are set up.")
-print("********************************************")
-
-
-# 2.1 Insert 20 users (15 students, 5 instructors) 
-print("Inserting 20 users in progress")
-
-# Sample data contianing names of instructors and studeents
-name_pairs = [
-    ("Tolu", "Akinola"), ("Chukwudi", "Dike"), ("Femi", "Ojo"), ("Chidi", "Okoye"), ("Emeka", "Nwachukwu"),
-    ("Ayomide", "Adewale"), ("Ijeoma", "Okafor"), ("Folake", "Ogunleye"), ("Chioma", "Nwankwo"), ("Zainab", "Umar"),
-    ("Halima", "Ibrahim"), ("Aisha", "Bello"), ("Musa", "Abdullahi"), ("Abubakar", "Suleiman"), ("Segun", "Adeyemi"),
-    ("Obinna", "Adebayo"), ("Tunde", "Yusuf"), ("Ifeyinwa", "Eke"), ("Sani", "Usman"), ("Bode", "Musa")
-]
-
-users_to_insert = []
-instructor_ids = []
-student_ids = []
-
-for i in range(20):
-    role = 'instructor' if i < 5 else 'student'
-    
-    # Get the name pair from the list using the loop index
-    first_name, last_name = name_pairs[i]
-    
-    user_doc = {
-        "userId": f"user_{i+1}",
-        "email": f"{first_name.lower()}{last_name.lower()}{i+1}@eduhub.com",
-        "firstName": first_name,
-        "lastName": last_name,
-        "role": role,
-        "dateJoined": datetime.now(UTC) - timedelta(days=random.randint(1, 365)),
-        "profile": {
-            "bio": f"A dedicated {role} on EduHub.",
-            "avatar": f"https://example.com/avatars/{i+1}.jpg",
-            "skills": ["Python", "MongoDB", "Data Analysis"] if role == 'instructor' else ["Learning"]
-        },
-        "isActive": True
-    }
-    users_to_insert.append(user_doc)
-    if role == 'instructor':
-        instructor_ids.append(user_doc['userId'])
-    else:
-        student_ids.append(user_doc['userId'])
-
-# Inserting sample data into users collection
-users_collection.insert_many(users_to_insert)
-print(f" Successfully Inserted {len(users_to_insert)} users.")
-
-
-#2.2 Insert 8 courses
-print("Inserting 8 courses in progress")
-courses_to_insert = []
-course_ids = []
-course_categories = ["Programming", "Design", "Business", "Marketing", "Art", "Science"]
-course_titles = [
-    "Introduction to Python", "Data Science with Pandas", "UI/UX Design Fundamentals",
-    "Digital Marketing Strategies", "Foundations of Art History", "Organic Chemistry",
-    "Web Development with MongoDB", "Project Management Basics"
-]
-
-for i in range(8):
-    course_id = f"course_{i+1}"
-    instructor_id = random.choice(instructor_ids)
-    course_doc = {
-        "course_id": course_id,
-        "title": course_titles[i],
-        "description": f"A comprehensive course on {course_titles[i]}.",
-        "instructor": instructor_id,  #picking a user as an instructor
-        "category": random.choice(course_categories),
-        "level": random.choice(['beginner', 'intermediate', 'advanced']),
-        "duration": random.randint(10, 60),
-        "price": random.randint(50, 200),
-        "tags": ["online", "2025"],
-        "createdAt": datetime.now(UTC),
-        "updatedAt": datetime.now(UTC),
-        "isPublished": True
-    }
-    courses_to_insert.append(course_doc)
-    course_ids.append(course_id)
-
-courses_collection.insert_many(courses_to_insert)
-print(f"{len(courses_to_insert)} courses inserted.")
-
-#2.3 Insert 15 enrollments 
-print("Inserting 15 enrollments in progrss")
-enrollments_to_insert = []
-for i in range(15):
-    enrollment_doc = {
-        "enrollmentId": f"enrollment_{i+1}",
-        "studentId": random.choice(student_ids),  # picking a student user
-        "": random.choice(course_ids),    # picking a course
-        "enrollmentDate": datetime.now(UTC) - timedelta(days=random.randint(1, 100)),
-        "progress": random.uniform(0, 100),
-        "status": random.choice(['in-progress', 'completed', 'dropped'])
-    }
-    enrollments_to_insert.append(enrollment_doc)
 
-enrollments_collection.insert_many(enrollments_to_insert)
-print(f"Inserted {len(enrollments_to_insert)} enrollments.")
+USERS_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "schema_validation.json")
 
-# 2.4 Insert 25 lessons
-print("Inserting 25 lessons in progress")
-lessons_to_insert = []
-for i in range(25):
-    lesson_doc = {
-        "lessonId": f"lesson_{i+1}",
-        "course_id": random.choice(course_ids),  #picking a course
-        "title": f"Lesson {i+1} Title",
-        "content": f"Content for lesson {i+1}.",
-        "videoUrl": "https://example.com/videos/lesson.mp4",
-        "durationMinutes": random.randint(5, 30),
-        "order": i + 1,
-        "createdAt": datetime.now(UTC)
-    }
-    lessons_to_insert.append(lesson_doc)
-
-lessons_collection.insert_many(lessons_to_insert)
-print(f"Inserted {len(lessons_to_insert)} lessons.")
-
-#2.5 Insert 10 assignments
-print("Inserting 10 assignments in progress")
-assignments_to_insert = []
-assignment_ids = []
-for i in range(10):
-    assignment_id = f"assignment_{i+1}"
-    assignment_doc = {
-        "assignmentId": assignment_id,
-        "course_id": random.choice(course_ids),  #picking a course
-        "title": f"Assignment {i+1} Title",
-        "description": f"Description for assignment {i+1}.",
-        "dueDate": datetime.now(UTC) + timedelta(days=random.randint(7, 30)),
-        "maxScore": 100,
-        "createdAt": datetime.now(UTC)
-    }
-    assignments_to_insert.append(assignment_doc)
-    assignment_ids.append(assignment_id)
-
-assignments_collection.insert_many(assignments_to_insert)
-print(f"Inserted {len(assignments_to_insert)} assignments.")
-
-# 2.6 Insert 12 assignment submissions
-print("Inserting 12 assignment submissions in progress")
-submissions_to_insert = []
-for i in range(12):
-    submission_doc = {
-        "submissionId": f"submission_{i+1}",
-        "assignmentId": random.choice(assignment_ids),  #picking an assignment
-        "studentId": random.choice(student_ids),        # picking a student user
-        "submittedAt": datetime.now(UTC) - timedelta(hours=random.randint(1, 24)),
-        "submissionUrl": "https://github.com/my-submission",
-        "grade": random.randint(50, 100),
-        "feedback": "Great work!"
-    }
-    submissions_to_insert.append(submission_doc)
-
-submissions_collection.insert_many(submissions_to_insert)
-print(f"Inserted {len(submissions_to_insert)} assignment submissions.")
-
-print("\n All sample data has been successfully inserted with no errors.")
-
-
-# Import libraries
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
-from datetime import datetime, timedelta, UTC
-import random
-
-# Connection to MongoDB
-MONGO_URI = "mongodb://localhost:27017/"
-try:
-    client = MongoClient(MONGO_URI)
-    # The 'ping' command is to check the connection status
-    client.admin.command('ping')
-    print("Connection to MongoDB successful! You're ready to go.")
-except ConnectionFailure as e:
-    print(f"Connection failed: {e}")
-    print(f"Please ensure your MongoDB server is running and accessible at {MONGO_URI}")
-    exit()
-
-# Get the 'eduhub_db' database and collections from the previous part at the initial insertions
-db = client['eduhub_db']
-users_collection = db['users']
-courses_collection = db['courses']
-enrollments_collection = db['enrollments']
-lessons_collection = db['lessons']
-assignments_collection = db['assignments']
-submissions_collection = db['submissions']
-
-print("Database 'eduhub_db' and all collections are set up.")
-print("********************************************")
-
-
-# 2.1 Insert 20 users (15 students, 5 instructors) 
-print("Inserting 20 users in progress")
-
-# Sample data contianing names of instructors and studeents
-name_pairs = [
-    ("Tolu", "Akinola"), ("Chukwudi", "Dike"), ("Femi", "Ojo"), ("Chidi", "Okoye"), ("Emeka", "Nwachukwu"),
-    ("Ayomide", "Adewale"), ("Ijeoma", "Okafor"), ("Folake", "Ogunleye"), ("Chioma", "Nwankwo"), ("Zainab", "Umar"),
-    ("Halima", "Ibrahim"), ("Aisha", "Bello"), ("Musa", "Abdullahi"), ("Abubakar", "Suleiman"), ("Segun", "Adeyemi"),
-    ("Obinna", "Adebayo"), ("Tunde", "Yusuf"), ("Ifeyinwa", "Eke"), ("Sani", "Usman"), ("Bode", "Musa")
-]
-
-users_to_insert = []
-instructor_ids = []
-student_ids = []
-
-for i in range(20):
-    role = 'instructor' if i < 5 else 'student'
-    
-    # Get the name pair from the list using the loop index
-    first_name, last_name = name_pairs[i]
-    
-    user_doc = {
-        "userId": f"user_{i+1}",
-        "email": f"{first_name.lower()}{last_name.lower()}{i+1}@eduhub.com",
-        "firstName": first_name,
-        "lastName": last_name,
-        "role": role,
-        "dateJoined": datetime.now(UTC) - timedelta(days=random.randint(1, 365)),
-        "profile": {
-            "bio": f"A dedicated {role} on EduHub.",
-            "avatar": f"https://example.com/avatars/{i+1}.jpg",
-            "skills": ["Python", "MongoDB", "Data Analysis"] if role == 'instructor' else ["Learning"]
-        },
-        "isActive": True
-    }
-    users_to_insert.append(user_doc)
-    if role == 'instructor':
-        instructor_ids.append(user_doc['userId'])
-    else:
-        student_ids.append(user_doc['userId'])
-
-# Inserting sample data into users collection
-users_collection.insert_many(users_to_insert)
-print(f" Successfully Inserted {len(users_to_insert)} users.")
-
-
-#2.2 Insert 8 courses
-print("Inserting 8 courses in progress")
-courses_to_insert = []
-course_ids = []
-course_categories = ["Programming", "Design", "Business", "Marketing", "Art", "Science"]
-course_titles = [
-    "Introduction to Python", "Data Science with Pandas", "UI/UX Design Fundamentals",
-    "Digital Marketing Strategies", "Foundations of Art History", "Organic Chemistry",
-    "Web Development with MongoDB", "Project Management Basics"
-]
-
-for i in range(8):
-    course_id = f"course_{i+1}"
-    instructor_id = random.choice(instructor_ids)
-    course_doc = {
-        "course_id": course_id,
-        "title": course_titles[i],
-        "description": f"A comprehensive course on {course_titles[i]}.",
-        "instructor": instructor_id,  #picking a user as an instructor
-        "category": random.choice(course_categories),
-        "level": random.choice(['beginner', 'intermediate', 'advanced']),
-        "duration": random.randint(10, 60),
-        "price": random.randint(50, 200),
-        "tags": ["online", "2025"],
-        "createdAt": datetime.now(UTC),
-        "updatedAt": datetime.now(UTC),
-        "isPublished": True
-    }
-    courses_to_insert.append(course_doc)
-    course_ids.append(course_id)
-
-courses_collection.insert_many(courses_to_insert)
-print(f"{len(courses_to_insert)} courses inserted.")
-
-#2.3 Insert 15 enrollments 
-print("Inserting 15 enrollments in progrss")
-enrollments_to_insert = []
-for i in range(15):
-    enrollment_doc = {
-        "enrollmentId": f"enrollment_{i+1}",
-        "studentId": random.choice(student_ids),  # picking a student user
-        "": random.choice(course_ids),    # picking a course
-        "enrollmentDate": datetime.now(UTC) - timedelta(days=random.randint(1, 100)),
-        "progress": random.uniform(0, 100),
-        "status": random.choice(['in-progress', 'completed', 'dropped'])
-    }
-    enrollments_to_insert.append(enrollment_doc)
+def run_part2(db):
+    """
+    Part 2: recreates the users collection and inserts the sample users, courses,
+    enrollments, lessons, assignments and submissions.
+    """
+    # Get the 'eduhub_db' collections from the previous part at the initial insertions
+    users_collection = db['users']
+    courses_collection = db['courses']
+    enrollments_collection = db['enrollments']
+    lessons_collection = db['lessons']
+    assignments_collection = db['assignments']
+    submissions_collection = db['submissions']
+
+    #Drop the 'users' collection before insertion to clear old data and prevent duplicate Key errors
+    users_collection.drop()
+
+    # The users rules from data/schema_validation.json are installed on the server and compiled
+    # for the client, so an invalid user is rejected before it is ever sent
+    users_validator = load_validator_file(USERS_SCHEMA_PATH)
+    db.create_collection("users", validator=users_validator)
+    validate_user = compile_validator(users_validator, "validate_user")
+
+    # The rollups are recreated with their unique bucket index (which $merge and concurrent upserts
+    # rely on), then rebuilt from whatever earlier runs left in enrollments/submissions, so the
+    # increments recorded below land on top of exact counts instead of being added twice
+    db.drop_collection(ROLLUP_COLLECTION)
+    create_rollup_store(db)
+    rebuild_rollups(db)
+
+    print("Database 'eduhub_db' and all collections are set up.")
+    print("********************************************")
+
+
+    # 2.1 Insert 20 users (15 students, 5 instructors) 
+    print("Inserting 20 users in progress")
+
+    # Sample data contianing names of instructors and studeents
+    name_pairs = [
+        ("Tolu", "Akinola"), ("Chukwudi", "Dike"), ("Femi", "Ojo"), ("Chidi", "Okoye"), ("Emeka", "Nwachukwu"),
+        ("Ayomide", "Adewale"), ("Ijeoma", "Okafor"), ("Folake", "Ogunleye"), ("Chioma", "Nwankwo"), ("Zainab", "Umar"),
+        ("Halima", "Ibrahim"), ("Aisha", "Bello"), ("Musa", "Abdullahi"), ("Abubakar", "Suleiman"), ("Segun", "Adeyemi"),
+        ("Obinna", "Adebayo"), ("Tunde", "Yusuf"), ("Ifeyinwa", "Eke"), ("Sani", "Usman"), ("Bode", "Musa")
+    ]
 
-enrollments_collection.insert_many(enrollments_to_insert)
-print(f"Inserted {len(enrollments_to_insert)} enrollments.")
+    users_to_insert = []
+    instructor_ids = []
+    student_ids = []
+
+    for i in range(20):
+        role = 'instructor' if i < 5 else 'student'
+
+        # Get the name pair from the list using the loop index
+        first_name, last_name = name_pairs[i]
+
+        user_doc = {
+            "userId": f"user_{i+1}",
+            "email": f"{first_name.lower()}{last_name.lower()}{i+1}@eduhub.com",
+            "firstName": first_name,
+            "lastName": last_name,
+            "role": role,
+            "dateJoined": datetime.now(UTC) - timedelta(days=random.randint(1, 365)),
+            "profile": {
+                "bio": f"A dedicated {role} on EduHub.",
+                "avatar": f"https://example.com/avatars/{i+1}.jpg",
+                "skills": ["Python", "MongoDB", "Data Analysis"] if role == 'instructor' else ["Learning"]
+            },
+            "isActive": True
+        }
+        users_to_insert.append(user_doc)
+        if role == 'instructor':
+            instructor_ids.append(user_doc['userId'])
+        else:
+            student_ids.append(user_doc['userId'])
+
+    # Inserting sample data into users collection
+    for user_doc in users_to_insert:
+        check_document(validate_user, user_doc)
+    users_collection.insert_many(users_to_insert)
+    print(f" Successfully Inserted {len(users_to_insert)} users.")
+
+
+    #2.2 Insert 8 courses
+    print("Inserting 8 courses in progress")
+    courses_to_insert = []
+    course_ids = []
+    course_categories = ["Programming", "Design", "Business", "Marketing", "Art", "Science"]
+    course_titles = [
+        "Introduction to Python", "Data Science with Pandas", "UI/UX Design Fundamentals",
+        "Digital Marketing Strategies", "Foundations of Art History", "Organic Chemistry",
+        "Web Development with MongoDB", "Project Management Basics"
+    ]
 
-# 2.4 Insert 25 lessons
-print("Inserting 25 lessons in progress")
-lessons_to_insert = []
-for i in range(25):
-    lesson_doc = {
-        "lessonId": f"lesson_{i+1}",
-        "course_id": random.choice(course_ids),  #picking a course
-        "title": f"Lesson {i+1} Title",
-        "content": f"Content for lesson {i+1}.",
-        "videoUrl": "https://example.com/videos/lesson.mp4",
-        "durationMinutes": random.randint(5, 30),
-        "order": i + 1,
-        "createdAt": datetime.now(UTC)
-    }
-    lessons_to_insert.append(lesson_doc)
-
-lessons_collection.insert_many(lessons_to_insert)
-print(f"Inserted {len(lessons_to_insert)} lessons.")
-
-#2.5 Insert 10 assignments
-print("Inserting 10 assignments in progress")
-assignments_to_insert = []
-assignment_ids = []
-for i in range(10):
-    assignment_id = f"assignment_{i+1}"
-    assignment_doc = {
-        "assignmentId": assignment_id,
-        "course_id": random.choice(course_ids),  #picking a course
-        "title": f"Assignment {i+1} Title",
-        "description": f"Description for assignment {i+1}.",
-        "dueDate": datetime.now(UTC) + timedelta(days=random.randint(7, 30)),
-        "maxScore": 100,
-        "createdAt": datetime.now(UTC)
-    }
-    assignments_to_insert.append(assignment_doc)
-    assignment_ids.append(assignment_id)
-
-assignments_collection.insert_many(assignments_to_insert)
-print(f"Inserted {len(assignments_to_insert)} assignments.")
-
-# 2.6 Insert 12 assignment submissions
-print("Inserting 12 assignment submissions in progress")
-submissions_to_insert = []
-for i in range(12):
-    submission_doc = {
-        "submissionId": f"submission_{i+1}",
-        "assignmentId": random.choice(assignment_ids),  #picking an assignment
-        "studentId": random.choice(student_ids),        # picking a student user
-        "submittedAt": datetime.now(UTC) - timedelta(hours=random.randint(1, 24)),
-        "submissionUrl": "https://github.com/my-submission",
-        "grade": random.randint(50, 100),
-        "feedback": "Great work!"
-    }
-    submissions_to_insert.append(submission_doc)
+    for i in range(8):
+        course_id = f"course_{i+1}"
+        instructor_id = random.choice(instructor_ids)
+        course_doc = {
+            "course_id": course_id,
+            "title": course_titles[i],
+            "description": f"A comprehensive course on {course_titles[i]}.",
+            "instructor": instructor_id,  #picking a user as an instructor
+            "category": random.choice(course_categories),
+            "level": random.choice(['beginner', 'intermediate', 'advanced']),
+            "duration": random.randint(10, 60),
+            "price": random.randint(50, 200),
+            "tags": ["online", "2025"],
+            "createdAt": datetime.now(UTC),
+            "updatedAt": datetime.now(UTC),
+            "isPublished": True
+        }
+        courses_to_insert.append(course_doc)
+        course_ids.append(course_id)
+
+    courses_collection.insert_many(courses_to_insert)
+    print(f"{len(courses_to_insert)} courses inserted.")
+
+    #2.3 Insert 15 enrollments 
+    print("Inserting 15 enrollments in progrss")
+    enrollments_to_insert = []
+    for i in range(15):
+        enrollment_date = datetime.now(UTC) - timedelta(days=random.randint(1, 100))
+        status = random.choice(['in-progress', 'completed', 'dropped'])
+        enrollment_doc = {
+            "enrollmentId": f"enrollment_{i+1}",
+            "studentId": random.choice(student_ids),  # picking a student user
+            "": random.choice(course_ids),    # picking a course
+            "enrollmentDate": enrollment_date,
+            "progress": random.uniform(0, 100),
+            "status": status
+        }
+        if status == 'completed':
+            # The completions rollup and the cohort report both read completionDate
+            enrollment_doc["completionDate"] = enrollment_date + (datetime.now(UTC) - enrollment_date) * random.random()
+        enrollments_to_insert.append(enrollment_doc)
+
+    enrollments_collection.insert_many(enrollments_to_insert)
+    print(f"Inserted {len(enrollments_to_insert)} enrollments.")
+    # Keep the daily/monthly enrollment and completion buckets current
+    record_activities(db, "enrollments", [doc["enrollmentDate"] for doc in enrollments_to_insert])
+    record_activities(db, "completions", [doc["completionDate"] for doc in enrollments_to_insert if "completionDate" in doc])
+
+    # 2.4 Insert 25 lessons
+    print("Inserting 25 lessons in progress")
+    lessons_to_insert = []
+    for i in range(25):
+        lesson_doc = {
+            "lessonId": f"lesson_{i+1}",
+            "course_id": random.choice(course_ids),  #picking a course
+            "title": f"Lesson {i+1} Title",
+            "content": f"Content for lesson {i+1}.",
+            "videoUrl": "https://example.com/videos/lesson.mp4",
+            "durationMinutes": random.randint(5, 30),
+            "order": i + 1,
+            "createdAt": datetime.now(UTC)
+        }
+        lessons_to_insert.append(lesson_doc)
+
+    lessons_collection.insert_many(lessons_to_insert)
+    print(f"Inserted {len(lessons_to_insert)} lessons.")
+
+    #2.5 Insert 10 assignments
+    print("Inserting 10 assignments in progress")
+    assignments_to_insert = []
+    assignment_ids = []
+    for i in range(10):
+        assignment_id = f"assignment_{i+1}"
+        assignment_doc = {
+            "assignmentId": assignment_id,
+            "course_id": random.choice(course_ids),  #picking a course
+            "title": f"Assignment {i+1} Title",
+            "description": f"Description for assignment {i+1}.",
+            "dueDate": datetime.now(UTC) + timedelta(days=random.randint(7, 30)),
+            "maxScore": 100,
+            "createdAt": datetime.now(UTC)
+        }
+        assignments_to_insert.append(assignment_doc)
+        assignment_ids.append(assignment_id)
+
+    assignments_collection.insert_many(assignments_to_insert)
+    print(f"Inserted {len(assignments_to_insert)} assignments.")
+
+    # 2.6 Insert 12 assignment submissions
+    print("Inserting 12 assignment submissions in progress")
+    submissions_to_insert = []
+    for i in range(12):
+        submission_doc = {
+            "submissionId": f"submission_{i+1}",
+            "assignmentId": random.choice(assignment_ids),  #picking an assignment
+            "studentId": random.choice(student_ids),        # picking a student user
+            "submittedAt": datetime.now(UTC) - timedelta(hours=random.randint(1, 24)),
+            "submissionUrl": "https://github.com/my-submission",
+            "grade": random.randint(50, 100),
+            "feedback": "Great work!"
+        }
+        submissions_to_insert.append(submission_doc)
 
-submissions_collection.insert_many(submissions_to_insert)
-print(f"Inserted {len(submissions_to_insert)} assignment submissions.")
+    submissions_collection.insert_many(submissions_to_insert)
+    print(f"Inserted {len(submissions_to_insert)} assignment submissions.")
+    record_activities(db, "submissions", [doc["submittedAt"] for doc in submissions_to_insert])
+    # Feed the graded submissions into the course/assignment/student grade sketches
+    course_by_assignment = {doc["assignmentId"]: doc["course_id"] for doc in assignments_to_insert}
+    record_submission_grades(db, [
+        (doc["assignmentId"], doc["studentId"], doc["grade"], course_by_assignment[doc["assignmentId"]], None)
+        for doc in submissions_to_insert
+    ])
 
-print("\n All sample data has been successfully inserted with no errors.")
+    print("\n All sample data has been successfully inserted with no errors.")
 
 # ---Part 3: CRUD Operations and Queries---
-#importing libraries
-import json
-from pymongo import MongoClient
-from bson.objectid import ObjectId
 
-#Configuration Details
+#Configuration Details ("memory://" works here too, see eduhub_memory)
 MONGO_CONNECTION_STRING = "mongodb://localhost:27017/"
-DATABASE_NAME = "lms_platform"
+LMS_DATABASE_NAME = "lms_platform"
+# Where grades live: "embedded" (enrollments.grades array), "collection" or "keyed" (see eduhub_grades)
+GRADE_STORAGE_MODE = "embedded"
+# Where lessons live: "embedded" (courses.lessons array) or "paged" (outline + lessons collection, see eduhub_lessons)
+LESSON_STORAGE_MODE = "embedded"
 
 def get_database():
     """Establishes connection to MongoDB and returns the database object."""
     try:
-        client = MongoClient(MONGO_CONNECTION_STRING)
+        client = get_client(MONGO_CONNECTION_STRING)
         # Ping the server to check connection
         client.admin.command('ping')
-        print(f"Connection successful to database: {DATABASE_NAME}")
-        return client[DATABASE_NAME]
+        print(f"Connection successful to database: {LMS_DATABASE_NAME}")
+        return client[LMS_DATABASE_NAME]
     except Exception as e:
         print(f"Error connecting to MongoDB: {e}")
         return None
 
 #Functions for setting up collctions and inital data
 
+def ensure_enrollment_index(db):
+    """Creates the unique (studentId, courseId) index that makes each enrollment unique."""
+    db.enrollments.create_index([("studentId", ASCENDING), ("courseId", ASCENDING)], unique=True)
+    print("Unique index ensured on 'enrollments.studentId' and 'enrollments.courseId'")
+
+
 def setup_collections(db):
     """Clears collections and sets up initial dummy data for testing."""
     db.users.drop()
     db.courses.drop()
     db.enrollments.drop()
+    # The grade sketches and activity rollups describe the enrollments being dropped, so they start over too
+    db.drop_collection(GRADE_SKETCH_COLLECTION)
+    db.drop_collection(ROLLUP_COLLECTION)
+    create_rollup_store(db)
+    ensure_enrollment_index(db)
+    if GRADE_STORAGE_MODE != "embedded":
+        ensure_grade_indexes(db, GRADE_STORAGE_MODE)
+    if LESSON_STORAGE_MODE == "paged":
+        # Lessons of the dropped courses would otherwise linger in the lesson store
+        db.drop_collection(LESSONS_COLLECTION)
+        ensure_lesson_indexes(db)
 
     print("\n--- Setting up initial data ---")
 
@@ -704,13 +395,19 @@ def setup_collections(db):
         "instructorId": instructor_id,
         "category": "Programming",
         "isPublished": False, 
-        "lessons": [
-            {"lessonId": ObjectId(), "title": "Connecting to MongoDB", "content": "Code for MongoClient."},
-            {"lessonId": ObjectId(), "title": "Inserting Documents", "content": "Using insert_one and insert_many."}
-        ],
         "tags": ["NoSQL", "Database"]
     }
+    seed_lessons = [
+        ("Connecting to MongoDB", "Code for MongoClient."),
+        ("Inserting Documents", "Using insert_one and insert_many."),
+    ]
+    if LESSON_STORAGE_MODE != "paged":
+        course_doc["lessons"] = [{"lessonId": ObjectId(), "title": title, "content": content} for title, content in seed_lessons]
     course_id = db.courses.insert_one(course_doc).inserted_id
+    if LESSON_STORAGE_MODE == "paged":
+        # Paged lessons only exist for the paged helpers once they are in the lesson store and the outline
+        for title, content in seed_lessons:
+            add_lesson(db, course_id, title, content)
     print(f"Created Initial Course (ID: {course_id})")
 
     #Creating initial student enrollemrnt
@@ -723,14 +420,21 @@ def setup_collections(db):
         ]
     }
     enrollment_id = db.enrollments.insert_one(enrollment_doc).inserted_id
+    record_submission_grades(db, [
+        (grade["assignmentName"], student_id, grade["score"], course_id, None) for grade in enrollment_doc["grades"]
+    ])
     print(f"Created Initial Enrollment (ID: {enrollment_id})\n")
 
     return instructor_id, student_id, course_id, enrollment_id
 
 
 
+# Every Part 3 operation is tagged with an eduhub_profiles profile: enrollments, grades and deletes are
+# "durable" (majority, journaled), profile/tag/publish tweaks are "fast" (w=1) and reads are "interactive".
+
 #3.1: Create Operations
 
+@uses_profile("durable")
 def add_new_student(db, username, email):
     """Adds a new student user to the 'users' collection."""
     student_doc = {
@@ -744,6 +448,7 @@ def add_new_student(db, username, email):
     print(f"  [CREATE] New student '{username}' added. ID: {result.inserted_id}")
     return result.inserted_id
 
+@uses_profile("durable")
 def create_new_course(db, title, instructor_id, category):
     """Creates a new course in the 'courses' collection."""
     course_doc = {
@@ -751,31 +456,57 @@ def create_new_course(db, title, instructor_id, category):
         "instructorId": ObjectId(instructor_id),
         "category": category,
         "isPublished": False,
-        "lessons": [],
         "tags": []
     }
+    if LESSON_STORAGE_MODE != "paged":
+        course_doc["lessons"] = []
     result = db.courses.insert_one(course_doc)
     print(f"  [CREATE] New course '{title}' created. ID: {result.inserted_id}")
     return result.inserted_id
 
-def enroll_student_in_course(db, student_id, course_id):
-    """Enroll a student in a course by creating a document in 'enrollments'."""
-    enrollment_doc = {
-        "studentId": ObjectId(student_id),
-        "courseId": ObjectId(course_id),
-        "grades": []
-    }
-    # Check for existing course enrollment to prevent duplicates or multiple enrollment by the same student
-    if db.enrollments.find_one({"studentId": enrollment_doc["studentId"], "courseId": enrollment_doc["courseId"]}):
+@uses_profile("durable")
+def enroll_student_in_course(db, student_id, course_id, effects=None):
+    """
+    Enroll a student in a course by creating a document in 'enrollments'.
+    A single upsert with $setOnInsert does the existence check and the insert atomically;
+    the unique (studentId, courseId) index from ensure_enrollment_index() keeps concurrent
+    enroll clicks from creating duplicates.
+    The rollup and sketch updates are applied inline (several more round trips) unless an
+    eduhub_effects.EnrollmentEffectsQueue is passed as `effects`, which makes the enrollment one write.
+    """
+    student_id, course_id = ObjectId(student_id), ObjectId(course_id)
+    enrolled_at = datetime.now(UTC)
+    try:
+        result = db.enrollments.update_one(
+            {"studentId": student_id, "courseId": course_id},
+            {"$setOnInsert": {"enrollmentDate": enrolled_at, "grades": []}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # A concurrent request inserted the same enrollment between our match and insert
+        result = None
+    if result is None or result.upserted_id is None:
         print("  [CREATE] Student already enrolled in this course.")
         return None
 
-    result = db.enrollments.insert_one(enrollment_doc)
-    print(f"  [CREATE] Student {student_id} enrolled in course {course_id}. Enrollment ID: {result.inserted_id}")
-    return result.inserted_id
-
-def add_lesson_to_course(db, course_id, title, content):
-    """Adds a new lesson object to the 'lessons' array of an existing course."""
+    if effects is not None:
+        effects.enqueue(course_id, student_id, enrolled_at)
+    else:
+        # Keep the daily/monthly enrollment buckets current
+        record_activity(db, "enrollments", enrolled_at)
+        # Add the student to the course/instructor unique-learner sketches
+        record_enrollment_sketch(db, course_id, student_id)
+    print(f"  [CREATE] Student {student_id} enrolled in course {course_id}. Enrollment ID: {result.upserted_id}")
+    return result.upserted_id
+
+@uses_profile("durable")
+def add_lesson_to_course(db, course_id, title, content, mode=LESSON_STORAGE_MODE):
+    """
+    Adds a new lesson object to the 'lessons' array of an existing course.
+    With mode="paged" the content goes to the lessons collection and only an outline entry is embedded.
+    """
+    if mode == "paged":
+        return add_lesson(db, course_id, title, content)
     lesson_doc = {
         "lessonId": ObjectId(),
         "title": title,
@@ -786,6 +517,7 @@ def add_lesson_to_course(db, course_id, title, content):
         {"$push": {"lessons": lesson_doc}}
     )
     if result.modified_count:
+        bump_collection_version(db, "courses")
         print(f"  [CREATE] Lesson '{title}' added to course {course_id}.")
     else:
         print(f"  [CREATE] Failed to find or update course {course_id}.")
@@ -794,6 +526,7 @@ def add_lesson_to_course(db, course_id, title, content):
 
 
 #Task 3.2: Read Operations
+@uses_profile("interactive")
 def find_active_students(db):
     """Finds all users with role 'student' and isActive set to True."""
     query = {"role": "student", "isActive": True}
@@ -801,6 +534,7 @@ def find_active_students(db):
     print(f"  [READ] Found {len(students)} active students.")
     return students
 
+@uses_profile("interactive")
 def retrieve_course_with_instructor(db, course_id):
     """Retrieves course details and joins with instructor information using aggregation."""
     pipeline = [
@@ -827,6 +561,7 @@ def retrieve_course_with_instructor(db, course_id):
         return course[0]
     return None
 
+@uses_profile("interactive")
 def get_courses_by_category(db, category):
     """Gets all courses belonging to a specific category."""
     query = {"category": category}
@@ -834,6 +569,7 @@ def get_courses_by_category(db, category):
     print(f"  [READ] Found {len(courses)} courses in category '{category}'.")
     return courses
 
+@uses_profile("interactive")
 def find_students_in_course(db, course_id):
     """Finds all students enrolled in a particular course using a two-step lookup/join."""
     pipeline = [
@@ -855,6 +591,7 @@ def find_students_in_course(db, course_id):
     print(f"  [READ] Found {len(students)} students enrolled in course {course_id}.")
     return students
 
+@uses_profile("interactive")
 def search_courses_by_title(db, search_term):
     """Searches courses by title (case-insensitive, partial match) using regex."""
     query = {"title": {"$regex": search_term, "$options": "i"}}
@@ -865,6 +602,7 @@ def search_courses_by_title(db, search_term):
 
 #Task3.3: Update Operations
 
+@uses_profile("fast")
 def update_user_profile(db, user_id, updates):
     """Updates selected fields within a user's profile object."""
     result = db.users.update_one(
@@ -874,11 +612,13 @@ def update_user_profile(db, user_id, updates):
         {"$set": {f"profile.{k}": v for k, v in updates.items()}} 
     )
     if result.modified_count:
+        bump_collection_version(db, "users")
         print(f"  [UPDATE] User {user_id} profile updated: {updates}")
     else:
         print(f"  [UPDATE] User {user_id} not found or no changes made.")
     return result.modified_count
 
+@uses_profile("fast")
 def mark_course_published(db, course_id):
     """Marks a course as published (sets isPublished to True)."""
     result = db.courses.update_one(
@@ -886,23 +626,31 @@ def mark_course_published(db, course_id):
         {"$set": {"isPublished": True}}
     )
     if result.modified_count:
+        bump_collection_version(db, "courses")
         print(f"  [UPDATE] Course {course_id} marked as published.")
     else:
         print(f"  [UPDATE] Course {course_id} not found or already published.")
     return result.modified_count
 
-def update_assignment_grade(db, enrollment_id, assignment_name, new_score):
-    """Updates the score of a specific assignment within an enrollment's grades array."""
-    result = db.enrollments.update_one(
-        {"_id": ObjectId(enrollment_id), "grades.assignmentName": assignment_name},
-        {"$set": {"grades.$.score": new_score}} 
-    )
-    if result.modified_count:
-        print(f"  [UPDATE] Enrollment {enrollment_id}: Grade for '{assignment_name}' updated to {new_score}.")
+@uses_profile("durable")
+def update_assignment_grade(db, enrollment_id, assignment_name, new_score, mode=GRADE_STORAGE_MODE):
+    """
+    Updates the score of a specific assignment for an enrollment.
+    In the default "embedded" mode this is the grades array; see eduhub_grades for
+    the "collection" and "keyed" layouts. For bulk grading, eduhub_grades.GradeQueue
+    batches these into one bulk_write.
+    """
+    # set_grade() also moves the grade in the course/assignment/student grade sketches;
+    # in "collection" mode it looks up the enrollment's owner and skips missing enrollments
+    written = set_grade(db, enrollment_id, assignment_name, new_score, mode)
+    storage = "" if mode == "embedded" else f" ({mode} storage)"
+    if written:
+        print(f"  [UPDATE] Enrollment {enrollment_id}: Grade for '{assignment_name}' updated to {new_score}{storage}.")
     else:
-        print(f"  [UPDATE] Enrollment {enrollment_id}: Grade for '{assignment_name}' not found or no change made.")
-    return result.modified_count
+        print(f"  [UPDATE] Enrollment {enrollment_id}: Grade for '{assignment_name}' not found or no change made{storage}.")
+    return written
 
+@uses_profile("fast")
 def add_tags_to_course(db, course_id, tags_list):
     """Adds a list of tags to an existing course, ensuring no duplicates."""
     result = db.courses.update_one(
@@ -911,6 +659,7 @@ def add_tags_to_course(db, course_id, tags_list):
         {"$addToSet": {"tags": {"$each": tags_list}}} 
     )
     if result.modified_count:
+        bump_collection_version(db, "courses")
         print(f"  [UPDATE] Course {course_id}: Added tags {tags_list}.")
     else:
         print(f"  [UPDATE] Course {course_id} not found or tags already existed.")
@@ -919,35 +668,46 @@ def add_tags_to_course(db, course_id, tags_list):
 
 # Part 3.4: Delete Operations
 
+@uses_profile("durable")
 def soft_delete_user(db, user_id):
-    """Removes a user by soft deleting (setting isActive to false)."""
+    """
+    Removes a user by soft deleting (setting isActive to false).
+    deactivatedAt lets eduhub_archive.archive_inactive_users() move the user out once the retention window passes.
+    """
     result = db.users.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$set": {"isActive": False}}
+        {"_id": ObjectId(user_id), "isActive": True},
+        {"$set": {"isActive": False, "deactivatedAt": datetime.now(UTC)}}
     )
     if result.modified_count:
+        bump_collection_version(db, "users")
         print(f"  [DELETE] User {user_id} soft deleted (isActive: False).")
     else:
         print(f"  [DELETE] User {user_id} not found or already inactive.")
     return result.modified_count
 
+@uses_profile("durable")
 def delete_enrollment(db, enrollment_id):
     """Deletes an enrollment document completely."""
     result = db.enrollments.delete_one({"_id": ObjectId(enrollment_id)})
     if result.deleted_count:
+        bump_collection_version(db, "enrollments")
         print(f"  [DELETE] Enrollment {enrollment_id} successfully deleted.")
     else:
         print(f"  [DELETE] Enrollment {enrollment_id} not found.")
     return result.deleted_count
 
-def remove_lesson_from_course(db, course_id, lesson_title):
-    """Removes a lesson object from the 'lessons' array of a course by title."""
+@uses_profile("durable")
+def remove_lesson_from_course(db, course_id, lesson_title, mode=LESSON_STORAGE_MODE):
+    """Removes a lesson object from the 'lessons' array (or the paged lesson store) of a course by title."""
+    if mode == "paged":
+        return remove_lesson(db, course_id, lesson_title)
     result = db.courses.update_one(
         {"_id": ObjectId(course_id)},
         #pull removes matching array elements
         {"$pull": {"lessons": {"title": lesson_title}}} 
     )
     if result.modified_count:
+        bump_collection_version(db, "courses")
         print(f"  [DELETE] Lesson '{lesson_title}' removed from course {course_id}.")
     else:
         print(f"  [DELETE] Lesson '{lesson_title}' not found in course {course_id}.")
@@ -957,11 +717,12 @@ def remove_lesson_from_course(db, course_id, lesson_title):
 
 # Main Execution Block for Testing
 
-if __name__ == "__main__":
+def run_part3():
+    """Part 3: runs the CRUD operations and queries against the lms_platform database."""
     db = get_database()
 
     if db is None:
-        exit()
+        return
 
     # Create and get initial IDs for testing
     INSTRUCTOR_ID, INITIAL_STUDENT_ID, COURSE_ID, ENROLLMENT_ID = setup_collections(db)
@@ -971,7 +732,9 @@ if __name__ == "__main__":
     print("\n Running Task 3.1: Create Operations")
     NEW_STUDENT_ID = add_new_student(db, "Chinedu_Okafor", "chinedu@student.com")
     NEW_COURSE_ID = create_new_course(db, "Advanced Data Structures", INSTRUCTOR_ID, "Programming")
-    NEW_ENROLLMENT_ID = enroll_student_in_course(db, NEW_STUDENT_ID, NEW_COURSE_ID)
+    # Rollup and sketch updates are batched off the enrollment path and flushed at the end
+    effects = EnrollmentEffectsQueue(db)
+    NEW_ENROLLMENT_ID = enroll_student_in_course(db, NEW_STUDENT_ID, NEW_COURSE_ID, effects)
     add_lesson_to_course(db, COURSE_ID, "Working with Arrays", "How MongoDB handles arrays of objects.")
 
 
@@ -979,24 +742,19 @@ if __name__ == "__main__":
     print("\n Running Task 3.2: Read Operations")
 
     # Find all active students
-    active_students = find_active_students(db)
-    # print("  Active Students:", [s['username'] for s in active_students])
+    find_active_students(db)
 
     # Retrieve course details with instructor information
-    course_with_instr = retrieve_course_with_instructor(db, COURSE_ID)
-    # print(json.dumps(course_with_instr, indent=2))
+    retrieve_course_with_instructor(db, COURSE_ID)
 
     # Get all courses in a specific category (Programming)
-    programming_courses = get_courses_by_category(db, "Programming")
-    # print("  Programming Course Titles:", [c['title'] for c in programming_courses])
+    get_courses_by_category(db, "Programming")
 
     # Find students enrolled in a particular course (NEW_COURSE_ID)
-    enrolled_students = find_students_in_course(db, NEW_COURSE_ID)
-    # print("  Students in new course:", [s['username'] for s in enrolled_students])
+    find_students_in_course(db, NEW_COURSE_ID)
 
     # Search courses by title (case-insensitive, partial match)
-    search_results = search_courses_by_title(db, "data") 
-    # print("  Search results:", [c['title'] for c in search_results])
+    search_courses_by_title(db, "data")
 
 
     #Task 3.3: Update Operations 
@@ -1029,83 +787,57 @@ if __name__ == "__main__":
     # Remove a lesson from a course (COURSE_ID)
     remove_lesson_from_course(db, COURSE_ID, "Connecting to MongoDB")
 
+    effects.close()
     print("\n Testing Completed")
-    
+
 
 #--- Part 4: Advanced Queries and Aggregation---
-# Importing libraries
-from pymongo import MongoClient
-from datetime import datetime, timedelta
-import pandas as pd
 
-# ensuring that connectio to MongoDb is established
-MONGO_URI = "mongodb://localhost:27017/"
-try:
-    client = MongoClient(MONGO_URI)
-    client.admin.command('ping')
-    print("Connection to MongoDB successful for Part 4!")
-except Exception as e:
-    print(f"Connection failed: {e}")
-    exit()
-
-#Get 'eduhub_db' database and collections
-db = client['eduhub_db']
-users_collection = db['users']
-courses_collection = db['courses']
-enrollments_collection = db['enrollments']
-assignments_collection = db['assignments']
-submissions_collection = db['submissions']
+# Where run_part4 writes the reports as columnar files: a directory, or None to only print them
+REPORT_EXPORT_DIRECTORY = None
+# "parquet" or "arrow" (Arrow IPC, see eduhub_reports.export_report)
+REPORT_EXPORT_FORMAT = "parquet"
 
 
 #Task 4.1: Complex Queries
-print("\n Task 4.1: Complex Queries (Read Operations)")
+# Each query is defined here and executed with the rest of the Part 4 report pack below.
 
 # 1. Find courses with price between $50 and $200
 # $gte = greater than or equal to and $lte = less than or equal to
-price_range_courses = list(courses_collection.find({
+price_range_query = {
     "price": {"$gte": 50, "$lte": 200}
-}))
-print(f"Found {len(price_range_courses)} courses priced between $50 and $200.")
-for course in price_range_courses[:5]: #print first 5 results
-    print(f" - {course['title']} (${course['price']})")
+}
 
 # 2. Get users who joined in the last 6 months
-# Calculates a cutoff date and uses the $gt (greater than) operator
-six_months_ago = datetime.utcnow() - timedelta(days=180)
-recent_users = list(users_collection.find({
-    "dateJoined": {"$gt": six_months_ago}
-}))
-print(f"\nFound {len(recent_users)} users who joined in the last 6 months.")
-for user in recent_users[:5]: #print first 5 results
-    print(f" - {user['firstName']} {user['lastName']} (Joined: {user['dateJoined'].strftime('%Y-%m-%d')})")
+# Calculates a cutoff date (when the report runs) and uses the $gt (greater than) operator.
+# The cutoff is truncated to the day so the report's cache fingerprint stays the same all day.
+def recent_users_query():
+    six_months_ago = (datetime.now(UTC) - timedelta(days=180)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        "dateJoined": {"$gt": six_months_ago}
+    }
 
 
 # 3. Find courses that have specific tags using $in operator
 # Finds documents where the 'tags' array contains at least one of the specified values
 tags_to_find = ["online", "2025", "Beginner Friendly"]
-tagged_courses = list(courses_collection.find({
+tagged_courses_query = {
  "tags": {"$in": tags_to_find}
-}))
-print(f"\nFound {len(tagged_courses)} courses matching the generic tags: {', '.join(tags_to_find)}.")
-for course in tagged_courses[:5]: #print first 5 results
-  print(f" - {course['title']} (Tags: {course['tags']})")
+}
 
 
 # 4. Retrieve assignments with due dates in the next week
-# Uses $gte and $lte to define a date range for the 'dueDate' field
-now = datetime.utcnow()
-next_week = now + timedelta(days=7)
-upcoming_assignments = list(assignments_collection.find({
-    "dueDate": {"$gte": now, "$lte": next_week}
-}))
-print(f"\nFound {len(upcoming_assignments)} assignments due in the next 7 days.")
-
-for assignment in upcoming_assignments[:5]: #print first 5 results
-    print(f" - {assignment['title']} (Due: {assignment['dueDate'].strftime('%Y-%m-%d')})")
+# Uses $gte and $lte to define a date range for the 'dueDate' field (from the start of the current hour,
+# so the cache fingerprint is stable within the hour)
+def upcoming_assignments_query():
+    now = datetime.now(UTC).replace(minute=0, second=0, microsecond=0)
+    next_week = now + timedelta(days=7)
+    return {
+        "dueDate": {"$gte": now, "$lte": next_week}
+    }
 
 
 #Task 4.2: Aggregation Pipeline 
-print("\n Task 4.2: Aggregation Pipeline (Analytics)")
 
 # Course Enrollment Statistics
 
@@ -1118,9 +850,7 @@ enrollment_count_pipeline = [
     {"$unwind": "$courseDetails"},
     {"$project": {"_id": 0, "courseTitle": "$courseDetails.title", "totalEnrollments": 1}}
 ]
-enrollment_counts = list(enrollments_collection.aggregate(enrollment_count_pipeline))
-print("\n[A] Total enrollments per course:")
-print(pd.DataFrame(enrollment_counts))
+enrollment_count_schema = {"courseTitle": str, "totalEnrollments": int}
 
 
 # 2. Group by course category
@@ -1134,14 +864,13 @@ category_stats_pipeline = [
     {"$project": {"_id": 0, "category": "$_id", "totalEnrollments": 1, "uniqueCourseCount": {"$size": "$uniqueCourses"}}},
     {"$sort": {"totalEnrollments": -1}}
 ]
-category_stats = list(enrollments_collection.aggregate(category_stats_pipeline))
-print("\n[B] Enrollment statistics grouped by course category:")
-print(pd.DataFrame(category_stats))
+category_stats_schema = {"category": str, "totalEnrollments": int, "uniqueCourseCount": int}
 
 
 # Student Performance Analysis 
 
 # 3. Average grade per student and Top-performing students using a lookup to get the student's name
+# (medians, p90s and histograms per course/assignment/student come from eduhub_sketches.grade_percentiles/grade_histogram)
 student_performance_pipeline = [
     {"$group": {"_id": "$studentId", "averageGrade": {"$avg": "$grade"}, "submissionCount": {"$sum": 1}}},
     {"$sort": {"averageGrade": -1}},
@@ -1150,9 +879,7 @@ student_performance_pipeline = [
     {"$unwind": "$studentDetails"},
     {"$project": {"_id": 0, "studentName": {"$concat": ["$studentDetails.firstName", " ", "$studentDetails.lastName"]}, "averageGrade": {"$round": ["$averageGrade", 2]}, "submissionCount": 1}}
 ]
-student_grades = list(submissions_collection.aggregate(student_performance_pipeline))
-print("\n[C] Top-performing students (by average grade):")
-print(pd.DataFrame(student_grades))
+student_performance_schema = {"studentName": str, "averageGrade": float, "submissionCount": int}
 
 
 # 4. Completion rate by course (requires 'progress' and 'status' fields from enrollments)
@@ -1164,14 +891,13 @@ course_completion_pipeline = [
     {"$unwind": "$courseDetails"},
     {"$project": {"courseTitle": "$courseDetails.title", "totalEnrollments": 1, "completionRate_percent": {"$concat": [{"$toString": "$completionRate"}, "%"]}}}
 ]
-course_completion_rates = list(enrollments_collection.aggregate(course_completion_pipeline))
-print("\n[D] Course completion rates:")
-print(pd.DataFrame(course_completion_rates))
+course_completion_schema = {"courseTitle": str, "totalEnrollments": int, "completionRate_percent": str}
 
 
 # Instructor Analytics
 
 # 5.Count of total unique students taught by each instructor
+# (eduhub_sketches.unique_students_per_instructor() gives a constant-memory approximate count and an exact audit mode)
 instructor_student_count_pipeline = [
     {"$lookup": {"from": "enrollments", "localField": "courseId", "foreignField": "courseId", "as": "enrollments"}},
     {"$unwind": "$enrollments"},
@@ -1182,25 +908,21 @@ instructor_student_count_pipeline = [
     {"$unwind": "$instructorDetails"},
     {"$project": {"instructorName": {"$concat": ["$instructorDetails.firstName", " ", "$instructorDetails.lastName"]}, "uniqueStudentsTaught": 1}}
 ]
-instructor_student_counts = list(courses_collection.aggregate(instructor_student_count_pipeline))
-print("\n[E] Total unique students taught by each instructor:")
-print(pd.DataFrame(instructor_student_counts))
+instructor_student_count_schema = {"instructorName": str, "uniqueStudentsTaught": int}
 
 
 #  Advanced Analytics 
-print("\n Advanced Analytics (Reporting: Monthly Trends, Popular Categories, Engagement)")
 
 
 # 1. Monthly enrollment trends
-# Extracts year and month from 'enrollmentDate' to track trends over time.
+# Groups 'enrollmentDate' into zero-padded "YYYY-MM" labels so the months sort correctly.
+# For large date ranges, eduhub_rollups.activity_trend() reads the pre-aggregated buckets instead.
 monthly_enrollment_pipeline = [
-    {"$group": {"_id": {"year": {"$year": "$enrollmentDate"}, "month": {"$month": "$enrollmentDate"}}, "count": {"$sum": 1}}},
-    {"$sort": {"_id.year": 1, "_id.month": 1}},
-    {"$project": {"_id": 0, "YearMonth": {"$concat": [{"$toString": "$_id.year"}, "-", {"$toString": "$_id.month"}]}, "enrollmentCount": "$count"}}
+    {"$group": {"_id": {"$dateToString": {"format": "%Y-%m", "date": "$enrollmentDate"}}, "count": {"$sum": 1}}},
+    {"$sort": {"_id": 1}},
+    {"$project": {"_id": 0, "YearMonth": "$_id", "enrollmentCount": "$count"}}
 ]
-monthly_trends = list(enrollments_collection.aggregate(monthly_enrollment_pipeline))
-print("\n[F] 1. Monthly enrollment trends:")
-print(pd.DataFrame(monthly_trends))
+monthly_enrollment_schema = {"YearMonth": str, "enrollmentCount": int}
 
 
 # 2. Most popular course categories
@@ -1213,9 +935,7 @@ most_popular_categories_pipeline = [
     {"$group": {"_id": "$courseInfo.category", "totalEnrollments": {"$sum": 1}}},
     {"$sort": {"totalEnrollments": -1}} # Sorts by enrollment count to find the most popular
 ]
-most_popular_categories = list(enrollments_collection.aggregate(most_popular_categories_pipeline))
-print("\n[G] 2. Most popular course categories (by enrollment count):")
-print(pd.DataFrame(most_popular_categories))
+most_popular_categories_schema = {"_id": str, "totalEnrollments": int}
 
 
 # 3. Student engagement metrics: Average Submissions Per Student
@@ -1227,318 +947,304 @@ engagement_pipeline = [
     {"$group": {"_id": None, "totalStudentsWithSubmissions": {"$sum": 1}, "totalSubmissions": {"$sum": "$submissionCount"}}},
     {"$project": {"_id": 0, "AverageSubmissionsPerStudent": {"$round": [{"$divide": ["$totalSubmissions", "$totalStudentsWithSubmissions"]}, 2]}}}
 ]
-engagement_metrics = list(submissions_collection.aggregate(engagement_pipeline))
-print("\n[H] 3. Student Engagement Metrics (Average Submissions Per Student):")
-print(pd.DataFrame(engagement_metrics))
-
-
-#--- Part 5: Indexing and Performance--
-#--- Task 5.1: Index Creation---
-#Removing Duplicates and Creating Unique Indexes
-
-from pymongo import MongoClient
-from pymongo import ASCENDING
-
-# Use the correct local connection string and database name
-client = MongoClient('mongodb://localhost:27017/')
-db = client['eduhub_db']
+engagement_schema = {"AverageSubmissionsPerStudent": float}
+
+
+def part4_report_specs():
+    """The Part 4 report pack: name -> {"collection", "filter" or "pipeline", "schema"}."""
+    return {
+        "price_range_courses": {"collection": "courses", "filter": price_range_query},
+        "recent_users": {"collection": "users", "filter": recent_users_query()},
+        "tagged_courses": {"collection": "courses", "filter": tagged_courses_query},
+        "upcoming_assignments": {"collection": "assignments", "filter": upcoming_assignments_query()},
+        "enrollment_counts": {"collection": "enrollments", "pipeline": enrollment_count_pipeline, "schema": enrollment_count_schema},
+        "category_stats": {"collection": "enrollments", "pipeline": category_stats_pipeline, "schema": category_stats_schema},
+        "student_grades": {"collection": "submissions", "pipeline": student_performance_pipeline, "schema": student_performance_schema},
+        "course_completion_rates": {"collection": "enrollments", "pipeline": course_completion_pipeline, "schema": course_completion_schema},
+        "instructor_student_counts": {"collection": "courses", "pipeline": instructor_student_count_pipeline, "schema": instructor_student_count_schema},
+        "monthly_trends": {"collection": "enrollments", "pipeline": monthly_enrollment_pipeline, "schema": monthly_enrollment_schema},
+        "most_popular_categories": {"collection": "enrollments", "pipeline": most_popular_categories_pipeline, "schema": most_popular_categories_schema},
+        "engagement_metrics": {"collection": "submissions", "pipeline": engagement_pipeline, "schema": engagement_schema},
+    }
 
-print("Searching for duplicate emails...")
 
-# Aggregate to find all duplicate emails
-pipeline = [
-    {
-        "$group": {
-            "_id": "$email",
-            "count": {"$sum": 1},
-            "docs": {"$push": "$_id"}
-        }
-    },
-    {
-        "$match": {
-            "count": {"$gt": 1}
-        }
+def run_part4(db, export_directory=REPORT_EXPORT_DIRECTORY):
+    """
+    Part 4: normalizes the Part 2 keys, then runs the report pack and prints every section.
+    With an export_directory, the pipeline reports are also written there as columnar files.
+    """
+    # Imported here because the columnar report reader pulls in NumPy
+    from eduhub_reports import export_reports, print_timing_breakdown, run_reports
+
+    # Part 2 stores course_id/instructor (and an empty-string course key on enrollments), but these
+    # joins use courseId/instructorId. The migrations are checkpointed and throttled, so re-running
+    # this section only picks up documents that still need rewriting.
+    run_migrations(db, KEY_NORMALIZATION)
+
+    # Running the Part 4 report pack
+    # The four queries and eight pipelines are independent, so they run concurrently on a bounded
+    # thread pool; each one is capped by maxTimeMS and a timed-out report doesn't block the others.
+    # The "analytical" profile sends them to secondaries when the deployment has any.
+    part4_reports = part4_report_specs()
+    report_pack = run_reports(profiled_db(db, "analytical"), part4_reports)
+    part4_results = report_pack["results"]
+
+    print("\n Task 4.1: Complex Queries (Read Operations)")
+
+    price_range_courses = part4_results["price_range_courses"] or []
+    print(f"Found {len(price_range_courses)} courses priced between $50 and $200.")
+    for course in price_range_courses[:5]: #print first 5 results
+        print(f" - {course['title']} (${course['price']})")
+
+    recent_users = part4_results["recent_users"] or []
+    print(f"\nFound {len(recent_users)} users who joined in the last 6 months.")
+    for user in recent_users[:5]: #print first 5 results
+        print(f" - {user['firstName']} {user['lastName']} (Joined: {user['dateJoined'].strftime('%Y-%m-%d')})")
+
+    tagged_courses = part4_results["tagged_courses"] or []
+    print(f"\nFound {len(tagged_courses)} courses matching the generic tags: {', '.join(tags_to_find)}.")
+    for course in tagged_courses[:5]: #print first 5 results
+      print(f" - {course['title']} (Tags: {course['tags']})")
+
+    upcoming_assignments = part4_results["upcoming_assignments"] or []
+    print(f"\nFound {len(upcoming_assignments)} assignments due in the next 7 days.")
+    for assignment in upcoming_assignments[:5]: #print first 5 results
+        print(f" - {assignment['title']} (Due: {assignment['dueDate'].strftime('%Y-%m-%d')})")
+
+    print("\n Task 4.2: Aggregation Pipeline (Analytics)")
+    report_titles = {
+        "enrollment_counts": "[A] Total enrollments per course:",
+        "category_stats": "[B] Enrollment statistics grouped by course category:",
+        "student_grades": "[C] Top-performing students (by average grade):",
+        "course_completion_rates": "[D] Course completion rates:",
+        "instructor_student_counts": "[E] Total unique students taught by each instructor:",
+        "monthly_trends": "[F] 1. Monthly enrollment trends:",
+        "most_popular_categories": "[G] 2. Most popular course categories (by enrollment count):",
+        "engagement_metrics": "[H] 3. Student Engagement Metrics (Average Submissions Per Student):",
     }
-]
+    for name, title in report_titles.items():
+        if name == "monthly_trends":
+            print("\n Advanced Analytics (Reporting: Monthly Trends, Popular Categories, Engagement)")
+        print(f"\n{title}")
+        if report_pack["status"][name] == "ok":
+            print(part4_results[name])
+        else:
+            print(f"  Report not available ({report_pack['status'][name]}).")
 
-duplicates = list(db.users.aggregate(pipeline))
-
-if duplicates:
-    print(f"Found {len(duplicates)} email addresses with duplicates.")
-    for duplicate in duplicates:
-        email = duplicate['_id']
-        ids_to_delete = duplicate['docs'][1:]  # Keep the first document, delete the rest
-        
-        print(f"  - Deleting {len(ids_to_delete)} duplicate(s) for email: {email}")
-        
-        # Delete the duplicate documents
-        db.users.delete_many({'_id': {'$in': ids_to_delete}})
-        
-    print("\nAll duplicate documents have been removed.")
-else:
-    print("No duplicate emails found. The collection is ready for indexing.")
+    print_timing_breakdown(report_pack)
 
+    # Exporting the reports
+    # Each pipeline with a declared schema is streamed again into its own compressed file, so BI tools
+    # can memory-map the numbers instead of re-running the aggregation (find() reports are skipped).
+    if export_directory:
+        print(f"\nExporting reports to {export_directory} ({REPORT_EXPORT_FORMAT}):")
+        exported = export_reports(profiled_db(db, "analytical"), part4_reports, export_directory, REPORT_EXPORT_FORMAT)
+        for name, result in exported.items():
+            if isinstance(result, dict):
+                print(f"  [EXPORT] {name}: {result['rows']} row(s) in {result['rowGroups']} row group(s) -> {result['path']}")
+            else:
+                print(f"  [EXPORT] {name}: {result}")
+    # Cohort retention, drop-off curves and time-to-completion: eduhub_cohorts.CohortEngine(db).retention_grid()
 
-    from pymongo import MongoClient, ASCENDING
 
-# Establishing exisitng connection to MongoDB
-client = MongoClient('mongodb://localhost:27017/')
-db = client['eduhub_db']
+#--- Part 5: Indexing and Performance--
+#--- Task 5.1: Index Creation---
+#Removing Duplicates and Creating Unique Indexes
 
-# 1. User email lookup
-print("Creating index for user email lookup...")
-db.users.create_index([('email', ASCENDING)], unique=True)
-print("Index created on 'users.email'")
+# Filters the Part 3 functions send to enrollments, by shape (only the fields matter for routing)
+PART3_ENROLLMENT_QUERIES = [
+    {"name": "enroll_student_in_course", "filter": {"studentId": None, "courseId": None}},
+    {"name": "find_students_in_course", "filter": {"courseId": None}},
+    {"name": "update_assignment_grade", "filter": {"_id": None, "grades.assignmentName": None}},
+    {"name": "delete_enrollment", "filter": {"_id": None}},
+]
 
-# 2. Course search by title and category
-print("Creating compound index for course search...")
-db.courses.create_index([('title', ASCENDING), ('category', ASCENDING)])
-print("Compound index created on 'courses.title' and 'courses.category'")
+def run_part5(db):
+    """Part 5: removes duplicate emails, creates the indexes and compares query plans with and without them."""
+    print("Searching for duplicate emails...")
 
-# 3. Assignment queries by due date
-print("Creating index for assignment due date...")
-db.assignments.create_index([('dueDate', ASCENDING)])
-print("Index created on 'assignments.dueDate'")
+    # Walk users in email order and delete duplicate runs in batches, keeping the active account per email
+    # (the email index below is unique among active users only). Use dry_run=True to only report what would be removed.
+    dedup_report = dedup_users_by_email(db, keep="active")
 
-# 4. Enrollment queries by student and course
-print("Creating compound index for enrollment queries...")
-db.enrollments.create_index([('student_id', ASCENDING), ('course_id', ASCENDING)])
-print("Compound index created on 'enrollments.student_id' and 'enrollments.course_id'")
+    if dedup_report["duplicateEmails"]:
+        print(f"Found {dedup_report['duplicateEmails']} email addresses with duplicates.")
+        for example in dedup_report["examples"]:
+            print(f"  - Deleted {len(example['delete'])} duplicate(s) for email: {example['email']}")
+        print("\nAll duplicate documents have been removed.")
+    else:
+        print("No duplicate emails found. The collection is ready for indexing.")
 
-print("\nAll indexes created successfully.")
 
+    # 1. User email lookup
+    # Unique among active users only (a deactivated account's email can be reused); an older full
+    # 'email_1' index would reject exactly those reuses, so it is dropped once the partial one exists.
+    print("Creating index for user email lookup...")
+    ensure_active_user_indexes(db, replace_full_email_index=True)
+    print("Partial unique index created on 'users.email' for active users")
 
+    # 2. Course search by title and category
+    print("Creating compound index for course search...")
+    db.courses.create_index([('title', ASCENDING), ('category', ASCENDING)])
+    print("Compound index created on 'courses.title' and 'courses.category'")
 
-# ---Task 5.2: Query Optimization---
-#Query 1: User Email Lookup
-import time
-from pymongo import MongoClient
-from pymongo.errors import CollectionInvalid
+    # 3. Assignment queries by due date
+    print("Creating index for assignment due date...")
+    db.assignments.create_index([('dueDate', ASCENDING)])
+    print("Index created on 'assignments.dueDate'")
 
-# Use the correct local connection string and database name
-client = MongoClient('mongodb://localhost:27017/')
-db = client['eduhub_db']
+    # 4. Enrollment queries by student and course
+    print("Creating compound index for enrollment queries...")
+    # (Part 3's ensure_enrollment_index() makes this pair unique where the data is already de-duplicated)
+    db.enrollments.create_index([('studentId', ASCENDING), ('courseId', ASCENDING)])
+    print("Compound index created on 'enrollments.studentId' and 'enrollments.courseId'")
 
-# 
-email_to_find = 'john.doe@example.com' 
+    print("\nAll indexes created successfully.")
 
-# ----------------- Unindexed Performance Measurement -----------------
-print("--- Query 1: User Email Lookup (Before Index) ---")
 
-# Drop the index to simulate an unindexed query
-try:
-    db.users.drop_index([('email', ASCENDING)])
-    print("Dropped 'email' index for unindexed test.")
-except CollectionInvalid:
-    pass
 
-start_time_unindexed = time.time()
-db.users.find_one({'email': email_to_find})
-end_time_unindexed = time.time()
-unindexed_time = end_time_unindexed - start_time_unindexed
-print(f"Unindexed query time: {unindexed_time:.6f} seconds")
-
-# Indexed Performance Measurement 
-print("\n--- Query 1: User Email Lookup (After Index) ---")
-
-# Recreate the unique index on 'email'
-db.users.create_index([('email', ASCENDING)], unique=True)
-print("Recreated 'email' index.")
-
-start_time_indexed = time.time()
-db.users.find_one({'email': email_to_find})
-end_time_indexed = time.time()
-indexed_time = end_time_indexed - start_time_indexed
-print(f"Indexed query time: {indexed_time:.6f} seconds")
-
-#Performance Documentation 
-print("\n Performance Improvement ")
-explain_output = db.users.find({'email': email_to_find}).explain()
-print(f"Query Plan Stage: {explain_output['queryPlanner']['winningPlan']['inputStage']['stage']}")
-
-try:
-    improvement = unindexed_time / indexed_time
-    print(f"Performance improvement: {improvement:.2f}x faster")
-except ZeroDivisionError:
-    print("Indexed query was too fast to measure improvement accurately. (Time difference is negligible)")
-
-
-#Query 2: Course Search by Title and Category
-import time
-from pymongo import MongoClient
-
-# establisihing existing connection to MongoDb
-client = MongoClient('mongodb://localhost:27017/')
-db = client['eduhub_db']
-
-# searching for existing course in the collection
-title_to_find = 'Introduction to Python'
-category_to_find = 'Programming'
-
-#  Unindexed Performance Measurement 
-print("Query 2: Course Search (Before Compound Index)")
-
-# Drop the compound index to simulate an unindexed query
-try:
-    db.courses.drop_index([('title', ASCENDING), ('category', ASCENDING)])
-    print("Dropped 'title_1_category_1' index for unindexed test.")
-except CollectionInvalid:
-    pass
+    # ---Task 5.2: Query Optimization---
+    # Each query is timed on a forced collection scan and on its index with hint(), so the live
+    # indexes (including the unique email constraint) are never dropped or rebuilt.
+    # mode="hidden" hides the index from the planner instead; mode="shadow" experiments on a sampled copy.
+    #Query 1: User Email Lookup
+    email_to_find = 'john.doe@example.com' 
 
-start_time_unindexed = time.time()
-courses = list(db.courses.find({'title': title_to_find, 'category': category_to_find}))
-end_time_unindexed = time.time()
-unindexed_time = end_time_unindexed - start_time_unindexed
-print(f"Unindexed query time: {unindexed_time:.6f} seconds")
-
-#  Indexed Performance Measurement 
-print("\nQuery 2: Course Search (After Compound Index)")
-
-# Recreate the compound index
-db.courses.create_index([('title', ASCENDING), ('category', ASCENDING)])
-print("Recreated 'title_1_category_1' index.")
-
-start_time_indexed = time.time()
-courses = list(db.courses.find({'title': title_to_find, 'category': category_to_find}))
-end_time_indexed = time.time()
-indexed_time = end_time_indexed - start_time_indexed
-print(f"Indexed query time: {indexed_time:.6f} seconds")
-
-#  Performance Documentation 
-print("\n Performance Improvement")
-explain_output = db.courses.find({'title': title_to_find, 'category': category_to_find}).explain()
-print(f"Query Plan Stage: {explain_output['queryPlanner']['winningPlan']['inputStage']['stage']}")
-
-try:
-    improvement = unindexed_time / indexed_time
-    print(f"Performance improvement: {improvement:.2f}x faster")
-except ZeroDivisionError:
-    print("Indexed query was fast enough to make impovement accuurately mesurable")
-
-#Document the performance improvements using Python timing functions
-#(Query 3: Enrollment Queries)
-#imorting libraries
-import time
-from pymongo import MongoClient
-from bson.objectid import ObjectId
+    print("--- Query 1: User Email Lookup (Collection Scan vs Index) ---")
+    # The email index is partial, so the lookup has to name the active users it covers
+    email_results = compare_index_plans(db, 'users', {'email': email_to_find, 'isActive': True}, [('email', ASCENDING)])
 
-# using existing connection to Mongo DB
-client = MongoClient('mongodb://localhost:27017/')
-db = client['eduhub_db']
+    #Performance Documentation 
+    print_plan_comparison(email_results)
 
-student_id = ObjectId('60c72b2f9b1d1f001c9c7199') 
-course_id = ObjectId('60c72b2f9b1d1f001c9c719a')
 
-#  Unindexed Performance Measurement 
-print("Query 3: Enrollment Lookup (Before Compound Index)")
+    #Query 2: Course Search by Title and Category
+    # searching for existing course in the collection
+    title_to_find = 'Introduction to Python'
+    category_to_find = 'Programming'
 
-# Drop the compound index to simulate an unindexed query
-try:
-    db.enrollments.drop_index([('student_id', ASCENDING), ('course_id', ASCENDING)])
-    print("Dropped 'student_id_1_course_id_1' index for unindexed test.")
-except CollectionInvalid:
-    pass
+    print("\nQuery 2: Course Search (Collection Scan vs Compound Index)")
+    course_results = compare_index_plans(
+        db, 'courses', {'title': title_to_find, 'category': category_to_find},
+        [('title', ASCENDING), ('category', ASCENDING)]
+    )
 
-start_time_unindexed = time.time()
-enrollment = db.enrollments.find_one({'student_id': student_id, 'course_id': course_id})
-end_time_unindexed = time.time()
-unindexed_time = end_time_unindexed - start_time_unindexed
-print(f"Unindexed query time: {unindexed_time:.6f} seconds")
+    #  Performance Documentation 
+    print_plan_comparison(course_results)
 
-#  Indexed Performance Measurement 
-print("\n Query 3: Enrollment Lookup (After Compound Index)")
 
-# Recreate the compound index
-db.enrollments.create_index([('student_id', ASCENDING), ('course_id', ASCENDING)])
-print("Recreated 'student_id_1_course_id_1' index.")
+    #Document the performance improvements using Python timing functions
+    #(Query 3: Enrollment Queries)
+    student_id = ObjectId('60c72b2f9b1d1f001c9c7199') 
+    course_id = ObjectId('60c72b2f9b1d1f001c9c719a')
 
-start_time_indexed = time.time()
-enrollment = db.enrollments.find_one({'student_id': student_id, 'course_id': course_id})
-end_time_indexed = time.time()
-indexed_time = end_time_indexed - start_time_indexed
-print(f"Indexed query time: {indexed_time:.6f} seconds")
+    print("\nQuery 3: Enrollment Lookup (Collection Scan vs Compound Index)")
+    enrollment_results = compare_index_plans(
+        db, 'enrollments', {'studentId': student_id, 'courseId': course_id},
+        [('studentId', ASCENDING), ('courseId', ASCENDING)]
+    )
 
-# Performance Documentation 
-print("\n Performance Improvement")
-explain_output = db.enrollments.find({'student_id': student_id, 'course_id': course_id}).explain()
-print(f"Query Plan Stage: {explain_output['queryPlanner']['winningPlan']['inputStage']['stage']}")
+    # Performance Documentation 
+    print_plan_comparison(enrollment_results)
 
-try:
-    improvement = unindexed_time / indexed_time
-    print(f"Performance improvement: {improvement:.2f}x faster")
-except ZeroDivisionError:
-    print("Indexed query was too fast to measure improvement accurately.")
 
+    # ---Task 5.3: Shard Key Selection---
+    # Samples enrollments and submissions and simulates each candidate shard key: cardinality,
+    # monotonicity, chunk spread over simulated shards, and how the Part 3/4 queries would be routed.
+    print("\nTask 5.3: Shard Key Analysis (simulated, nothing is sharded)")
+    for collection_name in ("enrollments", "submissions"):
+        workload = workload_from_reports(part4_report_specs(), collection_name)
+        if collection_name == "enrollments":
+            workload = PART3_ENROLLMENT_QUERIES + workload
+        print_shard_key_report(analyze_shard_keys(db, collection_name, workload=workload))
 
 
 #---Part 6: Data Validation and Error Handling 
-# importing libraries
-import pymongo
-from pymongo.errors import DuplicateKeyError, ConnectionFailure
-import re # Used for email format validation
 
 # Custom Exception for Validation Errors
 class ValidationError(Exception):
     """Custom exception used to signal a failure in schema validation."""
     pass
 
-# Configuration details
-MONGO_URI = 'mongodb://localhost:27017/'
+# Configuration details (the connection is the Part 1 MONGO_URI)
 DATABASE_NAME = 'eduhub_db'
 COLLECTION_NAME = 'courses'
 
 # Task 6.1: Define Validation Rules
 REQUIRED_FIELDS = ['title', 'price', 'instructorEmail', 'level']
-VALID_LEVELS = ['beginner', 'intermediate', 'expert']
+# Same levels Part 2 writes, so generated courses pass the validator
+VALID_LEVELS = ['beginner', 'intermediate', 'advanced']
+
+# Email format, compiled once. Every repeated group must start with a separator that the
+# word runs around it can't match, so a failing match backtracks in linear time.
+# ASCII \w matches what the server's PCRE engine accepts for the same pattern.
+EMAIL_PATTERN = re.compile(r"^\w+(?:[.-]\w+)*@\w+(?:[.-]\w+)*\.\w{2,3}$", re.ASCII)
+
+# The course rules as a $jsonSchema: installed on the collection for the server and
+# compiled into check_course() for the client, so both enforce exactly the same rules.
+COURSE_VALIDATOR = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": REQUIRED_FIELDS,
+        "properties": {
+            "title": {"bsonType": "string", "description": "Course title"},
+            "price": {"bsonType": "number", "minimum": 0, "description": "Course price, never negative"},
+            "instructorEmail": {"bsonType": "string", "pattern": EMAIL_PATTERN.pattern, "description": "Instructor email"},
+            "level": {"bsonType": "string", "enum": VALID_LEVELS, "description": "Course level"},
+        }
+    }
+}
+check_course = compile_validator(COURSE_VALIDATOR, "check_course")
 
 def validate_course(data):
     """
-    Implements validation rules for Task 6.1 (Required, Data Type, Enum, Email).
+    Implements validation rules for Task 6.1 (Required, Data Type, Enum, Email)
+    with the compiled COURSE_VALIDATOR, before any round trip to the server.
     Raises a ValidationError if any rule is violated.
     """
-    errors = {}
-
-    # 1. Required fields chec
-    for field in REQUIRED_FIELDS:
-        # Checks if field is missing OR if its value is null
-        if field not in data or data[field] is None:
-            errors[field] = f"'{field}' is a required field."
-
+    errors = check_course(data)
     if errors:
         raise ValidationError(errors)
 
-    # 2. Data type validation and Range checks, title must be a string
-    if not isinstance(data.get('title'), str):
-        errors['title'] = "Course title must be a string."
-
-    # price must be a postive number
-    price = data.get('price')
-    if not isinstance(price, (int, float)):
-        # Task 6.2: Handles Invalid data type insertions 
-        errors['price'] = f"Course price must be a number, not '{type(price).__name__}'."
-    elif price < 0:
-        errors['price'] = "Price cannot be negative."
-
-    # level must be a string and an enum value
-    level = data.get('level')
-    if not isinstance(level, str):
-        errors['level'] = "Course level must be a string."
-    elif level.lower() not in VALID_LEVELS:
-
-        #3. Enum value restrictions check 
-        errors['level'] = f"'{level}' is not a supported course level. Must be one of {VALID_LEVELS}."
-
-    # 4. Email format validation (Regex)
-    email = data.get('instructorEmail')
-    # Basic regex for email format
-    email_regex = r"^\w+([\.-]?\w+)*@\w+([\.-]?\w+)*(\.\w{2,3})+$"
-    if not isinstance(email, str):
-        errors['instructorEmail'] = "Instructor email must be a string."
-    elif not re.match(email_regex, email):
-        errors['instructorEmail'] = f"'{email}' is not a valid email format."
-
-    if errors:
-        raise ValidationError(errors)
+def validate_courses_batch(data):
+    """
+    Batch version of validate_course for a whole catalog.
+    Accepts a list of dicts, a pandas DataFrame or a pyarrow Table and returns a
+    DataFrame of errors with one row per (row, field) violation. COURSE_VALIDATOR is
+    applied column-wise first, and only the rows that fail it go through check_course()
+    for the same messages as validate_course (null cells count as missing fields).
+    An empty result means every row is valid.
+    """
+    # pandas is only needed here, so importing this module stays fast
+    import pandas as pd
+
+    if hasattr(data, "to_pandas"):
+        data = data.to_pandas()
+    frame = data if isinstance(data, pd.DataFrame) else pd.DataFrame(list(data))
+    frame = frame.reset_index(drop=True)
+
+    errors = []
+    suspects = frame.loc[suspect_rows(COURSE_VALIDATOR, frame)]
+    columns = [(field, suspects[field].tolist(), suspects[field].notna().tolist()) for field in suspects.columns]
+    for position, row in enumerate(suspects.index):
+        document = {field: values[position] for field, values, present in columns if present[position]}
+        for field, message in check_course(document).items():
+            errors.append((row, field, message))
+    if not errors:
+        return pd.DataFrame(columns=["row", "field", "message"])
+    return pd.DataFrame(errors, columns=["row", "field", "message"]).sort_values(
+        ["row", "field"], kind="stable").reset_index(drop=True)
+
+DUPLICATE_KEY_CODE = 11000
+DEFAULT_SAVE_BATCH_SIZE = 1000
+
+def print_duplicate_key(key_value):
+    """Prints the fields and values of a unique constraint violation."""
+    if key_value:
+        for key_field, value in key_value.items():
+            print(f"  -> Field '{key_field}' with value '{value}' already exists.")
+    else:
+        print("  -> A unique constraint was violated on an indexed field.")
 
 def attempt_save(collection, data, description):
     """
@@ -1565,27 +1271,85 @@ def attempt_save(collection, data, description):
     except DuplicateKeyError as e:
         # Task 6.2: Handles Duplicate key errors 
         print("ERROR (Duplicate Key Error): Cannot save document due to unique constraint violation.")
-        # Attempt to parse the duplicate key field from the error message
-        error_msg = str(e)
-        key_match = re.search(r'dup key: { (\S+): \"?([^\"]+)\"? }', error_msg)
-        if key_match:
-             # Remove index name suffix ('_1') and print key/value
-             key_field = key_match.group(1).split(':')[0].strip().replace('_1', '')
-             key_value = key_match.group(2)
-             print(f"  -> Field '{key_field}' with value '{key_value}' already exists.")
-        else:
-             print("  -> A unique constraint was violated on an indexed field.")
+        # The server reports the conflicting key as a document, no message parsing needed
+        print_duplicate_key((e.details or {}).get("keyValue"))
 
     except Exception as e:
         # Handles generic database errors or unexpected issues
         print(f"An unexpected error occurred: {type(e).__name__}: {e}")
 
+def attempt_save_many(collection, documents, description, batch_size=DEFAULT_SAVE_BATCH_SIZE, key_filter=None):
+    """
+    Bulk counterpart of attempt_save: validates each batch, sends the valid documents
+    in one unordered insert_many per batch and decodes the BulkWriteError into a
+    per-document report. Returns {"saved", "invalid", "duplicates", "failed"}, where
+    every entry carries the document's "index" in `documents`.
+    With a seeded UniqueKeyFilter as `key_filter`, known duplicates are diverted
+    before they are sent (reported with "diverted": True).
+    """
+    print(f"\n--- Attempting: {description} ---")
+    documents = list(documents)
+    report = {"saved": [], "invalid": [], "duplicates": [], "failed": []}
+
+    for start in range(0, len(documents), batch_size):
+        # 1. Manual Schema Validation (Task 6.1 checks), no round trip for invalid documents
+        positions = []
+        for index in range(start, min(start + batch_size, len(documents))):
+            errors = check_course(documents[index])
+            if errors:
+                report["invalid"].append({"index": index, "errors": errors})
+            else:
+                positions.append(index)
+        # 2. Optional Bloom filter pre-check on the unique key
+        if key_filter is not None and positions:
+            fresh, duplicates = key_filter.partition([documents[index] for index in positions])
+            for offset in duplicates:
+                index = positions[offset]
+                key_value = {key_filter.field: documents[index][key_filter.field]}
+                report["duplicates"].append({"index": index, "keyValue": key_value, "diverted": True})
+            positions = [positions[offset] for offset in fresh]
+        if not positions:
+            continue
+
+        # 3. One unordered round trip for the whole batch; the server keeps going past failures
+        write_errors = {}
+        try:
+            collection.insert_many([documents[index] for index in positions], ordered=False)
+        except BulkWriteError as e:
+            # writeErrors[i]["index"] is the position within the documents that were sent
+            for write_error in e.details.get("writeErrors", []):
+                write_errors[positions[write_error["index"]]] = write_error
+
+        for index in positions:
+            write_error = write_errors.get(index)
+            if write_error is None:
+                report["saved"].append({"index": index, "_id": documents[index]["_id"]})
+                if key_filter is not None and key_filter.field in documents[index]:
+                    key_filter.add(documents[index][key_filter.field])
+            elif write_error["code"] == DUPLICATE_KEY_CODE:
+                report["duplicates"].append({"index": index, "keyValue": write_error.get("keyValue", {}), "diverted": False})
+            else:
+                report["failed"].append({"index": index, "code": write_error["code"], "message": write_error["errmsg"]})
+
+    print(f"SUCCESS: {len(report['saved'])} of {len(documents)} document(s) saved.")
+    for entry in report["invalid"]:
+        print(f"ERROR (Validation Error): Document #{entry['index']} is invalid.")
+        for field, message in entry["errors"].items():
+            print(f"  -> Field '{field}': {message}")
+    for entry in sorted(report["duplicates"], key=lambda entry: entry["index"]):
+        caught = "caught before sending" if entry["diverted"] else "rejected by the server"
+        print(f"ERROR (Duplicate Key Error): Document #{entry['index']} violates a unique constraint ({caught}).")
+        print_duplicate_key(entry["keyValue"])
+    for entry in report["failed"]:
+        print(f"ERROR (Write Error {entry['code']}): Document #{entry['index']}: {entry['message']}")
+    return report
+
 def run_part6_demo():
     """Main execution function for Part 6 demo."""
     client = None
     try:
         # Initialize connection
-        client = pymongo.MongoClient(MONGO_URI)
+        client = get_client(MONGO_URI)
         # The ismaster command is cheap and does not require auth.
         client.admin.command('ismaster')
         db = client[DATABASE_NAME]
@@ -1593,8 +1357,15 @@ def run_part6_demo():
 
         print(f"Connection successful to database '{DATABASE_NAME}'.")
 
+        # The server enforces the same compiled rules as validate_course
+        if COLLECTION_NAME in db.list_collection_names():
+            db.command("collMod", COLLECTION_NAME, validator=COURSE_VALIDATOR)
+        else:
+            db.create_collection(COLLECTION_NAME, validator=COURSE_VALIDATOR)
+        print(f"Course validator installed on '{COLLECTION_NAME}'.")
+
         # Ensure unique index on 'instructorEmail'
-        collection.create_index([("instructorEmail", pymongo.ASCENDING)], unique=True)
+        collection.create_index([("instructorEmail", ASCENDING)], unique=True)
         print(f"Successfully ensured unique index on '{COLLECTION_NAME}.instructorEmail'.")
 
         # Clean up collection for repeatable testing
@@ -1617,7 +1388,7 @@ def run_part6_demo():
 
         # 3. Task 6.2: Duplicate key errors (InstructorEmail ust be unique)
         attempt_save(collection,
-            { 'title': 'Data Science with Python', 'price': 199.99, 'instructorEmail': 'tunde.a@eduhub.com', 'level': 'expert' },
+            { 'title': 'Data Science with Python', 'price': 199.99, 'instructorEmail': 'tunde.a@eduhub.com', 'level': 'advanced' },
             '3. Duplicate Key Error: "instructorEmail"'
         )
 
@@ -1639,6 +1410,23 @@ def run_part6_demo():
             '6. Email Format Validation: "instructorEmail" is invalid'
         )
 
+        # 7. Bulk catalog import: one round trip per batch, with a per-document report
+        attempt_save_many(collection, [
+            { 'title': 'Cloud Computing Essentials', 'price': 120, 'instructorEmail': 'ngozi.e@eduhub.com', 'level': 'intermediate' },
+            { 'title': 'Python Backend Development II', 'price': 149, 'instructorEmail': 'tunde.a@eduhub.com', 'level': 'advanced' },
+            { 'title': 'Data Visualisation', 'price': 'free', 'instructorEmail': 'yemi.b@eduhub.com', 'level': 'beginner' },
+            { 'title': 'Machine Learning Foundations', 'price': 180, 'instructorEmail': 'ada.n@eduhub.com', 'level': 'advanced' },
+        ], '7. Bulk Import: valid, duplicate and invalid courses in one batch',
+            key_filter=UniqueKeyFilter(collection, "instructorEmail").seed())
+
+        # Client-side validation throughput, no network involved
+        catalog = [
+            { 'title': f'Course {i}', 'price': 10 + i % 90, 'instructorEmail': f'instructor{i}@eduhub.com',
+              'level': VALID_LEVELS[i % len(VALID_LEVELS)] }
+            for i in range(10000)
+        ]
+        print_validator_benchmark("check_course", benchmark_validator(check_course, catalog))
+
     except ConnectionFailure as e:
         print(f"\n Connection Failed: Unable to connect to MongoDB at {MONGO_URI}. Ensure MongoDB server is running.")
         print(f"Details: {e}")
@@ -1649,6 +1437,39 @@ def run_part6_demo():
             client.close()
             print("\nMongoDB connection closed.")
 
+
+# ---Running the parts---
+
+def main(parts=None):
+    """
+    Runs the selected parts ("1" to "6") in order, all of them by default.
+    Parts 1, 2, 4 and 5 share one eduhub_db connection; Parts 3 and 6 open their own.
+    """
+    parts = parts or ["1", "2", "3", "4", "5", "6"]
+    runners = {"1": run_part1, "2": run_part2, "4": run_part4, "5": run_part5}
+    unknown = [part for part in parts if part not in runners and part not in ("3", "6")]
+    if unknown:
+        raise ValueError(f"Unknown part(s) {unknown}. Must be between 1 and 6.")
+
+    client = get_client(MONGO_URI)
+    try:
+        # The 'ping' command is to check the connection status
+        client.admin.command('ping')
+        print("Connection to MongoDB successful! You're ready to go.")
+    except ConnectionFailure as e:
+        print(f"Connection failed: {e}")
+        print(f"Please ensure your MongoDB server is running and accessible at {MONGO_URI}")
+        return
+    db = client[EDUHUB_DATABASE_NAME]
+
+    for part in parts:
+        if part == "3":
+            run_part3()
+        elif part == "6":
+            run_part6_demo()
+        else:
+            runners[part](db)
+
 if __name__ == "__main__":
-    run_part6_demo()
+    main(sys.argv[1:])
 
@@ -0,0 +1,570 @@
+# ---Report Results: Columnar Conversion---
+# Decodes aggregation cursors batch by batch straight into typed columns,
+# so the Part 4 reports reach pandas without a list holding every row's dict.
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, UTC
+
+import numpy as np
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import ExecutionTimeout
+
+from eduhub_versions import collection_versions
+
+# Number of documents requested from the server per cursor batch
+DEFAULT_BATCH_SIZE = 10000
+
+# Declared column types (the same Python types pymongoarrow's Schema accepts)
+COLUMN_DTYPES = {
+    int: "int64",
+    float: "float64",
+    bool: "bool",
+    str: object,
+    datetime: "datetime64[ms]",
+}
+
+# Fill values for a missing field in columns that can hold one natively
+MISSING_VALUES = {
+    float: np.nan,
+    str: None,
+    datetime: np.datetime64("NaT"),
+}
+
+
+def _raw_collection(collection):
+    """Returns the collection configured to yield lazily-decoded raw BSON documents."""
+    return collection.with_options(
+        codec_options=CodecOptions(document_class=RawBSONDocument, tz_aware=False)
+    )
+
+
+def _get_path(document, path):
+    """Reads a (possibly dotted) field path from a document, returning None if absent."""
+    value = document
+    for part in path.split("."):
+        try:
+            value = value[part]
+        except (KeyError, TypeError):
+            return None
+    return value
+
+
+def _column_chunk(field, field_type, values):
+    """
+    Converts one batch of a field's values into (array, missing mask or None) in a single
+    NumPy call. Raises ValueError rather than truncating or coercing a value the column
+    can't hold exactly (a float with a fraction in an int column, a string in a bool column).
+    bool is a subclass of int, so bools in a numeric column are rejected by exact type.
+    """
+    if field_type is str:
+        return np.fromiter(values, dtype=object, count=len(values)), None
+    if field_type in (int, float) and any(type(value) is bool for value in values):
+        raise ValueError(f"Column '{field}' can't be read as {field_type.__name__}: it holds bool values.")
+    try:
+        if field_type is float:
+            # None becomes NaN
+            return np.array(values, dtype="float64"), None
+        if field_type is datetime:
+            # pandas converts datetime objects in C, about ten times faster than NumPy; None becomes NaT
+            import pandas as pd
+            return np.asarray(pd.array(values, dtype="datetime64[ms]")), None
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Column '{field}' can't be read as {field_type.__name__}: {e}") from None
+
+    # int and bool columns have no missing value of their own, so gaps go in a mask
+    missing = None
+    if None in values:
+        missing = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+        fill = False if field_type is bool else 0
+        values = [fill if value is None else value for value in values]
+    column = np.array(values)
+    if field_type is int and column.dtype.kind == "f" and np.all(np.isfinite(column)) and np.all(column == np.trunc(column)):
+        column = column.astype("int64")
+    expected_kinds = "i" if field_type is int else "b"
+    if column.dtype.kind not in expected_kinds:
+        raise ValueError(f"Column '{field}' can't be read as {field_type.__name__} without losing values.")
+    return column.astype(COLUMN_DTYPES[field_type], copy=False), missing
+
+
+def documents_to_columns(documents, schema, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Decodes an iterable of documents one batch at a time: each document's fields are
+    appended straight onto per-field value lists, and every `batch_size` documents each
+    list becomes a column chunk in one NumPy call, following the declared schema
+    ({field: type}). Values a column can't hold exactly raise ValueError.
+    Returns a dict of field name -> NumPy array.
+    """
+    for field, field_type in schema.items():
+        if field_type not in COLUMN_DTYPES:
+            raise TypeError(f"Unsupported column type for '{field}': {field_type!r}")
+
+    chunks = {field: [] for field in schema}
+    masks = {field: [] for field, field_type in schema.items() if field_type not in MISSING_VALUES}
+    values = {field: [] for field in schema}
+    flat = [(field, values[field].append) for field in schema if "." not in field]
+    dotted = [(field, values[field].append) for field in schema if "." in field]
+
+    def flush(count):
+        for field, field_type in schema.items():
+            column, missing = _column_chunk(field, field_type, values[field])
+            chunks[field].append(column)
+            if field in masks:
+                masks[field].append(np.zeros(count, dtype=bool) if missing is None else missing)
+            # The chunk holds its own copy, so the list is reused for the next batch
+            values[field].clear()
+
+    count = 0
+    for document in documents:
+        get = document.get
+        for field, append in flat:
+            append(get(field))
+        for field, append in dotted:
+            append(_get_path(document, field))
+        count += 1
+        if count == batch_size:
+            flush(count)
+            count = 0
+    if count:
+        flush(count)
+
+    result = {}
+    for field, field_type in schema.items():
+        if not chunks[field]:
+            result[field] = np.empty(0, dtype=COLUMN_DTYPES[field_type])
+            continue
+        column = np.concatenate(chunks[field])
+        if field in masks:
+            missing = np.concatenate(masks[field])
+            if missing.any():
+                # Promote int/bool columns with gaps to a type that can express them
+                if field_type is int:
+                    column = column.astype("float64")
+                    column[missing] = np.nan
+                else:
+                    column = column.astype(object)
+                    column[missing] = None
+        result[field] = column
+    return result
+
+
+def aggregate_to_columns(collection, pipeline, schema, batch_size=DEFAULT_BATCH_SIZE, **aggregate_options):
+    """
+    Runs an aggregation and decodes its cursor into typed NumPy columns (see documents_to_columns).
+    Extra keyword arguments (maxTimeMS, allowDiskUse, ...) go to aggregate().
+    Returns a dict of field name -> NumPy array.
+    """
+    cursor = collection.with_options(codec_options=CodecOptions(tz_aware=False)).aggregate(
+        pipeline, batchSize=batch_size, **aggregate_options
+    )
+    return documents_to_columns(cursor, schema, batch_size)
+
+
+def aggregate_to_arrow(collection, pipeline, schema, batch_size=DEFAULT_BATCH_SIZE, **aggregate_options):
+    """
+    Runs an aggregation and returns a pyarrow.Table with the declared schema.
+    Uses pymongoarrow when it is installed, otherwise builds the table from
+    the NumPy columns produced by aggregate_to_columns().
+    """
+    try:
+        from pymongoarrow.api import Schema, aggregate_arrow_all
+    except ImportError:
+        import pyarrow as pa
+        columns = aggregate_to_columns(collection, pipeline, schema, batch_size, **aggregate_options)
+        return pa.table({field: pa.array(values, from_pandas=True) for field, values in columns.items()})
+    return aggregate_arrow_all(collection, pipeline, schema=Schema(schema), batchSize=batch_size, **aggregate_options)
+
+
+def aggregate_to_dataframe(collection, pipeline, schema, batch_size=DEFAULT_BATCH_SIZE, **aggregate_options):
+    """
+    Runs an aggregation and returns a pandas DataFrame built column by column,
+    through pymongoarrow's aggregate_pandas_all() when it is installed.
+    """
+    try:
+        from pymongoarrow.api import Schema, aggregate_pandas_all
+    except ImportError:
+        import pandas as pd
+        columns = aggregate_to_columns(collection, pipeline, schema, batch_size, **aggregate_options)
+        return pd.DataFrame(columns, columns=list(schema))
+    return aggregate_pandas_all(collection, pipeline, schema=Schema(schema), batchSize=batch_size, **aggregate_options)
+
+
+def benchmark_columnar_decode(collection, pipeline, schema, repeat=3, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Compares pd.DataFrame(list(cursor)) with aggregate_to_dataframe() on the same pipeline,
+    end to end and for the client-side conversion alone (over documents fetched once, since
+    the server does the same work for both). Returns {"rows", "listOfDictsSeconds",
+    "columnarSeconds", "conversion": {"listOfDictsSeconds", "columnarSeconds"}}, fastest of `repeat` runs.
+    """
+    import pandas as pd
+    documents = list(collection.aggregate(pipeline, batchSize=batch_size))
+    timings = {"listOfDicts": [], "columnar": [], "listOfDictsConversion": [], "columnarConversion": []}
+    runs = {
+        "listOfDicts": lambda: pd.DataFrame(list(collection.aggregate(pipeline, batchSize=batch_size))),
+        "columnar": lambda: aggregate_to_dataframe(collection, pipeline, schema, batch_size),
+        "listOfDictsConversion": lambda: pd.DataFrame(list(iter(documents))),
+        "columnarConversion": lambda: pd.DataFrame(documents_to_columns(documents, schema, batch_size), columns=list(schema)),
+    }
+    for _ in range(repeat):
+        for name, run in runs.items():
+            started = time.perf_counter()
+            run()
+            timings[name].append(time.perf_counter() - started)
+    return {
+        "rows": len(documents),
+        "listOfDictsSeconds": min(timings["listOfDicts"]),
+        "columnarSeconds": min(timings["columnar"]),
+        "conversion": {
+            "listOfDictsSeconds": min(timings["listOfDictsConversion"]),
+            "columnarSeconds": min(timings["columnarConversion"]),
+        },
+    }
+
+
+def print_decode_benchmark(result):
+    """Prints one benchmark_columnar_decode() result."""
+    conversion = result["conversion"]
+    print(f"  [DECODE] {result['rows']} row(s), end to end: list of dicts {result['listOfDictsSeconds']:.3f}s, "
+          f"columnar {result['columnarSeconds']:.3f}s; conversion only: list of dicts "
+          f"{conversion['listOfDictsSeconds']:.3f}s, columnar {conversion['columnarSeconds']:.3f}s.")
+
+
+# ---Report Runner: Concurrent Execution with Time Budgets---
+# Independent reports run on a bounded thread pool (PyMongo clients are
+# thread-safe), so a report pack takes about as long as its slowest report.
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_TIME_MS = 30000
+
+
+def run_report(db, spec, max_time_ms=DEFAULT_MAX_TIME_MS, allow_disk_use=True, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Runs one report spec: {"collection", "pipeline", optional "schema"} for an
+    aggregation or {"collection", "filter", optional "projection"/"limit"} for a find.
+    Per-spec "maxTimeMS", "allowDiskUse" and "batchSize" override the defaults.
+    """
+    collection = db[spec["collection"]]
+    max_time_ms = spec.get("maxTimeMS", max_time_ms)
+    batch_size = spec.get("batchSize", batch_size)
+
+    if "pipeline" in spec:
+        options = {"maxTimeMS": max_time_ms, "allowDiskUse": spec.get("allowDiskUse", allow_disk_use)}
+        if "schema" in spec:
+            return aggregate_to_dataframe(collection, spec["pipeline"], spec["schema"], batch_size, **options)
+        return list(collection.aggregate(spec["pipeline"], batchSize=batch_size, **options))
+
+    cursor = collection.find(spec.get("filter", {}), spec.get("projection"))
+    cursor = cursor.max_time_ms(max_time_ms).batch_size(batch_size)
+    if "limit" in spec:
+        cursor = cursor.limit(spec["limit"])
+    return list(cursor)
+
+
+def run_reports(db, reports, max_workers=DEFAULT_MAX_WORKERS, max_time_ms=DEFAULT_MAX_TIME_MS,
+                allow_disk_use=True, batch_size=DEFAULT_BATCH_SIZE, budget_seconds=None, cache=None):
+    """
+    Runs a {name: spec} pack of reports concurrently.
+    Each report is bounded server-side by maxTimeMS; budget_seconds optionally
+    bounds the whole pack. Reports that time out or fail are reported in
+    "status" and leave None in "results", so the rest of the pack is still usable.
+    With a ReportCache, unchanged reports are served from the cache.
+    Returns {"results", "status", "timings", "totalSeconds"}.
+    """
+    results = {name: None for name in reports}
+    status = {name: "pending" for name in reports}
+    timings = {}
+
+    def timed_report(name, spec):
+        started = time.perf_counter()
+        try:
+            if cache is not None:
+                results[name] = cache.get_or_run(spec, lambda: run_report(db, spec, max_time_ms, allow_disk_use, batch_size))
+            else:
+                results[name] = run_report(db, spec, max_time_ms, allow_disk_use, batch_size)
+            status[name] = "ok"
+        except ExecutionTimeout:
+            status[name] = "timed_out"
+        except Exception as e:
+            # Server errors and client-side failures (schema casts, unsupported types) alike
+            status[name] = f"error: {type(e).__name__}: {e}"
+        finally:
+            timings[name] = time.perf_counter() - started
+
+    pack_started = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    futures = [pool.submit(timed_report, name, spec) for name, spec in reports.items()]
+    wait(futures, timeout=budget_seconds)
+    # Don't block on stragglers once the pack budget is spent
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    # Only reports still running when the pack budget ran out are timed out
+    for name in reports:
+        if status[name] == "pending":
+            status[name] = "timed_out"
+    # Snapshot the pack so late finishers can't change what the caller sees
+    return {
+        "results": dict(results),
+        "status": dict(status),
+        "timings": dict(timings),
+        "totalSeconds": time.perf_counter() - pack_started,
+    }
+
+
+def print_timing_breakdown(report_pack):
+    """Prints the per-report status and timing of a run_reports() result."""
+    print("\nReport timings:")
+    for name, report_status in report_pack["status"].items():
+        seconds = report_pack["timings"].get(name)
+        elapsed = f"{seconds:.4f}s" if seconds is not None else "-"
+        print(f" - {name}: {elapsed} ({report_status})")
+    print(f"Total wall-clock time: {report_pack['totalSeconds']:.4f}s")
+
+
+# ---Report Cache: Pipeline Fingerprints and Collection Versions---
+# A cached result is keyed by a canonical hash of the report spec plus the
+# current version token of every collection the spec reads from (eduhub_versions).
+# A write to a collection changes its token, so only the reports that read it miss.
+DEFAULT_CACHE_ENTRIES = 128
+
+
+def spec_fingerprint(spec):
+    """Returns a canonical SHA-256 hash of a report spec (key order does not matter)."""
+    canonical = json.dumps(
+        {key: value for key, value in spec.items() if key != "schema"},
+        sort_keys=True,
+        default=str,
+    )
+    schema = spec.get("schema")
+    if schema:
+        canonical += json.dumps({field: t.__name__ for field, t in schema.items()}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _pipeline_sources(pipeline):
+    """Collects the collections read by $lookup, $graphLookup and $unionWith stages, recursively."""
+    sources = set()
+    for stage in pipeline:
+        for stage_name in ("$lookup", "$graphLookup", "$unionWith"):
+            if stage_name not in stage:
+                continue
+            options = stage[stage_name]
+            if isinstance(options, str):
+                sources.add(options)
+                continue
+            if "from" in options:
+                sources.add(options["from"])
+            if "coll" in options:
+                sources.add(options["coll"])
+            sources |= _pipeline_sources(options.get("pipeline", []))
+    return sources
+
+
+def spec_sources(spec):
+    """Returns the sorted list of collections a report spec depends on."""
+    return sorted({spec["collection"]} | _pipeline_sources(spec.get("pipeline", [])))
+
+
+class ReportCache:
+    """In-process LRU cache of report results keyed by spec fingerprint and source versions."""
+
+    def __init__(self, db, max_entries=DEFAULT_CACHE_ENTRIES):
+        self.db = db
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cache_key(self, spec):
+        """Returns the (fingerprint, versions) key a spec currently maps to."""
+        versions = collection_versions(self.db, spec_sources(spec))
+        return spec_fingerprint(spec), tuple(sorted(versions.items()))
+
+    def get_or_run(self, spec, run):
+        """Returns the cached result for a spec, or calls run() and caches its result."""
+        key = self.cache_key(spec)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        result = run()
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        """Drops every cached result."""
+        with self._lock:
+            self._entries.clear()
+
+
+# ---Report Export: Parquet and Arrow IPC---
+# Streams a report's cursor into a columnar file one row group at a time, so
+# memory is bounded by the row-group size, not the report size. Each file's
+# schema metadata records the report name, when it was generated, the spec
+# fingerprint and the source collection versions, so BI tools can memory-map
+# the file instead of re-running the aggregation, and can tell whether it is stale.
+EXPORT_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+DEFAULT_ROW_GROUP_SIZE = 64 * 1024
+DEFAULT_COMPRESSION = "zstd"
+METADATA_PREFIX = "eduhub."
+
+
+def _arrow_schema(schema):
+    """Converts a report schema ({field: type}) into a pyarrow schema."""
+    import pyarrow as pa
+    arrow_types = {
+        int: pa.int64(),
+        float: pa.float64(),
+        bool: pa.bool_(),
+        str: pa.string(),
+        datetime: pa.timestamp("ms", tz="UTC"),
+    }
+    for field, field_type in schema.items():
+        if field_type not in arrow_types:
+            raise TypeError(f"Unsupported column type for '{field}': {field_type!r}")
+    return pa.schema([(field, arrow_types[field_type]) for field, field_type in schema.items()])
+
+
+def _report_cursor(db, spec, max_time_ms, batch_size):
+    """Opens a raw BSON cursor for a report spec (aggregation or find)."""
+    collection = _raw_collection(db[spec["collection"]])
+    max_time_ms = spec.get("maxTimeMS", max_time_ms)
+    if "pipeline" in spec:
+        return collection.aggregate(spec["pipeline"], batchSize=batch_size, maxTimeMS=max_time_ms,
+                                    allowDiskUse=spec.get("allowDiskUse", True))
+    cursor = collection.find(spec.get("filter", {}), spec.get("projection"))
+    cursor = cursor.max_time_ms(max_time_ms).batch_size(batch_size)
+    if "limit" in spec:
+        cursor = cursor.limit(spec["limit"])
+    return cursor
+
+
+def export_report(db, name, spec, directory, format="parquet", row_group_size=DEFAULT_ROW_GROUP_SIZE,
+                  compression=DEFAULT_COMPRESSION, max_time_ms=DEFAULT_MAX_TIME_MS):
+    """
+    Streams one report into `directory`/<name>.parquet (or .arrow for Arrow IPC)
+    in row groups of `row_group_size` rows and returns {"path", "rows", "rowGroups"}.
+    The spec needs a "schema"; find() specs can declare one alongside a projection.
+    The file is written under a temporary name and renamed, so readers never see a partial file.
+    """
+    import pyarrow as pa
+
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{format}'. Must be one of {list(EXPORT_FORMATS)}.")
+    if "schema" not in spec:
+        raise ValueError(f"Report '{name}' has no schema to export with.")
+
+    metadata = {
+        "report": name,
+        "generatedAt": datetime.now(UTC).isoformat(timespec="milliseconds"),
+        "fingerprint": spec_fingerprint(spec),
+        "sourceVersions": json.dumps(collection_versions(db, spec_sources(spec)), sort_keys=True),
+        "schema": json.dumps({field: t.__name__ for field, t in spec["schema"].items()}),
+    }
+    schema = _arrow_schema(spec["schema"]).with_metadata(
+        {METADATA_PREFIX + key: value for key, value in metadata.items()}
+    )
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name + EXPORT_FORMATS[format])
+    partial_path = path + ".partial"
+    if format == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(partial_path, schema, compression=compression)
+    else:
+        writer = pa.ipc.new_file(partial_path, schema, options=pa.ipc.IpcWriteOptions(compression=compression))
+
+    rows = 0
+    row_groups = 0
+    chunk = []
+
+    def flush():
+        nonlocal rows, row_groups
+        if not chunk:
+            return
+        arrays = [
+            pa.array([_get_path(document, field.name) for document in chunk], type=field.type, from_pandas=True)
+            for field in schema
+        ]
+        batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+        # One row group (Parquet) or record batch (Arrow IPC) per chunk
+        if format == "parquet":
+            writer.write_table(pa.Table.from_batches([batch], schema=schema))
+        else:
+            writer.write_batch(batch)
+        rows += len(chunk)
+        row_groups += 1
+        chunk.clear()
+
+    try:
+        for document in _report_cursor(db, spec, max_time_ms, min(row_group_size, DEFAULT_BATCH_SIZE)):
+            chunk.append(document)
+            if len(chunk) >= row_group_size:
+                flush()
+        flush()
+        writer.close()
+        os.replace(partial_path, path)
+    except BaseException:
+        writer.close()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return {"path": path, "rows": rows, "rowGroups": row_groups}
+
+
+def export_reports(db, reports, directory, format="parquet", **options):
+    """
+    Exports every report in a {name: spec} pack that declares a schema.
+    Returns {name: export_report() result or an "error: ..." / "skipped: ..." string}.
+    """
+    exported = {}
+    for name, spec in reports.items():
+        if "schema" not in spec:
+            exported[name] = "skipped: no schema"
+            continue
+        try:
+            exported[name] = export_report(db, name, spec, directory, format, **options)
+        except ExecutionTimeout:
+            exported[name] = "error: timed_out"
+        except Exception as e:
+            # Server errors and client-side failures (unsupported types, bad casts) alike
+            exported[name] = f"error: {type(e).__name__}: {e}"
+    return exported
+
+
+def read_exported_report(path):
+    """
+    Memory-maps an exported report and returns (pyarrow.Table, metadata), where
+    metadata holds the report name, generatedAt, fingerprint, sourceVersions and schema.
+    """
+    import pyarrow as pa
+    if path.endswith(EXPORT_FORMATS["parquet"]):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, memory_map=True)
+    else:
+        # The table's buffers point into the mapping, so it must stay open
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    raw = table.schema.metadata or {}
+    metadata = {
+        key.decode()[len(METADATA_PREFIX):]: value.decode()
+        for key, value in raw.items()
+        if key.decode().startswith(METADATA_PREFIX)
+    }
+    return table, metadata
+
+
+def is_export_fresh(db, spec, metadata):
+    """True when an export was made from the same spec and its source collections haven't been written since."""
+    current = json.dumps(collection_versions(db, spec_sources(spec)), sort_keys=True)
+    return metadata.get("fingerprint") == spec_fingerprint(spec) and metadata.get("sourceVersions") == current
@@ -0,0 +1,189 @@
+# ---Pre-aggregated Activity Rollups---
+# Daily and monthly buckets of enrollments, completions and submissions.
+# Buckets are updated incrementally on write (record_activity) or rebuilt
+# server-side by a batch job (rebuild_rollups), so trend queries read one
+# row per bucket instead of scanning the raw enrollments.
+import weakref
+from datetime import datetime, UTC
+
+from pymongo import ASCENDING, UpdateOne
+
+from eduhub_versions import bump_collection_version
+
+ROLLUP_COLLECTION = "activity_rollups"
+GRANULARITIES = ["day", "month"]
+
+# Source collection and date field for each rolled-up event type
+ROLLUP_SOURCES = {
+    "enrollments": {"collection": "enrollments", "dateField": "enrollmentDate", "match": {}},
+    "completions": {"collection": "enrollments", "dateField": "completionDate", "match": {"status": "completed"}},
+    "submissions": {"collection": "submissions", "dateField": "submittedAt", "match": {}},
+}
+
+# Period labels are zero-padded so they sort correctly as strings ("2025-09" < "2025-10")
+PERIOD_FORMATS = {"day": "%Y-%m-%d", "month": "%Y-%m"}
+
+# client -> {database name: True if its rollup store is a time-series collection}
+_STORE_TYPES = weakref.WeakKeyDictionary()
+
+
+def bucket_start(when, granularity):
+    """Truncates a datetime to the start of its day or month bucket (naive UTC)."""
+    if when.tzinfo is not None:
+        when = when.astimezone(UTC).replace(tzinfo=None)
+    if granularity == "day":
+        return datetime(when.year, when.month, when.day)
+    if granularity == "month":
+        return datetime(when.year, when.month, 1)
+    raise ValueError(f"Unsupported granularity '{granularity}'. Must be one of {GRANULARITIES}.")
+
+
+def create_rollup_store(db, time_series=False):
+    """
+    Creates the rollup collection and its bucket index.
+    With time_series=True the store is a MongoDB time-series collection;
+    those are append-only, so record_activity() inserts one delta
+    measurement per event and trend queries sum the deltas per bucket.
+    """
+    if ROLLUP_COLLECTION not in db.list_collection_names():
+        if time_series:
+            db.create_collection(
+                ROLLUP_COLLECTION,
+                timeseries={"timeField": "bucket", "metaField": "granularity", "granularity": "hours"},
+            )
+        else:
+            db.create_collection(ROLLUP_COLLECTION)
+    _STORE_TYPES.get(db.client, {}).pop(db.name, None)
+    if not is_time_series(db):
+        db[ROLLUP_COLLECTION].create_index([("granularity", ASCENDING), ("bucket", ASCENDING)], unique=True)
+    print(f"  [ROLLUP] Rollup store '{ROLLUP_COLLECTION}' ready (time-series: {is_time_series(db)}).")
+
+
+def is_time_series(db):
+    """
+    Returns True if the rollup store was created as a time-series collection.
+    The answer comes from listCollections once per database and is then cached;
+    a store that does not exist yet is looked up again on the next call.
+    """
+    known = _STORE_TYPES.setdefault(db.client, {})
+    if db.name not in known:
+        info = list(db.list_collections(filter={"name": ROLLUP_COLLECTION}))
+        if not info:
+            return False
+        known[db.name] = "timeseries" in info[0].get("options", {})
+    return known[db.name]
+
+
+def record_activity(db, event, when, count=1):
+    """Adds `count` events of the given type to the day and month buckets containing `when`."""
+    _write_buckets(db, event, {(granularity, bucket_start(when, granularity)): count for granularity in GRANULARITIES})
+
+
+def record_activities(db, event, whens):
+    """Adds one event per datetime in `whens`, with a single increment per touched bucket."""
+    counts = {}
+    for when in whens:
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(when, granularity))
+            counts[key] = counts.get(key, 0) + 1
+    _write_buckets(db, event, counts)
+
+
+def _write_buckets(db, event, counts):
+    """Applies {(granularity, bucket): count} increments, then bumps the rollup version."""
+    if event not in ROLLUP_SOURCES:
+        raise ValueError(f"Unsupported rollup event '{event}'. Must be one of {list(ROLLUP_SOURCES)}.")
+    if not counts:
+        return
+    rollups = db[ROLLUP_COLLECTION]
+    if is_time_series(db):
+        # Time-series collections are append-only: store the deltas, activity_trend() sums them
+        rollups.insert_many([
+            {"granularity": granularity, "bucket": bucket, event: count}
+            for (granularity, bucket), count in counts.items()
+        ])
+    else:
+        rollups.bulk_write([
+            UpdateOne({"granularity": granularity, "bucket": bucket}, {"$inc": {event: count}}, upsert=True)
+            for (granularity, bucket), count in counts.items()
+        ], ordered=False)
+    # After the write, never before: see bump_collection_version()
+    bump_collection_version(db, ROLLUP_COLLECTION)
+
+
+def month_range(start=None, end=None):
+    """Widens [start, end) to whole months, so a rebuild never leaves a month partially counted."""
+    if start is not None:
+        start = bucket_start(start, "month")
+    if end is not None:
+        month = bucket_start(end, "month")
+        naive_end = end.astimezone(UTC).replace(tzinfo=None) if end.tzinfo is not None else end
+        if month != naive_end:
+            month = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+        end = month
+    return start, end
+
+
+def rebuild_rollups(db, start=None, end=None):
+    """
+    Batch job: recomputes every bucket of the whole months covering [start, end)
+    from the raw collections (everything when no range is given). Buckets in
+    that range are cleared first, so months that lost all their events don't
+    keep stale counts; grouping and the $merge then run on the server.
+    """
+    if is_time_series(db):
+        raise ValueError("$merge cannot write into a time-series rollup store; use record_activity() instead.")
+    start, end = month_range(start, end)
+    bucket_range = {}
+    if start is not None:
+        bucket_range["$gte"] = start
+    if end is not None:
+        bucket_range["$lt"] = end
+    cleared = db[ROLLUP_COLLECTION].delete_many({"bucket": bucket_range} if bucket_range else {})
+
+    for event, source in ROLLUP_SOURCES.items():
+        date_field = source["dateField"]
+        match = dict(source["match"])
+        match[date_field] = {"$exists": True, **bucket_range}
+
+        for granularity in GRANULARITIES:
+            pipeline = [
+                {"$match": match},
+                {"$group": {
+                    "_id": {"$dateTrunc": {"date": f"${date_field}", "unit": granularity}},
+                    event: {"$sum": 1},
+                }},
+                {"$project": {"_id": 0, "granularity": granularity, "bucket": "$_id", event: 1}},
+                {"$merge": {
+                    "into": ROLLUP_COLLECTION,
+                    "on": ["granularity", "bucket"],
+                    "whenMatched": [{"$set": {event: f"$$new.{event}"}}],
+                    "whenNotMatched": "insert",
+                }},
+            ]
+            db[source["collection"]].aggregate(pipeline, allowDiskUse=True)
+    bump_collection_version(db, ROLLUP_COLLECTION)
+    print(f"  [ROLLUP] Cleared {cleared.deleted_count} bucket(s), rebuilt {', '.join(ROLLUP_SOURCES)} buckets.")
+
+
+def activity_trend(db, start, end, granularity="month"):
+    """
+    Returns one row per bucket in [start, end) with the period label and the
+    enrollment, completion and submission counts, reading only rollup rows.
+    """
+    query = {"granularity": granularity, "bucket": {"$gte": bucket_start(start, granularity), "$lt": end}}
+    if is_time_series(db):
+        rows = db[ROLLUP_COLLECTION].aggregate([
+            {"$match": query},
+            {"$group": {"_id": "$bucket", **{event: {"$sum": f"${event}"} for event in ROLLUP_SOURCES}}},
+            {"$project": {"_id": 0, "bucket": "$_id", **{event: 1 for event in ROLLUP_SOURCES}}},
+            {"$sort": {"bucket": 1}},
+        ])
+    else:
+        rows = db[ROLLUP_COLLECTION].find(query, {"_id": 0}).sort("bucket", ASCENDING)
+
+    period_format = PERIOD_FORMATS[granularity]
+    return [
+        {"period": row["bucket"].strftime(period_format), **{event: row.get(event, 0) for event in ROLLUP_SOURCES}}
+        for row in rows
+    ]
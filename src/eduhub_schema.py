@@ -0,0 +1,502 @@
+# ---Client-side $jsonSchema Validation---
+# Compiles the same $jsonSchema documents the server enforces into generated
+# Python functions, so an invalid document is rejected before any network I/O
+# and the client can never accept something the server would refuse.
+# The compiler fails loudly on keywords it doesn't implement instead of
+# silently checking less than the server does.
+import json
+import re
+import time
+from collections.abc import Mapping
+from datetime import datetime
+
+from bson.binary import Binary
+from bson.decimal128 import Decimal128
+from bson.int64 import Int64
+from bson.objectid import ObjectId
+from bson.regex import Regex
+from bson.timestamp import Timestamp
+
+INT32_MIN = -(1 << 31)
+INT32_MAX = (1 << 31) - 1
+
+# bsonType -> check on the variable `v`, mirroring how PyMongo encodes values
+# (a plain int is sent as an int32 when it fits and as an int64 otherwise; bool is never a number)
+BSON_TYPE_CHECKS = {
+    "string": "isinstance(v, str)",
+    "bool": "(v is True or v is False)",
+    "int": f"(type(v) is int and {INT32_MIN} <= v <= {INT32_MAX})",
+    "long": f"(type(v) is Int64 or (type(v) is int and not {INT32_MIN} <= v <= {INT32_MAX}))",
+    "double": "type(v) is float",
+    "decimal": "type(v) is Decimal128",
+    "number": "type(v) in NUMBER_TYPES",
+    "date": "isinstance(v, datetime)",
+    "objectId": "isinstance(v, ObjectId)",
+    "object": "isinstance(v, Mapping)",
+    "array": "isinstance(v, (list, tuple))",
+    "null": "v is None",
+    "binData": "isinstance(v, (bytes, Binary))",
+    "regex": "isinstance(v, (re.Pattern, Regex))",
+    "timestamp": "isinstance(v, Timestamp)",
+}
+
+# JSON Schema `type` names and the bsonType each one corresponds to
+JSON_TYPES = {
+    "string": "string",
+    "number": "number",
+    "boolean": "bool",
+    "object": "object",
+    "array": "array",
+    "null": "null",
+}
+
+SUPPORTED_KEYWORDS = {
+    "bsonType", "type", "required", "properties", "additionalProperties", "enum", "pattern",
+    "minimum", "maximum", "exclusiveMinimum", "exclusiveMaximum", "minLength", "maxLength",
+    "items", "minItems", "maxItems",
+    # Documentation only
+    "description", "title",
+}
+OBJECT_KEYWORDS = {"required", "properties", "additionalProperties"}
+
+_MISSING = object()
+
+
+class _Unordered:
+    """Stands in for a decimal NaN: it is neither below nor above any bound, like a double NaN."""
+    def __lt__(self, other):
+        return False
+    __le__ = __gt__ = __ge__ = __lt__
+
+
+_UNORDERED = _Unordered()
+
+
+def _decimal_value(value):
+    """A Decimal128 as a Decimal the bounds can be compared with."""
+    number = value.to_decimal()
+    return _UNORDERED if number.is_nan() else number
+
+
+_NAMESPACE = {
+    "re": re,
+    "Mapping": Mapping,
+    "datetime": datetime,
+    "Binary": Binary,
+    "Decimal128": Decimal128,
+    "Int64": Int64,
+    "ObjectId": ObjectId,
+    "Regex": Regex,
+    "Timestamp": Timestamp,
+    "MISSING": _MISSING,
+    "NUMBER_TYPES": frozenset({int, float, Int64, Decimal128}),
+    "COMPARABLE_TYPES": frozenset({int, float, Int64}),
+    "DECIMAL": _decimal_value,
+}
+
+
+class SchemaValidationError(Exception):
+    """Raised when a document fails a compiled validator; args[0] maps field path -> message."""
+    pass
+
+
+def _fstring(template):
+    """Returns the source of an f-string literal; templates never contain double quotes."""
+    return f'f"{template}"'
+
+
+class _Compiler:
+    """Generates the source of one validation function from a $jsonSchema document."""
+
+    def __init__(self):
+        self.lines = []
+        self.constants = {}
+        self.variables = 0
+
+    def constant(self, value):
+        """Stores a value in the generated function's namespace and returns its name."""
+        name = f"_c{len(self.constants)}"
+        self.constants[name] = value
+        return name
+
+    def variable(self):
+        self.variables += 1
+        return f"v{self.variables}"
+
+    def emit(self, indent, line):
+        self.lines.append("    " * indent + line)
+
+    def block(self, indent, emit_body):
+        """Emits a nested block, padding it with `pass` if it ended up empty."""
+        start = len(self.lines)
+        emit_body()
+        if len(self.lines) == start:
+            self.emit(indent, "pass")
+
+    def value(self, schema, var, path, indent):
+        """
+        Emits the checks for the value held in `var`. `path` is a Python expression
+        for the value's dotted path, only evaluated when an error is recorded.
+        At most one error is recorded per path, like the hand-written validators.
+        """
+        unsupported = set(schema) - SUPPORTED_KEYWORDS
+        if unsupported:
+            raise ValueError(f"Unsupported $jsonSchema keyword(s) {sorted(unsupported)}.")
+
+        types = self.types(schema)
+        failures = []
+        if types:
+            check = " or ".join(BSON_TYPE_CHECKS[name] for name in types)
+            failures.append((f"not ({check})",
+                             f"'{{{path}}}' must be of type {'/'.join(types)}, not '{{type(v).__name__}}'."))
+        if "enum" in schema:
+            allowed = self.constant(list(schema["enum"]))
+            failures.append((f"v not in {allowed}",
+                             f"'{{v}}' is not a supported value for '{{{path}}}'. Must be one of {{{allowed}}}."))
+        failures.extend(self.string_checks(schema, types, path))
+        failures.extend(self.number_checks(schema, path))
+        failures.extend(self.array_size_checks(schema, types, path))
+
+        if failures:
+            self.emit(indent, f"v = {var}")
+            for position, (condition, message) in enumerate(failures):
+                self.emit(indent, f"{'if' if position == 0 else 'elif'} {condition}:")
+                self.emit(indent + 1, f"errors[{path}] = {_fstring(message)}")
+
+        if OBJECT_KEYWORDS & set(schema):
+            self.emit(indent, f"if isinstance({var}, Mapping):")
+            self.block(indent + 1, lambda: self.fields(schema, var, path, indent + 1))
+        if "items" in schema:
+            if not isinstance(schema["items"], Mapping):
+                raise ValueError("Unsupported $jsonSchema 'items' form: only a single schema for every item is supported.")
+            index = self.variable()
+            item = self.variable()
+            self.emit(indent, f"if isinstance({var}, (list, tuple)):")
+            self.emit(indent + 1, f"for {index}, {item} in enumerate({var}):")
+            self.block(indent + 2, lambda: self.value(schema["items"], item, f"{path} + '.' + str({index})", indent + 2))
+
+    def types(self, schema):
+        """Returns the bsonType names a schema allows, from either bsonType or type."""
+        types = []
+        for keyword, names in (("bsonType", {name: name for name in BSON_TYPE_CHECKS}), ("type", JSON_TYPES)):
+            if keyword not in schema:
+                continue
+            values = schema[keyword] if isinstance(schema[keyword], list) else [schema[keyword]]
+            for value in values:
+                if value not in names:
+                    raise ValueError(f"Unsupported {keyword} '{value}'.")
+                types.append(names[value])
+        return types
+
+    def string_checks(self, schema, types, path):
+        # pattern/minLength/maxLength only apply to strings, as on the server
+        prefix = "" if types == ["string"] else "isinstance(v, str) and "
+        if "pattern" in schema:
+            # The server's PCRE engine treats \w, \d and \s as ASCII-only
+            pattern = self.constant(re.compile(schema["pattern"], re.ASCII))
+            yield f"{prefix}not {pattern}.search(v)", f"'{{v}}' is not a valid format for '{{{path}}}'."
+        if "minLength" in schema:
+            length = int(schema["minLength"])
+            yield f"{prefix}len(v) < {length}", f"'{{{path}}}' must be at least {length} character(s) long."
+        if "maxLength" in schema:
+            length = int(schema["maxLength"])
+            yield f"{prefix}len(v) > {length}", f"'{{{path}}}' must be at most {length} character(s) long."
+
+    def number_checks(self, schema, path):
+        # Decimal128 doesn't support comparisons itself, so it is compared as a Decimal
+        def condition(operator, bound):
+            return (f"(type(v) in COMPARABLE_TYPES and v {operator} {bound}"
+                    f" or type(v) is Decimal128 and DECIMAL(v) {operator} {bound})")
+
+        def bound_constant(value):
+            return self.constant(value.to_decimal() if isinstance(value, Decimal128) else value)
+
+        if "minimum" in schema:
+            bound = bound_constant(schema["minimum"])
+            operator, word = ("<=", "greater than") if schema.get("exclusiveMinimum") else ("<", "at least")
+            yield condition(operator, bound), f"'{{{path}}}' must be {word} {{{bound}}}."
+        if "maximum" in schema:
+            bound = bound_constant(schema["maximum"])
+            operator, word = (">=", "less than") if schema.get("exclusiveMaximum") else (">", "at most")
+            yield condition(operator, bound), f"'{{{path}}}' must be {word} {{{bound}}}."
+
+    def array_size_checks(self, schema, types, path):
+        prefix = "" if types == ["array"] else "isinstance(v, (list, tuple)) and "
+        if "minItems" in schema:
+            size = int(schema["minItems"])
+            yield f"{prefix}len(v) < {size}", f"'{{{path}}}' must have at least {size} item(s)."
+        if "maxItems" in schema:
+            size = int(schema["maxItems"])
+            yield f"{prefix}len(v) > {size}", f"'{{{path}}}' must have at most {size} item(s)."
+
+    def fields(self, schema, var, path, indent):
+        """Emits required, properties and additionalProperties checks for an object."""
+        # Field names are namespace constants, never spliced into the source, so any name is safe
+        names = {}
+
+        def name_constant(name):
+            if name not in names:
+                names[name] = self.constant(name)
+            return names[name]
+
+        def child_path(name):
+            return name_constant(name) if path is None else f"{path} + '.' + {name_constant(name)}"
+
+        for name in schema.get("required", []):
+            self.emit(indent, f"if {name_constant(name)} not in {var}:")
+            self.emit(indent + 1, f"errors[{child_path(name)}] = {_fstring(f'{{{child_path(name)}!r}} is a required field.')}")
+        properties = schema.get("properties", {})
+        for name, field_schema in properties.items():
+            child = self.variable()
+            self.emit(indent, f"{child} = {var}.get({name_constant(name)}, MISSING)")
+            self.emit(indent, f"if {child} is not MISSING:")
+            self.block(indent + 1, lambda: self.value(field_schema, child, child_path(name), indent + 1))
+
+        additional = schema.get("additionalProperties", True)
+        if additional is True:
+            return
+        known = self.constant(frozenset(properties))
+        key = self.variable()
+        key_path = key if path is None else f"{path} + '.' + {key}"
+        self.emit(indent, f"for {key} in {var}:")
+        self.emit(indent + 1, f"if {key} not in {known}:")
+        if additional is False:
+            self.emit(indent + 2, f"errors[{key_path}] = {_fstring(f'{{{key_path}!r}} is not an allowed field.')}")
+        else:
+            self.value(additional, f"{var}[{key}]", key_path, indent + 2)
+
+
+def compile_validator(validator, name="validate_document"):
+    """
+    Compiles a collection validator ({"$jsonSchema": {...}} or the bare schema)
+    into a function that takes a document and returns {field path: message},
+    empty when the document is valid. The generated source is kept on `.source`.
+    """
+    schema = validator.get("$jsonSchema", validator)
+    if set(validator) - {"$jsonSchema"} and "$jsonSchema" in validator:
+        raise ValueError("Only pure $jsonSchema validators can be compiled; query operators are not supported.")
+    top_level = set(schema) - OBJECT_KEYWORDS - {"bsonType", "type", "description", "title"}
+    if top_level or schema.get("bsonType", "object") != "object" or schema.get("type", "object") != "object":
+        raise ValueError("A collection validator's top level must describe an object.")
+
+    compiler = _Compiler()
+    compiler.emit(1, "errors = {}")
+    compiler.emit(1, "if not isinstance(document, Mapping):")
+    compiler.emit(2, "return {'': f\"Document must be an object, not '{type(document).__name__}'.\"}")
+    compiler.fields(schema, "document", None, 1)
+    compiler.emit(1, "return errors")
+    # The function is renamed afterwards, so names that aren't identifiers (collection names) work too
+    source = "def validate(document):\n" + "\n".join(compiler.lines) + "\n"
+
+    namespace = {**_NAMESPACE, **compiler.constants}
+    exec(compile(source, f"<{name}>", "exec"), namespace)
+    function = namespace["validate"]
+    function.__name__ = function.__qualname__ = name
+    function.source = source
+    function.schema = schema
+    return function
+
+
+# bsonType -> the exact Python types that always pass it, for the column-wise pre-check.
+# Types left out here ("int", "long", "date", ...) are only ever flagged as suspect rows,
+# which the compiled validator then checks one by one.
+FRAME_TYPES = {
+    "string": (str,),
+    "bool": (bool,),
+    "double": (float,),
+    "decimal": (Decimal128,),
+    "number": (int, float, Int64, Decimal128),
+    "objectId": (ObjectId,),
+}
+FRAME_KEYWORDS = {"bsonType", "type", "enum", "pattern", "minimum", "maximum", "exclusiveMinimum",
+                  "exclusiveMaximum", "minLength", "maxLength", "description", "title"}
+
+
+class _ColumnTypes:
+    """Answers "is this value's exact type one of ..." for a pandas column, from its dtype when it has one."""
+
+    def __init__(self, column):
+        import pandas as pd
+
+        self.index = column.index
+        self.single = None
+        self.types = None
+        for is_dtype, python_type in ((pd.api.types.is_bool_dtype, bool), (pd.api.types.is_integer_dtype, int),
+                                      (pd.api.types.is_float_dtype, float), (pd.api.types.is_string_dtype, str)):
+            if column.dtype != object and is_dtype(column.dtype):
+                self.single = python_type
+                break
+        else:
+            self.types = column.map(type)
+
+    def isin(self, python_types):
+        import pandas as pd
+
+        if self.types is None:
+            return pd.Series(self.single in python_types, index=self.index)
+        return self.types.isin(python_types)
+
+
+def _bool_series(values, index):
+    import pandas as pd
+
+    return pd.Series(values, index=index, dtype=bool)
+
+
+def _pattern_matches(pattern, text):
+    """re.search(pattern, value, re.ASCII) over a column of strings, as a boolean Series."""
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        # RE2's \w, \d and \s are ASCII-only, like the server's PCRE engine
+        matches = pc.match_substring_regex(pa.array(text.to_numpy(), type=pa.string()), pattern)
+        return _bool_series(matches.to_numpy(zero_copy_only=False), text.index)
+    except (ImportError, ValueError):
+        # No pyarrow, or a pattern RE2 can't run (lookarounds, backreferences)
+        compiled = re.compile(pattern, re.ASCII)
+        return _bool_series([compiled.search(value) is not None for value in text], text.index)
+
+
+def _field_suspects(schema, column, present):
+    """Rows of one column whose (non-null) value might fail `schema`."""
+    import pandas as pd
+
+    if set(schema) - FRAME_KEYWORDS:
+        # Nested objects, arrays and the like are left to the compiled validator
+        return present
+    types = _Compiler().types(schema)
+    value_types = _ColumnTypes(column)
+    suspect = pd.Series(False, index=column.index)
+    if types:
+        allowed = set()
+        for name in types:
+            if name not in FRAME_TYPES:
+                return present
+            allowed.update(FRAME_TYPES[name])
+        suspect |= ~value_types.isin(allowed)
+    if "enum" in schema:
+        enum = list(schema["enum"])
+        hashable = value_types.isin({str, int, float, bool, Int64, ObjectId})
+        suspect |= ~hashable | ~column.where(hashable).isin(enum)
+
+    strings = present & value_types.isin({str})
+    if strings.any() and {"pattern", "minLength", "maxLength"} & set(schema):
+        text = column[strings].astype(str)
+        if "pattern" in schema:
+            suspect |= (~_pattern_matches(schema["pattern"], text)).reindex(column.index, fill_value=False)
+        lengths = text.str.len()
+        if "minLength" in schema:
+            suspect |= (lengths < int(schema["minLength"])).reindex(column.index, fill_value=False)
+        if "maxLength" in schema:
+            suspect |= (lengths > int(schema["maxLength"])).reindex(column.index, fill_value=False)
+
+    if "minimum" in schema or "maximum" in schema:
+        # Decimal128 bounds are exact on the client, so those rows are compared one by one
+        suspect |= value_types.isin({Decimal128})
+        comparable = present & value_types.isin({int, float, Int64})
+        numbers = pd.to_numeric(column[comparable], errors="coerce")
+        in_range = pd.Series(True, index=numbers.index)
+        for keyword, exclusive, below in (("minimum", "exclusiveMinimum", True), ("maximum", "exclusiveMaximum", False)):
+            if keyword not in schema:
+                continue
+            bound = schema[keyword]
+            bound = float(bound.to_decimal()) if isinstance(bound, Decimal128) else bound
+            if below:
+                in_range &= numbers.gt(bound) if schema.get(exclusive) else numbers.ge(bound)
+            else:
+                in_range &= numbers.lt(bound) if schema.get(exclusive) else numbers.le(bound)
+        suspect |= (~in_range).reindex(column.index, fill_value=False)
+    return present & suspect
+
+
+def suspect_rows(validator, frame):
+    """
+    Column-wise pre-check of a pandas DataFrame against a collection validator:
+    returns a boolean Series that is False for every row that certainly passes and
+    True for rows that might fail (missing required fields, wrong types, values out
+    of an enum, pattern or range). Null cells count as missing fields. Only the
+    suspect rows need the compiled validator, which reports the exact messages.
+    """
+    import pandas as pd
+
+    schema = validator.get("$jsonSchema", validator)
+    suspect = pd.Series(False, index=frame.index)
+    for name in schema.get("required", []):
+        suspect |= frame[name].isna() if name in frame else True
+    properties = schema.get("properties", {})
+    for name, field_schema in properties.items():
+        if name in frame:
+            column = frame[name]
+            suspect |= _field_suspects(field_schema, column, column.notna())
+    if schema.get("additionalProperties", True) is not True:
+        for name in frame.columns:
+            if name not in properties:
+                suspect |= frame[name].notna()
+    return suspect
+
+
+def _shell_to_json(text):
+    """Converts a mongo shell object literal (bare keys, single quotes) into JSON."""
+    tokens = re.findall(r"""'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|[$\w]+(?=\s*:)|[^'"$\w]+|[$\w.+-]+""", text)
+    converted = []
+    for token in tokens:
+        if token.startswith("'"):
+            converted.append(json.dumps(token[1:-1].replace("\\'", "'")))
+        elif re.fullmatch(r"[$A-Za-z_]\w*", token) and token not in ("true", "false", "null"):
+            converted.append(json.dumps(token))
+        else:
+            converted.append(token)
+    return re.sub(r",(\s*[}\]])", r"\1", "".join(converted))
+
+
+def load_validator_file(path):
+    """Loads a validator saved as JSON or as a mongo shell literal (like data/schema_validation.json)."""
+    with open(path, encoding="utf-8") as handle:
+        text = handle.read()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(_shell_to_json(text))
+
+
+def compile_collection_validators(db):
+    """Compiles the $jsonSchema validator of every collection in `db` that has one."""
+    validators = {}
+    for info in db.list_collections(filter={"options.validator.$jsonSchema": {"$exists": True}}):
+        validators[info["name"]] = compile_validator(info["options"]["validator"], f"validate_{info['name']}")
+    return validators
+
+
+def check_document(validate, document):
+    """Raises SchemaValidationError if `document` fails a compiled validator."""
+    errors = validate(document)
+    if errors:
+        raise SchemaValidationError(errors)
+
+
+def benchmark_validator(validate, documents, repeat=5):
+    """
+    Times a validator over `documents` and returns
+    {"documents", "invalid", "seconds", "validationsPerSecond"} using the fastest of `repeat` passes.
+    """
+    documents = list(documents)
+    best = float("inf")
+    invalid = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        invalid = sum(1 for document in documents if validate(document))
+        best = min(best, time.perf_counter() - started)
+    return {
+        "documents": len(documents),
+        "invalid": invalid,
+        "seconds": best,
+        "validationsPerSecond": len(documents) / best if best else None,
+    }
+
+
+def print_validator_benchmark(label, result):
+    """Prints one benchmark_validator() result."""
+    rate = result["validationsPerSecond"]
+    rate = f"{rate:,.0f} validations/sec" if rate else "too fast to measure"
+    print(f"  [VALIDATE] {label}: {result['documents']} document(s), {result['invalid']} invalid, {rate}.")
@@ -0,0 +1,338 @@
+# ---Shard-key Analysis and Chunk Distribution Simulation---
+# Samples a collection and, for each candidate shard key, estimates what the
+# key would do once the collection is sharded:
+#   cardinality  - distinct key values; few values mean few (and jumbo) chunks
+#   frequency    - share of documents holding the most common value
+#   monotonicity - how often the key grows with insertion order (_id); a monotonic
+#                  ranged key sends every new document to the last chunk
+#   distribution - the sample is split into chunks and spread over N shards,
+#                  giving each shard's share of documents and of recent inserts
+#   targeting    - which workload queries reach one shard, a key range, or every shard
+# Hashed keys are simulated with a 64-bit MD5 hash of the BSON value, as the server does.
+import hashlib
+import itertools
+from bisect import bisect_right
+from collections import Counter
+from datetime import datetime, UTC
+
+import bson
+from bson.objectid import ObjectId
+
+DEFAULT_SAMPLE_SIZE = 10000
+DEFAULT_SHARDS = 4
+DEFAULT_CHUNKS_PER_SHARD = 8
+# The newest share of the sample (by _id) treated as "recent inserts"
+RECENT_INSERT_FRACTION = 0.1
+# Fewer recent inserts than this can't show a hotspot
+MIN_RECENT_INSERTS = 20
+MONOTONIC_THRESHOLD = 0.8
+MIN_TARGETED_FRACTION = 0.5
+
+# Candidate keys per collection: name -> shard key document
+SHARD_KEY_CANDIDATES = {
+    "enrollments": {
+        "hashed studentId": {"studentId": "hashed"},
+        "courseId + studentId": {"courseId": 1, "studentId": 1},
+        "enrollmentDate": {"enrollmentDate": 1},
+    },
+    "submissions": {
+        "hashed studentId": {"studentId": "hashed"},
+        "assignmentId + studentId": {"assignmentId": 1, "studentId": 1},
+        "submittedAt": {"submittedAt": 1},
+    },
+}
+
+_RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte"}
+
+
+def _hash64(value):
+    """The 64-bit hash a hashed shard key stores for a value (first 8 bytes of MD5, little-endian)."""
+    digest = hashlib.md5(bson.encode({"": value})).digest()
+    return int.from_bytes(digest[:8], "little", signed=True)
+
+
+def _order_key(value):
+    """Orders values across BSON types the way shard key ranges do (null < numbers < strings < ... < dates)."""
+    if value is None:
+        return (0,)
+    if isinstance(value, bool):
+        return (4, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, ObjectId):
+        return (3, value.binary)
+    if isinstance(value, datetime):
+        return (5, value if value.tzinfo else value.replace(tzinfo=UTC))
+    return (6, repr(value))
+
+
+def _get_path(document, path):
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _shard_key_value(document, shard_key):
+    """The (orderable) shard key of a document; missing fields count as null."""
+    return tuple(
+        _order_key(_hash64(_get_path(document, field)) if kind == "hashed" else _get_path(document, field))
+        for field, kind in shard_key.items()
+    )
+
+
+def sample_documents(collection, shard_key_fields, sample_size=DEFAULT_SAMPLE_SIZE):
+    """$samples up to `sample_size` documents, projected to _id and the shard key fields."""
+    projection = {field: 1 for field in shard_key_fields}
+    projection["_id"] = 1
+    return list(collection.aggregate(
+        [{"$sample": {"size": sample_size}}, {"$project": projection}], allowDiskUse=True
+    ))
+
+
+def _split_chunks(keys, max_chunk_docs):
+    """
+    Splits the sorted keys into chunks of about `max_chunk_docs`. A chunk can only be split
+    between distinct values, so a value more frequent than that becomes a jumbo chunk.
+    Returns [(lower bound, document count)].
+    """
+    chunks = []
+    for value, group in itertools.groupby(sorted(keys)):
+        count = sum(1 for _ in group)
+        if chunks and chunks[-1][1] + count <= max_chunk_docs:
+            chunks[-1][1] += count
+        else:
+            chunks.append([value, count])
+    return [tuple(chunk) for chunk in chunks]
+
+
+def _classify_condition(condition):
+    """'eq', 'in', 'range' or None for one field's condition in a filter."""
+    if isinstance(condition, dict) and condition and all(name.startswith("$") for name in condition):
+        if "$eq" in condition:
+            return "eq"
+        if "$in" in condition:
+            return "eq" if len(condition["$in"]) == 1 else "in"
+        if _RANGE_OPERATORS & set(condition):
+            return "range"
+        return None
+    return "eq"
+
+
+def _field_conditions(query):
+    """Field -> condition class for a filter, folding in $and clauses."""
+    conditions = {}
+    for field, condition in query.items():
+        if field == "$and":
+            for clause in condition:
+                conditions.update(_field_conditions(clause))
+        elif not field.startswith("$"):
+            conditions[field] = _classify_condition(condition)
+    return conditions
+
+
+def query_targeting(query, shard_key):
+    """
+    How a mongos would route `query` for a shard key: "single" (one shard), "targeted"
+    (the shards owning a key range or a few key values) or "scatter" (every shard).
+    """
+    if "$or" in query:
+        # The fields beside $or may route on their own; otherwise every branch must be routable
+        rest = {field: condition for field, condition in query.items() if field != "$or"}
+        routed = query_targeting(rest, shard_key) if rest else "scatter"
+        if routed != "scatter":
+            return routed
+        branches = [query_targeting(clause, shard_key) for clause in query["$or"]]
+        return "scatter" if "scatter" in branches else "targeted"
+
+    conditions = _field_conditions(query)
+    fields = list(shard_key)
+    if shard_key[fields[0]] == "hashed":
+        # Only equality survives hashing; ranges over a hashed key touch every chunk
+        return {"eq": "single", "in": "targeted"}.get(conditions.get(fields[0]), "scatter")
+    prefix = []
+    for field in fields:
+        if conditions.get(field) != "eq":
+            break
+        prefix.append(field)
+    if len(prefix) == len(fields):
+        return "single"
+    if prefix or conditions.get(fields[0]) in ("in", "range"):
+        return "targeted"
+    return "scatter"
+
+
+def _leading_match(pipeline):
+    """The filter formed by a pipeline's leading $match stages ({} if it has none)."""
+    clauses = []
+    for stage in pipeline:
+        if "$match" not in stage:
+            break
+        clauses.append(stage["$match"])
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def workload_from_reports(reports, collection_name):
+    """
+    Turns a report pack ({name: {"collection", "filter" or "pipeline"}}) into workload
+    queries against `collection_name`: the reports reading it directly, plus the
+    per-document equality probes of $lookup stages that join into it.
+    """
+    workload = []
+    for name, spec in reports.items():
+        if spec["collection"] == collection_name:
+            query = spec["filter"] if "filter" in spec else _leading_match(spec["pipeline"])
+            workload.append({"name": name, "filter": query})
+        for stage in spec.get("pipeline", []):
+            lookup = stage.get("$lookup", {})
+            if lookup.get("from") == collection_name and "foreignField" in lookup:
+                workload.append({"name": f"{name} ($lookup)", "filter": {lookup["foreignField"]: None}})
+    return workload
+
+
+def analyze_shard_key(documents, shard_key, workload=(), shards=DEFAULT_SHARDS,
+                      chunks_per_shard=DEFAULT_CHUNKS_PER_SHARD):
+    """
+    Simulates one shard key over sampled documents and returns its metrics:
+    {"key", "cardinality", "maxFrequency", "missingKey", "monotonicity", "chunks", "jumboChunks",
+     "shardShares", "imbalance", "insertHotspot", "targeting", "blockers", "warnings"}.
+    `blockers` (a monotonic insert hotspot, no targeted queries) are also listed in `warnings`.
+    `workload` is a list of {"name", "filter", optional "weight"}.
+    """
+    hashed = any(kind == "hashed" for kind in shard_key.values())
+    ordered = sorted(documents, key=lambda document: _order_key(document.get("_id")))
+    keys = [_shard_key_value(document, shard_key) for document in ordered]
+    sample_size = len(keys)
+    if not sample_size:
+        raise ValueError("Cannot analyze a shard key over an empty sample.")
+
+    # Cardinality, frequency and missing values (a hashed key's frequency is that of its source value)
+    counts = Counter(keys)
+    missing = sum(all(_get_path(document, field) is None for field in shard_key) for document in ordered)
+
+    # Monotonicity: +1 if the key always grows with _id, -1 if it always shrinks, ~0 if unrelated
+    steps = [(later > earlier) - (later < earlier) for earlier, later in zip(keys, keys[1:])]
+    changes = sum(1 for step in steps if step)
+    monotonicity = sum(steps) / changes if changes else 0.0
+
+    # Chunks and their shards: the balancer evens out chunk counts, here as contiguous ranges per shard
+    max_chunk_docs = max(1, -(-sample_size // (shards * chunks_per_shard)))
+    chunks = _split_chunks(keys, max_chunk_docs)
+    chunk_shard = [position * shards // len(chunks) for position in range(len(chunks))]
+    shard_docs = [0] * shards
+    for (_, count), shard in zip(chunks, chunk_shard):
+        shard_docs[shard] += count
+    shard_shares = [count / sample_size for count in shard_docs]
+
+    # Where the newest documents (the current insert stream) land
+    lower_bounds = [lower for lower, _ in chunks]
+    recent = keys[-max(1, int(sample_size * RECENT_INSERT_FRACTION)):]
+    recent_shards = Counter(chunk_shard[max(0, bisect_right(lower_bounds, key) - 1)] for key in recent)
+    insert_hotspot = max(recent_shards.values()) / len(recent)
+
+    # Query routing, weighted by how often each query runs
+    routes = {name: 0.0 for name in ("single", "targeted", "scatter")}
+    by_query = {}
+    for query in workload:
+        route = query_targeting(query["filter"], shard_key)
+        by_query[query["name"]] = route
+        routes[route] += query.get("weight", 1)
+    total_weight = sum(routes.values())
+    targeted_fraction = (routes["single"] + routes["targeted"]) / total_weight if total_weight else None
+
+    jumbo = sum(1 for _, count in chunks if count > max_chunk_docs)
+    warnings = []
+    if len(counts) < shards * chunks_per_shard:
+        warnings.append(f"low cardinality: {len(counts)} distinct value(s) in the sample")
+    if jumbo:
+        warnings.append(f"{jumbo} jumbo chunk(s) from values too frequent to split")
+    # Blockers can't be fixed by adding shards or splitting chunks, so they outrank any other warning
+    blockers = []
+    if not hashed and monotonicity > MONOTONIC_THRESHOLD:
+        blockers.append("monotonically increasing: new documents all go to the last chunk")
+    if len(recent) >= MIN_RECENT_INSERTS and insert_hotspot > 2 / shards:
+        blockers.append(f"insert hotspot: {insert_hotspot:.0%} of recent inserts land on one shard")
+    if targeted_fraction == 0:
+        blockers.append("no targeted queries: every workload query is scatter-gather")
+    elif targeted_fraction is not None and targeted_fraction < MIN_TARGETED_FRACTION:
+        warnings.append(f"mostly scatter-gather: only {targeted_fraction:.0%} of queries are targeted")
+
+    return {
+        "key": dict(shard_key),
+        "cardinality": len(counts),
+        "maxFrequency": max(counts.values()) / sample_size,
+        "missingKey": missing / sample_size,
+        "monotonicity": monotonicity,
+        "chunks": len(chunks),
+        "jumboChunks": jumbo,
+        "shardShares": shard_shares,
+        "imbalance": max(shard_shares) * shards,
+        "insertHotspot": insert_hotspot,
+        "targeting": {**routes, "targetedFraction": targeted_fraction, "queries": by_query},
+        "blockers": blockers,
+        "warnings": blockers + warnings,
+    }
+
+
+def analyze_shard_keys(db, collection_name, candidates=None, workload=(), sample_size=DEFAULT_SAMPLE_SIZE,
+                       shards=DEFAULT_SHARDS, chunks_per_shard=DEFAULT_CHUNKS_PER_SHARD):
+    """
+    Samples a collection once and analyzes every candidate shard key ({name: key document},
+    SHARD_KEY_CANDIDATES by default). Returns {"collection", "documents", "sampleSize", "shards",
+    "candidates": {name: analyze_shard_key() result}, "recommended"}; the recommended key is
+    the one with the fewest blockers, then the fewest warnings, then the most targeted queries,
+    then the best balance.
+    """
+    candidates = candidates or SHARD_KEY_CANDIDATES[collection_name]
+    collection = db[collection_name]
+    fields = {field for key in candidates.values() for field in key}
+    documents = sample_documents(collection, fields, sample_size)
+    reports = {
+        name: analyze_shard_key(documents, key, workload, shards, chunks_per_shard)
+        for name, key in candidates.items()
+    } if documents else {}
+    recommended = min(reports, default=None, key=lambda name: (
+        len(reports[name]["blockers"]),
+        len(reports[name]["warnings"]),
+        -(reports[name]["targeting"]["targetedFraction"] or 0),
+        reports[name]["imbalance"],
+    ))
+    return {
+        "collection": collection_name,
+        "documents": collection.estimated_document_count(),
+        "sampleSize": len(documents),
+        "shards": shards,
+        "candidates": reports,
+        "recommended": recommended,
+        "warnings": [] if len(documents) >= shards * chunks_per_shard * MIN_RECENT_INSERTS // 2 else [
+            f"only {len(documents)} document(s) sampled; chunk and insert estimates are rough"
+        ],
+    }
+
+
+def print_shard_key_report(result):
+    """Prints one block per candidate key and the recommendation."""
+    print(f"  [SHARD] {result['collection']}: {result['sampleSize']} of {result['documents']} document(s) sampled, "
+          f"{result['shards']} simulated shards")
+    for name, report in result["candidates"].items():
+        targeting = report["targeting"]
+        targeted = "n/a" if targeting["targetedFraction"] is None else f"{targeting['targetedFraction']:.0%}"
+        shares = "/".join(f"{share:.0%}" for share in report["shardShares"])
+        print(f"   - {name} {report['key']}: {report['cardinality']} distinct, top value {report['maxFrequency']:.0%}, "
+              f"monotonicity {report['monotonicity']:+.2f}")
+        print(f"     {report['chunks']} chunk(s) ({report['jumboChunks']} jumbo), shard shares {shares}, "
+              f"recent inserts {report['insertHotspot']:.0%} on the busiest shard")
+        print(f"     queries: {targeting['single']:g} single-shard, {targeting['targeted']:g} targeted, "
+              f"{targeting['scatter']:g} scatter-gather ({targeted} targeted)")
+        for warning in report["warnings"]:
+            print(f"     {'!!' if warning in report['blockers'] else '!'} {warning}")
+    for warning in result["warnings"]:
+        print(f"  [SHARD] ! {warning}")
+    if result["recommended"]:
+        print(f"  [SHARD] Recommended shard key for {result['collection']}: {result['recommended']}")
@@ -0,0 +1,394 @@
+# ---Approximate Analytics Sketches---
+# HyperLogLog sketches for unique-learner counts per course and per instructor.
+# Registers are stored sparsely as {"<index>": rank} subdocuments and updated
+# with $max, so adding a student is one atomic update with no read, and two
+# sketches merge by taking the per-register maximum.
+import hashlib
+import math
+
+from bson.objectid import ObjectId
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+
+from eduhub_versions import bump_collection_version
+
+# 2^12 registers gives a standard error of about 1.04 / sqrt(4096) = 1.6%
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+COURSE_SKETCH_FIELD = "studentSketch"
+INSTRUCTOR_SKETCH_COLLECTION = "instructor_sketches"
+# Course sketches live on the course documents but have their own version key,
+# so adding a student to a sketch doesn't invalidate every cached course report
+COURSE_SKETCH_VERSION = "course_sketches"
+
+
+def _hash64(value):
+    """Returns a stable 64-bit hash of a value's string form."""
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+
+
+def hll_register(value, precision=HLL_PRECISION):
+    """Returns the (register index, rank) pair a value contributes to a sketch."""
+    h = _hash64(value)
+    index = h >> (64 - precision)
+    remaining_bits = 64 - precision
+    remainder = h & ((1 << remaining_bits) - 1)
+    # Rank is the position of the leftmost 1-bit in the remaining bits
+    rank = remaining_bits - remainder.bit_length() + 1
+    return index, rank
+
+
+def hll_merge(*sketches):
+    """Merges sparse register maps by keeping the maximum rank per register."""
+    merged = {}
+    for sketch in sketches:
+        for index, rank in (sketch or {}).items():
+            if rank > merged.get(index, 0):
+                merged[index] = rank
+    return merged
+
+
+def hll_estimate(sketch, precision=HLL_PRECISION):
+    """Estimates the number of distinct values represented by a sparse register map."""
+    m = 1 << precision
+    sketch = sketch or {}
+    alpha = 0.7213 / (1 + 1.079 / m)
+    zeros = m - len(sketch)
+    harmonic_sum = zeros + sum(2.0 ** -rank for rank in sketch.values())
+    estimate = alpha * m * m / harmonic_sum
+    # Small-range correction (linear counting) while many registers are still empty
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)
+    return round(estimate)
+
+
+def _register_update(student_id, field):
+    """Builds the $max update that adds one student to the sketch stored at `field`."""
+    index, rank = hll_register(student_id)
+    return {"$max": {f"{field}.{index}": rank}}
+
+
+def record_enrollment_sketch(db, course_id, student_id):
+    """Adds a student to the course's and its instructor's unique-learner sketches."""
+    course = db.courses.find_one_and_update(
+        {"_id": ObjectId(course_id)},
+        _register_update(student_id, COURSE_SKETCH_FIELD),
+        projection={"instructorId": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if course:
+        bump_collection_version(db, COURSE_SKETCH_VERSION)
+    if course and course.get("instructorId") is not None:
+        db[INSTRUCTOR_SKETCH_COLLECTION].update_one(
+            {"_id": course["instructorId"]},
+            _register_update(student_id, "sketch"),
+            upsert=True,
+        )
+
+
+def record_enrollment_sketches(db, enrollments):
+    """
+    record_enrollment_sketch() for many (course_id, student_id) pairs: registers are
+    max-merged in memory first, then written with one bulk_write per sketch collection.
+    """
+    course_sketches = {}
+    for course_id, student_id in enrollments:
+        index, rank = hll_register(student_id)
+        course_sketches[ObjectId(course_id)] = hll_merge(course_sketches.get(ObjectId(course_id)), {str(index): rank})
+    if not course_sketches:
+        return
+    instructor_by_course = {
+        c["_id"]: c.get("instructorId") for c in db.courses.find({"_id": {"$in": list(course_sketches)}}, {"instructorId": 1})
+    }
+    instructor_sketches = {}
+    for course_id, sketch in course_sketches.items():
+        instructor_id = instructor_by_course.get(course_id)
+        if instructor_id is not None:
+            instructor_sketches[instructor_id] = hll_merge(instructor_sketches.get(instructor_id), sketch)
+
+    course_updates = [
+        UpdateOne({"_id": cid}, {"$max": {f"{COURSE_SKETCH_FIELD}.{index}": rank for index, rank in sketch.items()}})
+        for cid, sketch in course_sketches.items() if cid in instructor_by_course
+    ]
+    if course_updates:
+        db.courses.bulk_write(course_updates, ordered=False)
+        bump_collection_version(db, COURSE_SKETCH_VERSION)
+    if instructor_sketches:
+        db[INSTRUCTOR_SKETCH_COLLECTION].bulk_write([
+            UpdateOne({"_id": iid}, {"$max": {f"sketch.{index}": rank for index, rank in sketch.items()}}, upsert=True)
+            for iid, sketch in instructor_sketches.items()
+        ], ordered=False)
+
+
+def rebuild_student_sketches(db, batch_size=1000):
+    """
+    Rebuilds every course and instructor sketch from the enrollments in a single
+    streaming pass. Memory is bounded by registers per course/instructor, not by students.
+    """
+    instructor_by_course = {c["_id"]: c.get("instructorId") for c in db.courses.find({}, {"instructorId": 1})}
+    course_sketches = {}
+    instructor_sketches = {}
+
+    for enrollment in db.enrollments.find({}, {"studentId": 1, "courseId": 1}, batch_size=batch_size):
+        index, rank = hll_register(enrollment["studentId"])
+        key = str(index)
+        course_sketch = course_sketches.setdefault(enrollment["courseId"], {})
+        course_sketch[key] = max(course_sketch.get(key, 0), rank)
+        instructor_id = instructor_by_course.get(enrollment["courseId"])
+        if instructor_id is not None:
+            instructor_sketch = instructor_sketches.setdefault(instructor_id, {})
+            instructor_sketch[key] = max(instructor_sketch.get(key, 0), rank)
+
+    course_updates = [UpdateOne({"_id": cid}, {"$set": {COURSE_SKETCH_FIELD: s}}) for cid, s in course_sketches.items()]
+    instructor_updates = [UpdateOne({"_id": iid}, {"$set": {"sketch": s}}, upsert=True) for iid, s in instructor_sketches.items()]
+    for i in range(0, len(course_updates), batch_size):
+        db.courses.bulk_write(course_updates[i:i + batch_size], ordered=False)
+    if course_updates:
+        bump_collection_version(db, COURSE_SKETCH_VERSION)
+    for i in range(0, len(instructor_updates), batch_size):
+        db[INSTRUCTOR_SKETCH_COLLECTION].bulk_write(instructor_updates[i:i + batch_size], ordered=False)
+    print(f"  [SKETCH] Rebuilt {len(course_updates)} course and {len(instructor_updates)} instructor sketches.")
+
+
+def unique_students_per_course(db, course_id):
+    """Approximate number of unique students enrolled in a course."""
+    course = db.courses.find_one({"_id": ObjectId(course_id)}, {COURSE_SKETCH_FIELD: 1})
+    return hll_estimate(course.get(COURSE_SKETCH_FIELD) if course else None)
+
+
+# Exact audit: de-duplicate (instructor, student) pairs before counting, instead
+# of $addToSet'ing every student id into one group document per instructor.
+exact_instructor_student_count_pipeline = [
+    {"$lookup": {"from": "courses", "localField": "courseId", "foreignField": "_id", "as": "course"}},
+    {"$unwind": "$course"},
+    {"$group": {"_id": {"instructorId": "$course.instructorId", "studentId": "$studentId"}}},
+    {"$group": {"_id": "$_id.instructorId", "uniqueStudentsTaught": {"$sum": 1}}},
+    {"$project": {"_id": 0, "instructorId": "$_id", "uniqueStudentsTaught": 1}},
+    {"$sort": {"uniqueStudentsTaught": -1}},
+]
+
+
+def unique_students_per_instructor(db, mode="approximate"):
+    """
+    Returns [{"instructorId", "uniqueStudentsTaught"}] sorted by count.
+    mode="approximate" reads the stored HyperLogLog sketches (bounded error,
+    constant memory); mode="exact" runs the de-duplicating audit pipeline.
+    """
+    if mode == "exact":
+        return list(db.enrollments.aggregate(exact_instructor_student_count_pipeline, allowDiskUse=True))
+    if mode != "approximate":
+        raise ValueError(f"Unsupported mode '{mode}'. Must be 'approximate' or 'exact'.")
+    counts = [
+        {"instructorId": doc["_id"], "uniqueStudentsTaught": hll_estimate(doc.get("sketch"))}
+        for doc in db[INSTRUCTOR_SKETCH_COLLECTION].find()
+    ]
+    return sorted(counts, key=lambda row: row["uniqueStudentsTaught"], reverse=True)
+
+
+# ---Grade Distribution Sketches---
+# Grades are bounded by the assignment maxScore, so each course, assignment and
+# student keeps a fixed-width histogram of its grades. Histograms merge by
+# adding bin counts and are updated with atomic $inc, which makes medians,
+# p90s and full histograms a single document read. Part 2's submission inserts,
+# the Part 3 seed grades and every Part 3 grade write (update_assignment_grade,
+# GradeQueue) feed them; rebuild_grade_sketches() recomputes them all from scratch,
+# which is also how grades written before the sketches existed get counted.
+# Assignment sketches are keyed by assignment_sketch_key(courseId, assignment).
+GRADE_SKETCH_COLLECTION = "grade_sketches"
+GRADE_BIN_WIDTH = 1
+GRADE_MAX = 100
+GRADE_SCOPES = ["course", "assignment", "student"]
+
+
+def _grade_bin(grade):
+    """Returns the histogram bin key for a grade, clamped to [0, GRADE_MAX]."""
+    grade = min(max(grade, 0), GRADE_MAX)
+    return str(min(int(grade // GRADE_BIN_WIDTH), int(GRADE_MAX // GRADE_BIN_WIDTH)))
+
+
+def assignment_sketch_key(course_id, assignment_id):
+    """The key of an assignment's grade sketch: assignment names repeat across courses, so it includes the course."""
+    return {"courseId": course_id, "assignment": assignment_id}
+
+
+def record_submission_grades(db, grades):
+    """
+    Adds graded submissions to the assignment, student and (if known) course sketches in one
+    unordered bulk_write. `grades` holds (assignment_id, student_id, grade, course_id, previous_grade)
+    tuples; a previous_grade that isn't None is a regrade, which moves the submission to its new
+    bin instead of counting it again (min/max only ever widen). A previous grade is only taken
+    out of a sketch whose bin holds it, so a grade written without feeding the sketches (seed
+    data, older documents) is counted as a new one instead of leaving a negative bin behind.
+    """
+    entries = []
+    for assignment_id, student_id, grade, course_id, previous_grade in grades:
+        if not isinstance(grade, (int, float)) or isinstance(grade, bool):
+            continue
+        if not isinstance(previous_grade, (int, float)) or isinstance(previous_grade, bool):
+            previous_grade = None
+        keys = {"assignment": assignment_sketch_key(course_id, assignment_id), "student": student_id}
+        if course_id is not None:
+            keys["course"] = course_id
+        entries.extend((scope, key, grade, previous_grade) for scope, key in keys.items())
+    if not entries:
+        return 0
+
+    # The bins the regraded sketches currently hold, read once per batch
+    held = {}
+    regraded = [{"scope": scope, "key": key} for scope, key, _, previous in entries if previous is not None]
+    if regraded:
+        for doc in db[GRADE_SKETCH_COLLECTION].find({"_id": {"$in": regraded}}, {"bins": 1}):
+            held[(doc["_id"]["scope"], _sketch_key(doc["_id"]["key"]))] = dict(doc.get("bins", {}))
+
+    sketches = {}
+    for scope, key, grade, previous_grade in entries:
+        sketch_id = (scope, _sketch_key(key))
+        sketch = sketches.setdefault(sketch_id, {"key": key, "inc": {}, "min": grade, "max": grade})
+        inc = sketch["inc"]
+        new_bin = _grade_bin(grade)
+        inc[f"bins.{new_bin}"] = inc.get(f"bins.{new_bin}", 0) + 1
+        inc["sum"] = inc.get("sum", 0) + grade
+        bins = held.setdefault(sketch_id, {})
+        old_bin = _grade_bin(previous_grade) if previous_grade is not None else None
+        if old_bin is not None and bins.get(old_bin, 0) > 0:
+            bins[old_bin] -= 1
+            inc[f"bins.{old_bin}"] = inc.get(f"bins.{old_bin}", 0) - 1
+            inc["sum"] -= previous_grade
+        else:
+            inc["count"] = inc.get("count", 0) + 1
+        bins[new_bin] = bins.get(new_bin, 0) + 1
+        sketch["min"] = min(sketch["min"], grade)
+        sketch["max"] = max(sketch["max"], grade)
+
+    requests = []
+    for (scope, _), sketch in sketches.items():
+        update = {"$min": {"min": sketch["min"]}, "$max": {"max": sketch["max"]}}
+        # A regrade within the same bin only changes the sum, and an empty $inc is rejected
+        inc = {path: amount for path, amount in sketch["inc"].items() if amount}
+        if inc:
+            update["$inc"] = inc
+        requests.append(UpdateOne({"_id": {"scope": scope, "key": sketch["key"]}}, update, upsert=True))
+    db[GRADE_SKETCH_COLLECTION].bulk_write(requests, ordered=False)
+    return len(requests)
+
+
+def record_submission_grade(db, assignment_id, student_id, grade, course_id=None, previous_grade=None):
+    """Adds one graded submission (or a regrade of one) to its assignment, student and course sketches."""
+    return record_submission_grades(db, [(assignment_id, student_id, grade, course_id, previous_grade)])
+
+
+def _sketch_key(key):
+    """A hashable stand-in for a sketch key (keys are ids or names)."""
+    return key if isinstance(key, (str, int, ObjectId)) else repr(key)
+
+
+def rebuild_grade_sketches(db, grade_mode=None, batch_size=1000):
+    """
+    Recomputes every grade sketch in one streaming pass over the submissions (and, with a
+    grade_mode, the Part 3 enrollment grades stored in that mode; see eduhub_grades) and
+    replaces the stored sketches with the result, removing sketches nothing feeds any more.
+    Memory is bounded by bins per course/assignment/student, not by submissions.
+    """
+    course_by_assignment = {
+        a["assignmentId"]: a.get("courseId", a.get("course_id"))
+        for a in db.assignments.find({}, {"assignmentId": 1, "courseId": 1, "course_id": 1})
+    }
+    sketches = {}
+
+    def add(scope, key, grade):
+        sketch = sketches.setdefault((scope, _sketch_key(key)), {
+            "_id": {"scope": scope, "key": key}, "bins": {}, "count": 0, "sum": 0, "min": grade, "max": grade})
+        bin_key = _grade_bin(grade)
+        sketch["bins"][bin_key] = sketch["bins"].get(bin_key, 0) + 1
+        sketch["count"] += 1
+        sketch["sum"] += grade
+        sketch["min"] = min(sketch["min"], grade)
+        sketch["max"] = max(sketch["max"], grade)
+
+    def add_grade(assignment_id, student_id, grade, course_id):
+        if not isinstance(grade, (int, float)) or isinstance(grade, bool):
+            return
+        add("assignment", assignment_sketch_key(course_id, assignment_id), grade)
+        add("student", student_id, grade)
+        if course_id is not None:
+            add("course", course_id, grade)
+
+    submissions = db.submissions.find(
+        {"grade": {"$type": "number"}}, {"assignmentId": 1, "studentId": 1, "grade": 1}, batch_size=batch_size)
+    for submission in submissions:
+        add_grade(submission["assignmentId"], submission["studentId"], submission["grade"],
+                  course_by_assignment.get(submission["assignmentId"]))
+    if grade_mode is not None:
+        # eduhub_grades records into these sketches, so it is only imported when needed
+        from eduhub_grades import iter_grades
+        for course_id, student_id, assignment_name, score in iter_grades(db, grade_mode, batch_size):
+            add_grade(assignment_name, student_id, score, course_id)
+
+    # Replace every sketch, then drop the ones this rebuild didn't produce
+    documents = list(sketches.values())
+    for i in range(0, len(documents), batch_size):
+        db[GRADE_SKETCH_COLLECTION].bulk_write(
+            [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in documents[i:i + batch_size]], ordered=False)
+    stale = [doc["_id"] for doc in db[GRADE_SKETCH_COLLECTION].find({}, {"_id": 1})
+             if (doc["_id"]["scope"], _sketch_key(doc["_id"]["key"])) not in sketches]
+    for i in range(0, len(stale), batch_size):
+        db[GRADE_SKETCH_COLLECTION].delete_many({"_id": {"$in": stale[i:i + batch_size]}})
+    bump_collection_version(db, GRADE_SKETCH_COLLECTION)
+    print(f"  [SKETCH] Rebuilt {len(documents)} grade sketch(es), removed {len(stale)} stale one(s).")
+    return len(documents)
+
+
+def _get_grade_sketch(db, scope, key):
+    """Reads one grade sketch, raising ValueError for an unknown scope."""
+    if scope not in GRADE_SCOPES:
+        raise ValueError(f"Unsupported scope '{scope}'. Must be one of {GRADE_SCOPES}.")
+    return db[GRADE_SKETCH_COLLECTION].find_one({"_id": {"scope": scope, "key": key}})
+
+
+def sketch_percentiles(sketch, percentiles=(50, 90)):
+    """Computes percentiles from a histogram sketch, interpolating within bins."""
+    if not sketch or not sketch.get("count"):
+        return {p: None for p in percentiles}
+    # Regrades can leave emptied bins behind
+    bins = sorted((int(b), c) for b, c in sketch["bins"].items() if c > 0)
+    results = {}
+    for p in percentiles:
+        target = p / 100 * sketch["count"]
+        seen = 0
+        value = sketch["max"]
+        for bin_index, count in bins:
+            if seen + count >= target:
+                fraction = (target - seen) / count
+                value = (bin_index + fraction) * GRADE_BIN_WIDTH
+                break
+            seen += count
+        results[p] = round(min(max(value, sketch["min"]), sketch["max"]), 2)
+    return results
+
+
+def grade_percentiles(db, scope, key, percentiles=(50, 90)):
+    """Returns {percentile: grade} for a course, assignment or student from its sketch."""
+    return sketch_percentiles(_get_grade_sketch(db, scope, key), percentiles)
+
+
+def grade_histogram(db, scope, key, bin_width=10):
+    """Returns [(lower bound, count)] for a course, assignment or student, re-binned to bin_width."""
+    sketch = _get_grade_sketch(db, scope, key)
+    histogram = {lower: 0 for lower in range(0, GRADE_MAX + 1, bin_width)}
+    for bin_key, count in (sketch or {}).get("bins", {}).items():
+        lower = int(int(bin_key) * GRADE_BIN_WIDTH // bin_width * bin_width)
+        histogram[lower] = histogram.get(lower, 0) + count
+    return sorted(histogram.items())
+
+
+def merge_grade_sketches(*sketches):
+    """Merges histogram sketches (e.g. several assignments into one report)."""
+    merged = {"bins": {}, "count": 0, "sum": 0, "min": None, "max": None}
+    for sketch in filter(None, sketches):
+        for bin_key, count in sketch["bins"].items():
+            merged["bins"][bin_key] = merged["bins"].get(bin_key, 0) + count
+        merged["count"] += sketch["count"]
+        merged["sum"] += sketch["sum"]
+        merged["min"] = sketch["min"] if merged["min"] is None else min(merged["min"], sketch["min"])
+        merged["max"] = sketch["max"] if merged["max"] is None else max(merged["max"], sketch["max"])
+    return merged
@@ -0,0 +1,59 @@
+# ---Collection Version Tokens---
+# Cached reports, cohort snapshots and exports are tagged with a version token
+# per source collection. A token combines a write counter, bumped by the update
+# paths in this package, with the collection's document count and newest _id
+# read from the server, so inserts and deletes made by any client change it too.
+# Kept free of numpy/pandas so write paths can import it cheaply.
+import threading
+import time
+
+VERSION_COLLECTION = "collection_versions"
+
+
+def bump_collection_version(db, collection_name):
+    """
+    Records a write to a collection, invalidating cached reports that read it.
+    Call it after the write: a report cached in between is stored under the old
+    token and simply misses once the bump lands.
+    """
+    db[VERSION_COLLECTION].update_one({"_id": collection_name}, {"$inc": {"version": 1}}, upsert=True)
+
+
+def collection_versions(db, collection_names):
+    """
+    Returns {collection: (write counter, document count, newest _id as a string)}
+    for the given collections. Tokens are hashable and JSON-serializable.
+    """
+    counters = {name: 0 for name in collection_names}
+    for doc in db[VERSION_COLLECTION].find({"_id": {"$in": list(collection_names)}}):
+        counters[doc["_id"]] = doc["version"]
+    versions = {}
+    for name, counter in counters.items():
+        newest = db[name].find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        versions[name] = (counter, db[name].estimated_document_count(), str(newest["_id"]) if newest else None)
+    return versions
+
+
+def watch_collection_versions(db, collection_names=("enrollments", "submissions", "courses", "users"), stop_event=None):
+    """
+    Starts a daemon thread that follows a change stream on the database and
+    bumps the version of each watched collection it sees a write to, so updates
+    made outside this package also invalidate the cache. Change streams need a
+    replica set; on a standalone server only inserts and deletes by other
+    clients are detected. Returns the (thread, stop_event) pair.
+    """
+    stop_event = stop_event or threading.Event()
+    pipeline = [{"$match": {"ns.coll": {"$in": list(collection_names)}}}]
+
+    def follow():
+        with db.watch(pipeline) as stream:
+            while not stop_event.is_set():
+                change = stream.try_next()
+                if change is None:
+                    time.sleep(0.1)
+                    continue
+                bump_collection_version(db, change["ns"]["coll"])
+
+    thread = threading.Thread(target=follow, name="report-cache-versions", daemon=True)
+    thread.start()
+    return thread, stop_event
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from eduhub_memory import MemoryClient  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """A fresh in-memory database per test."""
+    return MemoryClient(seed=0)["lms_test"]
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, UTC
+
+from eduhub_archive import USERS_ARCHIVE_COLLECTION, archive_inactive_users, ensure_active_user_indexes, restore_user
+from eduhub_versions import collection_versions
+
+
+def test_archive_bumps_users_and_restore_keeps_copy_on_email_conflict(db):
+    ensure_active_user_indexes(db)
+    old = datetime.now(UTC) - timedelta(days=200)
+    user_id = db.users.insert_one({"email": "a@x.com", "isActive": False, "deactivatedAt": old}).inserted_id
+
+    assert archive_inactive_users(db, pause_seconds=0) == 1
+    assert collection_versions(db, ["users"])["users"][0] == 1
+
+    # The email was reused by a new active account while the old one sat in the archive
+    db.users.insert_one({"email": "a@x.com", "isActive": True})
+    assert restore_user(db, user_id) == 0
+    assert db[USERS_ARCHIVE_COLLECTION].count_documents({"_id": user_id}) == 1
+    assert db.users.count_documents({"email": "a@x.com"}) == 1
+
+    db.users.delete_one({"email": "a@x.com"})
+    assert restore_user(db, user_id) == 1
+    assert db[USERS_ARCHIVE_COLLECTION].count_documents({}) == 0
+
+
+def test_full_email_index_is_replaced_by_the_partial_one(db):
+    db.users.create_index([("email", 1)], unique=True)
+    ensure_active_user_indexes(db, replace_full_email_index=True)
+    assert "email_1" not in db.users.index_information()
+    db.users.insert_many([{"email": "a@x.com", "isActive": False}, {"email": "a@x.com", "isActive": True}])
+
+
+def test_user_reactivated_before_the_delete_is_not_archived(db, monkeypatch):
+    old = datetime.now(UTC) - timedelta(days=200)
+    kept_id, gone_id = db.users.insert_many([
+        {"email": "kept@x.com", "isActive": False, "deactivatedAt": old},
+        {"email": "gone@x.com", "isActive": False, "deactivatedAt": old},
+    ]).inserted_ids
+    db.enrollments.insert_many([{"studentId": kept_id}, {"studentId": gone_id}])
+
+    users_type = type(db.users)
+    delete_many = users_type.delete_many
+
+    def reactivate_then_delete(self, *args, **kwargs):
+        if self.name == "users":
+            self.update_one({"_id": kept_id}, {"$set": {"isActive": True}})
+        return delete_many(self, *args, **kwargs)
+
+    monkeypatch.setattr(users_type, "delete_many", reactivate_then_delete)
+    assert archive_inactive_users(db, pause_seconds=0) == 1
+
+    assert [user["_id"] for user in db[USERS_ARCHIVE_COLLECTION].find()] == [gone_id]
+    assert db.users.find_one({"_id": kept_id})["isActive"] is True
+    assert "studentArchived" not in db.enrollments.find_one({"studentId": kept_id})
+    assert db.enrollments.find_one({"studentId": gone_id})["studentArchived"] is True
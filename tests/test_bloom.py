@@ -0,0 +1,24 @@
+from eduhub_bloom import BloomFilter, UniqueKeyFilter
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = [f"user{index}@x.com" for index in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    assert len(bloom) == 1000
+    # Well under a few percent of unseen keys hit at the sized load
+    assert sum(f"other{index}@x.com" in bloom for index in range(1000)) < 50
+
+
+def test_partition_confirms_hits_so_false_positives_are_kept(db):
+    db.users.insert_many([{"email": f"user{index}@x.com"} for index in range(20)])
+    # An undersized filter hits on most keys; every hit must be confirmed against the collection
+    key_filter = UniqueKeyFilter(db.users, "email", capacity=1, error_rate=0.5).seed()
+    batch = [{"email": "user3@x.com"}, {"email": "new@x.com"}, {"email": "new@x.com"}, {"name": "no email"}]
+
+    fresh, duplicates = key_filter.partition(batch)
+    assert fresh == [1, 3]
+    assert duplicates == [0, 2]
+    assert key_filter.false_positives == key_filter.confirmations - 1
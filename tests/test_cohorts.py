@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta, UTC
+
+from eduhub_cohorts import CohortEngine
+from eduhub_queries import delete_enrollment, enroll_student_in_course
+
+
+def add_student(db, joined):
+    return db.users.insert_one({"role": "student", "dateJoined": joined}).inserted_id
+
+
+def test_enrollment_changes_update_cohort_membership(db):
+    course_id = db.courses.insert_one({"title": "Intro"}).inserted_id
+    early = add_student(db, datetime(2025, 1, 10))
+    enroll_student_in_course(db, early, course_id)
+
+    engine = CohortEngine(db, user_key="_id")
+    assert list(engine.retention_grid().index) == ["2025-01"]
+
+    # Joined a few days ago, so the new enrollment lands within the retention window
+    joined = datetime.now(UTC) - timedelta(days=3)
+    recent = add_student(db, joined)
+    enrollment_id = enroll_student_in_course(db, recent, course_id)
+    label = joined.strftime("%Y-%m")
+    assert list(engine.retention_grid().index) == ["2025-01", label]
+    assert engine.cohort(label)["retention"].loc[label].sum() == 100.0
+
+    delete_enrollment(db, enrollment_id)
+    assert list(engine.retention_grid().index) == ["2025-01"]
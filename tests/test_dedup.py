@@ -0,0 +1,18 @@
+from eduhub_dedup import DEDUP_INDEX, dedup_users_by_email
+
+
+def test_dedup_drops_only_the_index_it_created(db):
+    db.users.insert_many([{"email": "a@x.com"}, {"email": "a@x.com"}, {"email": "b@x.com"}])
+    report = dedup_users_by_email(db)
+    assert report["documentsDeleted"] == 1
+    assert sorted(db.users.index_information()) == ["_id_"]
+
+    name = db.users.create_index(DEDUP_INDEX)
+    dedup_users_by_email(db)
+    assert name in db.users.index_information()
+
+
+def test_active_policy_keeps_the_active_account(db):
+    db.users.insert_many([{"email": "a@x.com", "isActive": False}, {"email": "a@x.com", "isActive": True}])
+    dedup_users_by_email(db, keep="active")
+    assert [user["isActive"] for user in db.users.find({"email": "a@x.com"})] == [True]
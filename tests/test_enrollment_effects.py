@@ -0,0 +1,32 @@
+from datetime import datetime, UTC
+
+from eduhub_effects import EnrollmentEffectsQueue
+from eduhub_queries import enroll_student_in_course
+from eduhub_rollups import activity_trend
+from eduhub_sketches import unique_students_per_course
+
+
+def operations(db):
+    return dict(db.client.server_status()["opcounters"])
+
+
+def test_enrollment_is_one_write_with_an_effects_queue(db):
+    instructor_id = db.users.insert_one({"role": "instructor"}).inserted_id
+    course_id = db.courses.insert_one({"title": "Intro", "instructorId": instructor_id}).inserted_id
+    students = [db.users.insert_one({"role": "student"}).inserted_id for _ in range(3)]
+
+    with EnrollmentEffectsQueue(db, flush_interval=0) as effects:
+        before = operations(db)
+        enroll_student_in_course(db, students[0], course_id, effects)
+        after = operations(db)
+        # Only the upsert: no sketch lookups, no rollup or version writes
+        assert {name: after[name] - before[name] for name in ("query", "update", "command")} == {
+            "query": 0, "update": 1, "command": 0,
+        }
+        for student_id in students[1:]:
+            enroll_student_in_course(db, student_id, course_id, effects)
+        assert effects.pending_count() == 3
+
+    month = datetime.now(UTC).replace(tzinfo=None, day=1, hour=0, minute=0, second=0, microsecond=0)
+    assert activity_trend(db, month, datetime(9999, 1, 1))[0]["enrollments"] == 3
+    assert unique_students_per_course(db, course_id) == 3
@@ -0,0 +1,28 @@
+from eduhub_queries import mark_course_published
+from eduhub_reports import export_report, export_reports, is_export_fresh, read_exported_report
+
+COURSES_SPEC = {
+    "collection": "courses",
+    "pipeline": [{"$match": {"isPublished": True}}, {"$project": {"_id": 0, "title": 1}}],
+    "schema": {"title": str},
+}
+
+
+def test_export_goes_stale_after_write(db, tmp_path):
+    course_id = db.courses.insert_one({"title": "Intro", "isPublished": False}).inserted_id
+    db.courses.insert_one({"title": "Advanced", "isPublished": True})
+    result = export_report(db, "published", COURSES_SPEC, str(tmp_path))
+    table, metadata = read_exported_report(result["path"])
+    assert table.column("title").to_pylist() == ["Advanced"]
+    assert is_export_fresh(db, COURSES_SPEC, metadata)
+
+    mark_course_published(db, course_id)
+    assert not is_export_fresh(db, COURSES_SPEC, metadata)
+
+
+def test_export_reports_records_client_side_errors(db, tmp_path):
+    db.courses.insert_one({"title": "Intro", "isPublished": True})
+    reports = {"bad": {**COURSES_SPEC, "schema": {"title": list}}, "noschema": {"collection": "courses"}}
+    exported = export_reports(db, reports, str(tmp_path))
+    assert exported["bad"].startswith("error: TypeError")
+    assert exported["noschema"] == "skipped: no schema"
@@ -0,0 +1,82 @@
+import time
+
+import pytest
+from bson.objectid import ObjectId
+from pymongo.errors import AutoReconnect, WriteError
+
+from eduhub_grades import GradeQueue, ensure_grade_indexes, grades_for_assignment
+from eduhub_queries import update_assignment_grade
+
+
+@pytest.fixture
+def enrollment(db):
+    course_id = db.courses.insert_one({"title": "Intro"}).inserted_id
+    student_id = db.users.insert_one({"role": "student"}).inserted_id
+    enrollment_id = db.enrollments.insert_one({"courseId": course_id, "studentId": student_id, "grades": []}).inserted_id
+    return course_id, student_id, enrollment_id
+
+
+@pytest.mark.parametrize("mode", ["collection", "keyed"])
+def test_update_assignment_grade_is_found_by_course(db, enrollment, mode):
+    course_id, _, enrollment_id = enrollment
+    ensure_grade_indexes(db, mode)
+    update_assignment_grade(db, enrollment_id, "Quiz 1", 88, mode=mode)
+    assert grades_for_assignment(db, course_id, "Quiz 1", mode) == [{"enrollmentId": enrollment_id, "score": 88}]
+
+
+def test_collection_grades_record_owner(db, enrollment):
+    course_id, student_id, enrollment_id = enrollment
+    update_assignment_grade(db, enrollment_id, "Quiz 1", 88, mode="collection")
+    grade = db.grades.find_one({"enrollmentId": enrollment_id})
+    assert (grade["courseId"], grade["studentId"]) == (course_id, student_id)
+
+
+def test_grade_queue_flush_records_owner(db, enrollment):
+    course_id, _, enrollment_id = enrollment
+    with GradeQueue(db, flush_interval=0, mode="collection") as queue:
+        queue.enqueue(enrollment_id, "Quiz 1", 70)
+        queue.enqueue(enrollment_id, "Quiz 1", 75)
+    assert grades_for_assignment(db, course_id, "Quiz 1", "collection") == [{"enrollmentId": enrollment_id, "score": 75}]
+
+
+@pytest.mark.parametrize("mode", ["collection", "keyed"])
+def test_missing_enrollment_writes_nothing(db, mode, capsys):
+    assert update_assignment_grade(db, ObjectId(), "Quiz 1", 88, mode=mode) == 0
+    assert "not found or no change made" in capsys.readouterr().out
+    with GradeQueue(db, flush_interval=0, mode=mode) as queue:
+        queue.enqueue(ObjectId(), "Quiz 1", 70)
+    assert db.grades.count_documents({}) == 0
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_background_flush_retries_transient_errors_and_surfaces_the_rest(db, enrollment, monkeypatch):
+    _, _, enrollment_id = enrollment
+    collection_type = type(db.grades)
+    bulk_write = collection_type.bulk_write
+    failures = [AutoReconnect("connection reset"), AutoReconnect("connection reset")]
+
+    def flaky_bulk_write(self, requests, **kwargs):
+        if failures:
+            raise failures.pop(0)
+        return bulk_write(self, requests, **kwargs)
+
+    monkeypatch.setattr(collection_type, "bulk_write", flaky_bulk_write)
+    queue = GradeQueue(db, flush_interval=0.02, mode="collection", max_retries=3)
+    queue.enqueue(enrollment_id, "Quiz 1", 70)
+    assert wait_for(lambda: db.grades.count_documents({}) == 1)
+    assert queue.error is None
+
+    failures.append(WriteError("Document failed validation", 121))
+    queue.enqueue(enrollment_id, "Quiz 1", 80)
+    assert wait_for(lambda: queue.error is not None)
+    assert queue.pending_count() == 1
+    with pytest.raises(WriteError):
+        queue.enqueue(enrollment_id, "Quiz 2", 90)
+    assert queue.close() == 1
+    assert db.grades.find_one({"assignmentName": "Quiz 1"})["score"] == 80
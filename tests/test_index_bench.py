@@ -0,0 +1,23 @@
+import pytest
+
+from eduhub_index_bench import EXPERIMENT_MODES, compare_index_plans
+
+
+@pytest.mark.parametrize("mode", EXPERIMENT_MODES)
+def test_compare_index_plans_leaves_the_live_indexes_alone(db, mode):
+    db.users.insert_many([{"email": f"user{index}@x.com", "role": "student"} for index in range(50)])
+    db.users.create_index([("email", 1)], unique=True)
+    before = db.users.index_information()
+
+    result = compare_index_plans(db, "users", {"email": "user7@x.com"}, [("email", 1)], mode=mode, repeat=1)
+    assert result["unindexed"]["stage"] == "COLLSCAN"
+    assert result["indexed"]["stage"] == "IXSCAN"
+    assert result["unindexed"]["nReturned"] == result["indexed"]["nReturned"] == 1
+    assert db.users.index_information() == before
+    assert "users_index_shadow" not in db.list_collection_names()
+
+
+def test_compare_index_plans_requires_the_index_outside_shadow_mode(db):
+    db.users.insert_one({"email": "a@x.com"})
+    with pytest.raises(ValueError, match="No index"):
+        compare_index_plans(db, "users", {"email": "a@x.com"}, [("email", 1)], repeat=1)
@@ -0,0 +1,42 @@
+import pytest
+from pymongo.errors import AutoReconnect
+
+import eduhub_queries
+from eduhub_lessons import add_lesson, ensure_lesson_indexes, get_lesson_outline, get_lesson_page
+
+
+def test_add_lesson_skips_orders_already_stored(db):
+    ensure_lesson_indexes(db)
+    course_id = db.courses.insert_one({"title": "Intro", "lessonCount": 0}).inserted_id
+    # Written by another tool, which didn't move lessonCount
+    db.lessons.insert_many([{"courseId": course_id, "title": f"Old {order}", "order": order} for order in (1, 2)])
+
+    lesson_id = add_lesson(db, course_id, "New", "content")
+    assert [lesson["order"] for lesson in get_lesson_page(db, course_id)] == [1, 2, 3]
+    assert get_lesson_outline(db, course_id) == [{"lessonId": lesson_id, "title": "New", "order": 3}]
+
+
+def test_add_lesson_removes_the_lesson_when_the_outline_write_fails(db, monkeypatch):
+    ensure_lesson_indexes(db)
+    course_id = db.courses.insert_one({"title": "Intro"}).inserted_id
+    collection_type = type(db.courses)
+
+    def failing_update_one(self, *args, **kwargs):
+        raise AutoReconnect("connection reset")
+
+    monkeypatch.setattr(collection_type, "update_one", failing_update_one)
+    with pytest.raises(AutoReconnect):
+        add_lesson(db, course_id, "New", "content")
+    monkeypatch.undo()
+    assert db.lessons.count_documents({}) == 0
+    assert get_lesson_outline(db, course_id) == []
+
+
+def test_paged_setup_seeds_lessons_the_paged_helpers_can_remove(db, monkeypatch):
+    monkeypatch.setattr(eduhub_queries, "LESSON_STORAGE_MODE", "paged")
+    _, _, course_id, _ = eduhub_queries.setup_collections(db)
+    assert "lessons" not in db.courses.find_one({"_id": course_id})
+    assert [lesson["title"] for lesson in get_lesson_outline(db, course_id)] == ["Connecting to MongoDB", "Inserting Documents"]
+
+    assert eduhub_queries.remove_lesson_from_course(db, course_id, "Connecting to MongoDB", mode="paged") == 1
+    assert [lesson["title"] for lesson in get_lesson_page(db, course_id)] == ["Inserting Documents"]
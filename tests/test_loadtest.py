@@ -0,0 +1,19 @@
+import pytest
+
+from eduhub_loadtest import DEFAULT_MIX, LoadTest, seed_load_data
+
+
+def test_load_test_stops_at_max_operations(db):
+    seed_load_data(db, students=20, courses=5, seed=1)
+    report = LoadTest(db, threads=4, duration=60, max_operations=40, sample_interval=0.05, seed=1).run()
+
+    assert report["operations"] == 40
+    assert report["errors"] == {}
+    assert sum(stats["operations"] for stats in report["perOperation"].values()) == 40
+    assert set(report["perOperation"]) == set(DEFAULT_MIX)
+    assert report["latency"]["response"]["max"] >= report["latency"]["response"]["p50"]
+
+
+def test_load_test_rejects_unknown_operations(db):
+    with pytest.raises(ValueError, match="Unknown operation"):
+        LoadTest(db, mix={"drop_everything": 1})
@@ -0,0 +1,92 @@
+import pytest
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+from eduhub_client import get_client
+from eduhub_memory import MemoryClient
+
+
+def test_filters_and_sorted_index_plan(db):
+    db.courses.insert_many([{"_id": i, "price": i * 10, "tags": ["a", "b"] if i % 2 else ["c"]} for i in range(10)])
+    db.courses.create_index([("price", 1)])
+
+    cursor = db.courses.find({"price": {"$gte": 30, "$lt": 70}, "tags": "a"}, {"_id": 1}).sort("price", -1)
+    assert [doc["_id"] for doc in cursor] == [5, 3]
+    plan = db.courses.find({"price": {"$gte": 30}}).explain()
+    assert plan["queryPlanner"]["winningPlan"]["inputStage"]["indexName"] == "price_1"
+    assert plan["executionStats"]["totalDocsExamined"] == 7
+    assert db.courses.count_documents({"$or": [{"price": 0}, {"tags": {"$all": ["a", "b"]}}]}) == 6
+
+
+def test_update_operators_and_positional(db):
+    db.enrollments.insert_one({"_id": 1, "grades": [{"name": "q1", "score": 50}, {"name": "q2", "score": 60}], "tags": []})
+    result = db.enrollments.update_one(
+        {"_id": 1, "grades.name": "q2"},
+        {"$set": {"grades.$.score": 95}, "$inc": {"views": 1}, "$addToSet": {"tags": {"$each": ["x", "x", "y"]}}},
+    )
+    assert (result.matched_count, result.modified_count) == (1, 1)
+    assert db.enrollments.find_one({"_id": 1}, {"_id": 0}) == {
+        "grades": [{"name": "q1", "score": 50}, {"name": "q2", "score": 95}], "tags": ["x", "y"], "views": 1}
+    assert db.enrollments.update_one({"_id": 2}, {"$set": {"x": 1}}).matched_count == 0
+
+
+def test_upsert_seeds_from_query_and_set_on_insert(db):
+    first = db.enrollments.update_one({"studentId": 1, "courseId": 2}, {"$setOnInsert": {"grades": []}}, upsert=True)
+    second = db.enrollments.update_one({"studentId": 1, "courseId": 2}, {"$setOnInsert": {"grades": [1]}}, upsert=True)
+    assert first.upserted_id is not None and second.upserted_id is None
+    assert db.enrollments.find_one({}, {"_id": 0}) == {"studentId": 1, "courseId": 2, "grades": []}
+
+
+def test_unique_indexes_raise_like_the_server(db):
+    db.users.create_index([("email", 1)], unique=True)
+    db.users.insert_one({"email": "a@x.com"})
+    with pytest.raises(DuplicateKeyError) as caught:
+        db.users.insert_one({"email": "a@x.com"})
+    assert caught.value.details["keyValue"] == {"email": "a@x.com"}
+
+    with pytest.raises(BulkWriteError) as caught:
+        db.users.insert_many([{"email": "b@x.com"}, {"email": "a@x.com"}, {"email": "c@x.com"}], ordered=False)
+    details = caught.value.details
+    assert details["nInserted"] == 2
+    assert [(error["index"], error["code"]) for error in details["writeErrors"]] == [(1, 11000)]
+
+
+def test_partial_unique_index_only_covers_matching_documents(db):
+    db.users.create_index([("email", 1)], unique=True, partialFilterExpression={"isActive": True})
+    db.users.insert_many([{"email": "a@x.com", "isActive": False}, {"email": "a@x.com", "isActive": True}])
+    with pytest.raises(DuplicateKeyError):
+        db.users.insert_one({"email": "a@x.com", "isActive": True})
+
+
+def test_find_one_and_update_returns_before_or_after_with_positional_projection(db):
+    db.enrollments.insert_one({"_id": 1, "grades": [{"name": "q1", "score": 50}, {"name": "q2", "score": 60}]})
+    query = {"_id": 1, "grades.name": "q2"}
+    before = db.enrollments.find_one_and_update(query, {"$set": {"grades.$.score": 70}}, projection={"grades.$": 1})
+    after = db.enrollments.find_one_and_update(query, {"$inc": {"grades.$.score": 5}}, projection={"grades.$": 1, "_id": 0},
+                                               return_document=ReturnDocument.AFTER)
+    assert before == {"_id": 1, "grades": [{"name": "q2", "score": 60}]}
+    assert after == {"grades": [{"name": "q2", "score": 75}]}
+    assert db.enrollments.find_one(query, {"grades.$": 1, "_id": 0}) == after
+
+
+def test_array_to_object_round_trip(db):
+    db.sketches.insert_one({"bins": [{"k": "90", "v": 2}, {"k": "75", "v": 1}], "pairs": [["a", 1]]})
+    pipeline = [{"$project": {
+        "_id": 0,
+        "bins": {"$arrayToObject": "$bins"},
+        "pairs": {"$arrayToObject": "$pairs"},
+        "back": {"$objectToArray": {"$arrayToObject": "$pairs"}},
+    }}]
+    assert list(db.sketches.aggregate(pipeline)) == [{"bins": {"90": 2, "75": 1}, "pairs": {"a": 1}, "back": [{"k": "a", "v": 1}]}]
+
+
+def test_unsupported_expression_is_named(db):
+    db.source.insert_one({"x": 1})
+    with pytest.raises(OperationFailure, match="regexFindAll"):
+        list(db.source.aggregate([{"$project": {"y": {"$regexFindAll": {"input": "$x", "regex": "a"}}}}]))
+
+
+def test_memory_uri_shares_one_client_per_name():
+    assert get_client("memory://shared-test") is get_client("memory://shared-test")
+    assert get_client("memory://shared-test") is not get_client("memory://other-test")
+    assert isinstance(get_client("memory://shared-test"), MemoryClient)
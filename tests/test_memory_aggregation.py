@@ -0,0 +1,126 @@
+from datetime import datetime
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from eduhub_rollups import activity_trend, create_rollup_store, rebuild_rollups, record_activities
+from eduhub_queries import run_part2
+from eduhub_versions import collection_versions
+
+
+def test_date_trunc_units(db):
+    db.events.insert_one({"at": datetime(2025, 8, 14, 13, 47)})
+
+    def trunc(**options):
+        pipeline = [{"$project": {"_id": 0, "t": {"$dateTrunc": {"date": "$at", **options}}}}]
+        return list(db.events.aggregate(pipeline))[0]["t"]
+
+    assert trunc(unit="year") == datetime(2025, 1, 1)
+    assert trunc(unit="quarter") == datetime(2025, 7, 1)
+    assert trunc(unit="month") == datetime(2025, 8, 1)
+    assert trunc(unit="week") == datetime(2025, 8, 10)
+    assert trunc(unit="week", startOfWeek="monday") == datetime(2025, 8, 11)
+    assert trunc(unit="minute", binSize=15) == datetime(2025, 8, 14, 13, 45)
+
+
+def test_lookup_with_let_and_pipeline(db):
+    db.users.insert_many([{"_id": 1, "name": "ada"}, {"_id": 2, "name": "bob"}])
+    db.enrollments.insert_many([{"studentId": 1, "grade": 90}, {"studentId": 1, "grade": 40}, {"studentId": 2, "grade": 70}])
+    pipeline = [
+        {"$lookup": {
+            "from": "enrollments",
+            "let": {"student": "$_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [{"$eq": ["$studentId", "$$student"]}, {"$gte": ["$grade", 50]}]}}},
+                {"$project": {"_id": 0, "grade": 1}},
+            ],
+            "as": "passed",
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+    assert [user["passed"] for user in db.users.aggregate(pipeline)] == [[{"grade": 90}], [{"grade": 70}]]
+
+
+def test_lookup_with_local_field_and_pipeline(db):
+    db.users.insert_many([{"_id": 1, "role": "student"}, {"_id": 2, "role": "instructor"}])
+    db.enrollments.insert_many([{"studentId": 1}, {"studentId": 2}])
+    pipeline = [
+        {"$lookup": {
+            "from": "users", "localField": "studentId", "foreignField": "_id",
+            "pipeline": [{"$match": {"role": "student"}}], "as": "student",
+        }},
+        {"$unwind": "$student"},
+    ]
+    assert [enrollment["studentId"] for enrollment in db.enrollments.aggregate(pipeline)] == [1]
+
+
+def test_merge_modes(db):
+    db.totals.create_index([("day", 1)], unique=True)
+    db.totals.insert_one({"day": "mon", "a": 1, "b": 1})
+    db.source.insert_many([{"day": "mon", "a": 5}, {"day": "tue", "a": 7}])
+    db.source.aggregate([
+        {"$project": {"_id": 0}},
+        {"$merge": {"into": "totals", "on": "day", "whenMatched": [{"$set": {"a": "$$new.a"}}]}},
+    ])
+    rows = {row["day"]: row for row in db.totals.find({}, {"_id": 0})}
+    assert rows == {"mon": {"day": "mon", "a": 5, "b": 1}, "tue": {"day": "tue", "a": 7}}
+
+    db.source.aggregate([{"$project": {"_id": 0}}, {"$merge": {"into": "totals", "on": "day", "whenMatched": "replace"}}])
+    assert db.totals.find_one({"day": "mon"}, {"_id": 0}) == {"day": "mon", "a": 5}
+
+
+def test_merge_requires_unique_on_fields(db):
+    db.source.insert_one({"day": "mon"})
+    with pytest.raises(OperationFailure):
+        db.source.aggregate([{"$merge": {"into": "totals", "on": "day"}}])
+
+
+def test_unsupported_stage_is_named(db):
+    db.source.insert_one({"x": 1})
+    with pytest.raises(OperationFailure, match="facet"):
+        db.source.aggregate([{"$facet": {}}])
+
+
+def test_rollup_rebuild_keeps_whole_months(db):
+    db.enrollments.insert_many([
+        {"enrollmentDate": datetime(2025, 1, 5), "status": "completed", "completionDate": datetime(2025, 2, 3)},
+        {"enrollmentDate": datetime(2025, 2, 10), "status": "in-progress"},
+        {"enrollmentDate": datetime(2025, 2, 25), "status": "in-progress"},
+    ])
+    create_rollup_store(db)
+    rebuild_rollups(db)
+    db.enrollments.delete_one({"enrollmentDate": datetime(2025, 2, 10)})
+    rebuild_rollups(db, datetime(2025, 2, 20), datetime(2025, 2, 28))
+
+    trend = activity_trend(db, datetime(2025, 1, 1), datetime(2025, 3, 1))
+    assert trend == [
+        {"period": "2025-01", "enrollments": 1, "completions": 0, "submissions": 0},
+        {"period": "2025-02", "enrollments": 1, "completions": 1, "submissions": 0},
+    ]
+    days = [row["period"] for row in activity_trend(db, datetime(2025, 2, 1), datetime(2025, 3, 1), "day")]
+    assert days == ["2025-02-03", "2025-02-25"]
+
+
+def test_recorded_activity_matches_rebuild_and_bumps_version(db):
+    submitted = [datetime(2025, 3, 1, 9), datetime(2025, 3, 1, 17), datetime(2025, 4, 2)]
+    db.submissions.insert_many([{"submittedAt": when} for when in submitted])
+    create_rollup_store(db)
+    record_activities(db, "submissions", submitted)
+    record_activities(db, "completions", [])
+
+    recorded = activity_trend(db, datetime(2025, 3, 1), datetime(2025, 5, 1), "day")
+    assert [(row["period"], row["submissions"]) for row in recorded] == [("2025-03-01", 2), ("2025-04-02", 1)]
+    # One bump for the write; the empty batch writes nothing and bumps nothing
+    assert collection_versions(db, ["activity_rollups"])["activity_rollups"][0] == 1
+    rebuild_rollups(db)
+    assert activity_trend(db, datetime(2025, 3, 1), datetime(2025, 5, 1), "day") == recorded
+
+
+def test_part2_reruns_keep_rollups_exact(db):
+    run_part2(db)
+    run_part2(db)
+    assert "granularity_1_bucket_1" in db.activity_rollups.index_information()
+    trend = activity_trend(db, datetime(2000, 1, 1), datetime(2100, 1, 1))
+    assert sum(row["enrollments"] for row in trend) == db.enrollments.count_documents({}) == 30
+    assert sum(row["submissions"] for row in trend) == db.submissions.count_documents({}) == 24
+    assert sum(row["completions"] for row in trend) == db.enrollments.count_documents({"status": "completed"})
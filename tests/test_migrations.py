@@ -0,0 +1,90 @@
+from eduhub_migrations import (
+    KEY_NORMALIZATION, MIGRATIONS, _enrollment_course_key, register_migration, run_migration, run_migrations,
+)
+
+
+def add_lessons(db, count):
+    db.lessons.insert_many([{"course_id": index, "title": f"Lesson {index}"} for index in range(count)])
+
+
+def test_rerun_picks_up_new_documents_and_verifies(db):
+    add_lessons(db, 3)
+    assert run_migration(db, "lessons_course_id_to_courseId", max_ops_per_second=None)["verified"]
+
+    add_lessons(db, 2)
+    report = run_migration(db, "lessons_course_id_to_courseId", max_ops_per_second=None)
+    assert report["verified"] and report["remaining"] == 0
+    assert db.lessons.count_documents({"course_id": {"$exists": True}}) == 0
+
+
+def test_resume_after_inserts_verifies(db):
+    add_lessons(db, 4)
+    partial = run_migration(db, "lessons_course_id_to_courseId", batch_size=2, max_batches=1, max_ops_per_second=None)
+    assert not partial["verified"]
+
+    add_lessons(db, 3)
+    report = run_migration(db, "lessons_course_id_to_courseId", batch_size=2, max_ops_per_second=None)
+    assert report["verified"]
+    assert report["countBefore"] == report["countAfter"] == 7
+
+
+def test_unverified_migration_reports_skipped(db):
+    db.courses.insert_one({"course_id": "c1", "title": "Intro"})
+    reports = run_migrations(db, KEY_NORMALIZATION, batch_size=1, max_batches=0, max_ops_per_second=None)
+    assert reports[0]["name"] == KEY_NORMALIZATION[0] and not reports[0]["verified"]
+    assert [report["name"] for report in reports[1:]] == KEY_NORMALIZATION[1:]
+    assert all(report["skipped"] for report in reports[1:])
+
+
+def test_resume_restarts_for_documents_behind_the_checkpoint(db):
+    db.lessons.insert_many([{"_id": index, "course_id": index} for index in (10, 20, 30)])
+    run_migration(db, "lessons_course_id_to_courseId", batch_size=2, max_batches=1, max_ops_per_second=None)
+
+    db.lessons.insert_one({"_id": 5, "course_id": 5})
+    report = run_migration(db, "lessons_course_id_to_courseId", batch_size=2, max_ops_per_second=None)
+    assert report["verified"]
+    assert db.lessons.find_one({"_id": 5}) == {"_id": 5, "courseId": 5}
+
+
+def test_replacement_skips_documents_changed_after_the_read(db):
+    db.enrollments.insert_one({"_id": 1, "": "c1", "progress": 10})
+
+    def transform_racing_a_writer(doc):
+        if doc["progress"] == 10:
+            db.enrollments.update_one({"_id": 1}, {"$set": {"progress": 55}})
+        return _enrollment_course_key(doc)
+
+    register_migration("racing_writer", "enrollments", {"courseId": {"$exists": False}}, transform_racing_a_writer)
+    try:
+        report = run_migration(db, "racing_writer", max_ops_per_second=None)
+    finally:
+        del MIGRATIONS["racing_writer"]
+    assert report["verified"]
+    assert db.enrollments.find_one({"_id": 1}) == {"_id": 1, "progress": 55, "courseId": "c1"}
+
+
+def test_replacement_skips_documents_that_gained_a_field_after_the_read(db):
+    db.enrollments.insert_one({"_id": 1, "": "c1", "progress": 10})
+
+    def transform_racing_a_writer(doc):
+        if "completed" not in doc:
+            db.enrollments.update_one({"_id": 1}, {"$set": {"completed": True}})
+        return _enrollment_course_key(doc)
+
+    register_migration("racing_writer", "enrollments", {"courseId": {"$exists": False}}, transform_racing_a_writer)
+    try:
+        report = run_migration(db, "racing_writer", max_ops_per_second=None)
+    finally:
+        del MIGRATIONS["racing_writer"]
+    assert report["verified"]
+    assert db.enrollments.find_one({"_id": 1}) == {"_id": 1, "progress": 10, "completed": True, "courseId": "c1"}
+
+
+def test_course_validator_does_not_block_later_old_shape_inserts(db):
+    db.courses.insert_one({"course_id": "c1", "title": "Intro", "instructor": "u1"})
+    assert run_migration(db, "courses_course_id_to_courseId", max_ops_per_second=None)["verified"]
+
+    # A Part 2 re-run inserts courses in the old shape again
+    db.courses.insert_one({"course_id": "c2", "title": "Advanced", "instructor": "u1"})
+    assert run_migration(db, "courses_course_id_to_courseId", max_ops_per_second=None)["verified"]
+    assert db.courses.count_documents({"courseId": {"$exists": True}}) == 2
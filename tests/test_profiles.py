@@ -0,0 +1,46 @@
+import pytest
+from pymongo import MongoClient, ReadPreference
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+
+from eduhub_profiles import PROFILES, profiled_db, register_profile, uses_profile
+
+
+def test_profiled_db_applies_the_profile_options():
+    # connect=False: the options are client-side, nothing is sent to a server
+    client = MongoClient("mongodb://localhost:27017", connect=False)
+    try:
+        durable = profiled_db(client["lms_test"], "durable")
+        assert durable.name == "lms_test"
+        assert durable.write_concern == WriteConcern(w="majority", j=True)
+        assert durable.read_concern == ReadConcern("majority")
+        assert durable.read_preference == ReadPreference.PRIMARY
+
+        analytical = profiled_db(client["lms_test"], "analytical")
+        assert analytical.read_preference.mode == ReadPreference.SECONDARY_PREFERRED.mode
+        assert analytical.read_preference.max_staleness == 120
+        assert analytical.write_concern == client["lms_test"].write_concern
+    finally:
+        client.close()
+
+
+def test_uses_profile_runs_against_the_same_data(db):
+    @uses_profile("durable")
+    def enroll(db, student_id):
+        db.enrollments.insert_one({"studentId": student_id})
+        return db
+
+    profiled = enroll(db, 1)
+    assert enroll.profile == "durable"
+    assert profiled.name == db.name
+    assert db.enrollments.count_documents({"studentId": 1}) == 1
+
+
+def test_registered_profile_drops_unset_options_and_unknown_profiles_raise(db):
+    register_profile("reporting", read_concern=ReadConcern("available"))
+    try:
+        assert PROFILES["reporting"] == {"read_concern": ReadConcern("available")}
+    finally:
+        del PROFILES["reporting"]
+    with pytest.raises(ValueError, match="Unknown operation profile"):
+        profiled_db(db, "reporting")
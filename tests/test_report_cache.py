@@ -0,0 +1,61 @@
+from eduhub_queries import mark_course_published, part4_report_specs, update_user_profile
+from eduhub_reports import ReportCache, spec_fingerprint
+from eduhub_sketches import record_enrollment_sketch
+
+COURSES_SPEC = {"collection": "courses", "pipeline": [{"$match": {"isPublished": True}}]}
+
+
+def run_spec(db, spec):
+    return lambda: list(db[spec["collection"]].aggregate(spec["pipeline"]))
+
+
+def test_unchanged_source_hits(db):
+    db.courses.insert_one({"title": "Intro", "isPublished": True})
+    cache = ReportCache(db)
+    cache.get_or_run(COURSES_SPEC, run_spec(db, COURSES_SPEC))
+    cache.get_or_run(COURSES_SPEC, run_spec(db, COURSES_SPEC))
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_update_through_write_path_misses(db):
+    course_id = db.courses.insert_one({"title": "Intro", "isPublished": False}).inserted_id
+    cache = ReportCache(db)
+    assert cache.get_or_run(COURSES_SPEC, run_spec(db, COURSES_SPEC)) == []
+
+    mark_course_published(db, course_id)
+
+    result = cache.get_or_run(COURSES_SPEC, run_spec(db, COURSES_SPEC))
+    assert cache.misses == 2
+    assert [course["_id"] for course in result] == [course_id]
+
+
+def test_insert_by_another_client_misses(db):
+    cache = ReportCache(db)
+    cache.get_or_run(COURSES_SPEC, run_spec(db, COURSES_SPEC))
+    # No bump: the newest _id and document count still change the token
+    db.courses.insert_one({"title": "Outside write", "isPublished": True})
+    assert len(cache.get_or_run(COURSES_SPEC, run_spec(db, COURSES_SPEC))) == 1
+    assert cache.misses == 2
+
+
+def test_write_to_other_collection_keeps_hit(db):
+    user_id = db.users.insert_one({"username": "ada", "profile": {}}).inserted_id
+    cache = ReportCache(db)
+    cache.get_or_run(COURSES_SPEC, run_spec(db, COURSES_SPEC))
+    update_user_profile(db, user_id, {"bio": "hello"})
+    cache.get_or_run(COURSES_SPEC, run_spec(db, COURSES_SPEC))
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_sketch_write_keeps_course_reports_cached(db):
+    course_id = db.courses.insert_one({"title": "Intro", "isPublished": True}).inserted_id
+    cache = ReportCache(db)
+    cache.get_or_run(COURSES_SPEC, run_spec(db, COURSES_SPEC))
+    record_enrollment_sketch(db, course_id, "student-1")
+    cache.get_or_run(COURSES_SPEC, run_spec(db, COURSES_SPEC))
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_time_window_reports_keep_their_fingerprint():
+    for name in ("recent_users", "upcoming_assignments"):
+        assert spec_fingerprint(part4_report_specs()[name]) == spec_fingerprint(part4_report_specs()[name])
@@ -0,0 +1,46 @@
+import threading
+
+import pytest
+
+import eduhub_reports
+from eduhub_reports import documents_to_columns, run_reports
+
+REPORTS = {
+    "published": {"collection": "courses", "filter": {"isPublished": True}},
+    "slow": {"collection": "courses", "pipeline": [{"$count": "courses"}]},
+}
+
+
+def test_report_over_the_pack_budget_is_timed_out(db, monkeypatch):
+    db.courses.insert_one({"title": "Intro", "isPublished": True})
+    release = threading.Event()
+    run_report = eduhub_reports.run_report
+
+    def stalled_run_report(db, spec, *args):
+        if spec is REPORTS["slow"]:
+            release.wait(5)
+        return run_report(db, spec, *args)
+
+    monkeypatch.setattr(eduhub_reports, "run_report", stalled_run_report)
+    try:
+        pack = run_reports(db, REPORTS, budget_seconds=0.2)
+    finally:
+        release.set()
+    assert pack["status"] == {"published": "ok", "slow": "timed_out"}
+    assert pack["results"]["slow"] is None
+    assert [course["title"] for course in pack["results"]["published"]] == ["Intro"]
+
+
+def test_client_side_failure_is_an_error_not_a_timeout(db, monkeypatch):
+    def failing_run_report(db, spec, *args):
+        raise TypeError("unsupported column type")
+
+    monkeypatch.setattr(eduhub_reports, "run_report", failing_run_report)
+    pack = run_reports(db, {"published": REPORTS["published"]})
+    assert pack["status"]["published"] == "error: TypeError: unsupported column type"
+
+
+@pytest.mark.parametrize("field_type, values", [(int, [1, True]), (float, [1.5, False]), (bool, [True, 1])])
+def test_columns_reject_mixed_bool_and_numbers(field_type, values):
+    with pytest.raises(ValueError, match="Column 'flag'"):
+        documents_to_columns([{"flag": value} for value in values], {"flag": field_type})
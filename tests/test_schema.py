@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+from bson.decimal128 import Decimal128
+
+from eduhub_queries import attempt_save_many, check_course, validate_courses_batch
+from eduhub_schema import compile_validator
+
+VALID_COURSE = {"title": "Intro", "price": 10, "instructorEmail": "ada@edu.com", "level": "beginner"}
+
+
+@pytest.mark.parametrize("name", ['a"b', "a\\b", "it's", "{x}"])
+def test_any_field_name_compiles(name):
+    validate = compile_validator({"required": [name], "properties": {name: {"bsonType": "int"}}}, "validate_my-coll")
+    assert validate({name: 1}) == {}
+    assert validate({name: "x"}) == {name: f"'{name}' must be of type int, not 'str'."}
+    assert validate({}) == {name: f"{name!r} is a required field."}
+
+
+def test_decimal_bounds_are_checked():
+    assert check_course({**VALID_COURSE, "price": Decimal128("-5")}) == {"price": "'price' must be at least 0."}
+    assert check_course({**VALID_COURSE, "price": Decimal128("5.5")}) == {}
+
+
+def test_list_form_items_is_unsupported():
+    with pytest.raises(ValueError, match="Unsupported"):
+        compile_validator({"properties": {"tags": {"items": [{"bsonType": "string"}]}}})
+
+
+def test_batch_validation_matches_check_course():
+    rows = [VALID_COURSE, {**VALID_COURSE, "price": Decimal128("-1"), "level": "expert"}, {**VALID_COURSE, "title": None}]
+    errors = validate_courses_batch(pd.DataFrame(rows))
+    assert list(errors[["row", "field"]].itertuples(index=False, name=None)) == [(1, "level"), (1, "price"), (2, "title")]
+    expected = check_course(rows[1])
+    assert errors["message"].tolist() == [expected["level"], expected["price"], "'title' is a required field."]
+
+
+def test_batch_validation_flags_only_failing_rows():
+    rows = [VALID_COURSE] * 3 + [
+        {**VALID_COURSE, "instructorEmail": "é@edu.com"},
+        {**VALID_COURSE, "price": True},
+        {**VALID_COURSE, "level": ["beginner"]},
+    ]
+    expected = [(row, field, message) for row, document in enumerate(rows)
+                for field, message in sorted(check_course(document).items())]
+    for data in (rows, pd.DataFrame(rows)):
+        assert list(validate_courses_batch(data).itertuples(index=False, name=None)) == expected
+    assert [row for row, _, _ in expected] == [3, 4, 5]
+
+
+def test_attempt_save_many_reports_duplicates_at_their_original_positions(db):
+    db.courses.create_index("title", unique=True)
+    db.courses.insert_one({**VALID_COURSE, "title": "Taken"})
+
+    def course(title):
+        return {**VALID_COURSE, "title": title}
+
+    documents = [course("Intro"), {"title": "Broken", "price": -1}, course("Taken"), course("Next"), course("Next")]
+    report = attempt_save_many(db.courses, documents, "bulk import", batch_size=2)
+
+    assert [entry["index"] for entry in report["saved"]] == [0, 3]
+    assert [entry["index"] for entry in report["invalid"]] == [1]
+    assert [(entry["index"], entry["keyValue"], entry["diverted"]) for entry in report["duplicates"]] == [
+        (2, {"title": "Taken"}, False), (4, {"title": "Next"}, False),
+    ]
+    assert report["failed"] == []
+    assert db.courses.count_documents({}) == 3
@@ -0,0 +1,26 @@
+import random
+from datetime import datetime, timedelta
+
+from eduhub_sharding import analyze_shard_keys
+
+
+def test_monotonic_hotspot_key_is_not_recommended(db):
+    rng = random.Random(7)
+    start = datetime(2025, 1, 1)
+    db.enrollments.insert_many([
+        {"_id": index, "studentId": rng.randrange(6), "courseId": rng.randrange(4),
+         "enrollmentDate": start + timedelta(hours=index)}
+        for index in range(400)
+    ])
+    workload = [
+        {"name": "by course", "filter": {"courseId": 2}},
+        {"name": "recent", "filter": {"enrollmentDate": {"$gte": start}}},
+    ]
+    result = analyze_shard_keys(db, "enrollments", workload=workload)
+    candidates = result["candidates"]
+
+    # enrollmentDate has no more warnings than the compound key, but they are blockers
+    assert len(candidates["enrollmentDate"]["warnings"]) == len(candidates["courseId + studentId"]["warnings"])
+    assert len(candidates["enrollmentDate"]["blockers"]) == 2
+    assert candidates["hashed studentId"]["blockers"] == ["no targeted queries: every workload query is scatter-gather"]
+    assert result["recommended"] == "courseId + studentId"
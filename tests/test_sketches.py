@@ -0,0 +1,96 @@
+import pytest
+
+from eduhub_grades import GradeQueue
+from eduhub_queries import run_part2, setup_collections, update_assignment_grade
+from eduhub_sketches import (
+    GRADE_SKETCH_COLLECTION, assignment_sketch_key, grade_histogram, grade_percentiles, rebuild_grade_sketches,
+)
+
+
+def test_seeded_submissions_have_percentiles(db):
+    run_part2(db)
+    submission = db.submissions.find_one()
+    course_id = db.assignments.find_one({"assignmentId": submission["assignmentId"]})["course_id"]
+    grades = sorted(s["grade"] for s in db.submissions.find({"studentId": submission["studentId"]}))
+
+    percentiles = grade_percentiles(db, "student", submission["studentId"], (0, 100))
+    assert percentiles == {0: grades[0], 100: grades[-1]}
+    assert grade_percentiles(db, "course", course_id)[50] is not None
+
+
+def test_rebuild_replaces_every_sketch(db):
+    db.assignments.insert_one({"assignmentId": "a1", "courseId": "c1"})
+    db.submissions.insert_many([{"assignmentId": "a1", "studentId": f"s{g}", "grade": g} for g in (40, 60, 80, 100)])
+    db[GRADE_SKETCH_COLLECTION].insert_one({"_id": {"scope": "student", "key": "gone"}, "bins": {"50": 1}, "count": 1})
+
+    rebuild_grade_sketches(db)
+    rebuild_grade_sketches(db)
+    assert grade_percentiles(db, "course", "c1", (25, 50, 100)) == {25: 41.0, 50: 61.0, 100: 100}
+    assert grade_percentiles(db, "student", "gone") == {50: None, 90: None}
+    assert db[GRADE_SKETCH_COLLECTION].count_documents({}) == 6
+
+
+@pytest.fixture
+def graded_enrollment(db):
+    course_id = db.courses.insert_one({"title": "Intro"}).inserted_id
+    student_id = db.users.insert_one({"role": "student"}).inserted_id
+    enrollment_id = db.enrollments.insert_one({
+        "courseId": course_id, "studentId": student_id, "grades": [{"assignmentName": "Quiz 1", "score": 50}],
+    }).inserted_id
+    rebuild_grade_sketches(db, grade_mode="embedded")
+    return course_id, student_id, enrollment_id
+
+
+def test_regrade_moves_the_grade_in_its_sketches(db, graded_enrollment):
+    course_id, student_id, enrollment_id = graded_enrollment
+    update_assignment_grade(db, enrollment_id, "Quiz 1", 90)
+    quiz = assignment_sketch_key(course_id, "Quiz 1")
+    for scope, key in (("course", course_id), ("student", student_id), ("assignment", quiz)):
+        assert grade_percentiles(db, scope, key, (50,)) == {50: 90}
+    assert dict(grade_histogram(db, "course", course_id))[50] == 0
+    assert db[GRADE_SKETCH_COLLECTION].find_one({"_id": {"scope": "course", "key": course_id}})["count"] == 1
+
+
+def test_grade_queue_feeds_the_sketches(db, graded_enrollment):
+    course_id, _, enrollment_id = graded_enrollment
+    with GradeQueue(db, flush_interval=0, mode="keyed") as queue:
+        queue.enqueue(enrollment_id, "Quiz 2", 70)
+    with GradeQueue(db, flush_interval=0) as queue:
+        queue.enqueue(enrollment_id, "Quiz 1", 80)
+    assert dict(grade_histogram(db, "course", course_id, bin_width=10)) == {
+        **{lower: 0 for lower in range(0, 101, 10)}, 70: 1, 80: 1}
+
+
+def test_regrading_seeded_grades_keeps_the_sketches_consistent(db):
+    setup_collections(db)
+    _, student_id, course_id, enrollment_id = setup_collections(db)
+    update_assignment_grade(db, enrollment_id, "Quiz 1", 95)
+    sketch = db[GRADE_SKETCH_COLLECTION].find_one({"_id": {"scope": "course", "key": course_id}})
+    assert (sketch["bins"], sketch["count"], sketch["sum"]) == ({"85": 0, "92": 1, "95": 1}, 2, 187)
+    assert grade_percentiles(db, "student", student_id, (0, 100)) == {0: 92, 100: 95}
+    # The first run's sketches were dropped along with its enrollments
+    assert db[GRADE_SKETCH_COLLECTION].count_documents({}) == 4
+
+
+def test_regrade_of_an_uncounted_grade_counts_it_as_new(db):
+    course_id = db.courses.insert_one({"title": "Intro"}).inserted_id
+    enrollment_id = db.enrollments.insert_one({
+        "courseId": course_id, "studentId": "s1", "grades": [{"assignmentName": "Quiz 1", "score": 85}],
+    }).inserted_id
+    update_assignment_grade(db, enrollment_id, "Quiz 1", 95)
+    assert all(count >= 0 for _, count in grade_histogram(db, "course", course_id))
+    assert grade_percentiles(db, "course", course_id, (50,)) == {50: 95}
+
+
+def test_assignment_sketches_are_per_course(db):
+    enrollments = []
+    for score in (40, 90):
+        course_id = db.courses.insert_one({"title": "Intro"}).inserted_id
+        enrollments.append((course_id, db.enrollments.insert_one({
+            "courseId": course_id, "studentId": "s1", "grades": [{"assignmentName": "Quiz 1", "score": 0}],
+        }).inserted_id, score))
+    rebuild_grade_sketches(db, grade_mode="embedded")
+    for course_id, enrollment_id, score in enrollments:
+        update_assignment_grade(db, enrollment_id, "Quiz 1", score)
+    for course_id, _, score in enrollments:
+        assert grade_percentiles(db, "assignment", assignment_sketch_key(course_id, "Quiz 1"), (50,)) == {50: score}